@@ -0,0 +1,117 @@
+"""Bounded in-process response cache for /search.
+
+Entries expire after a TTL and the least recently used entry is evicted once
+the cache is full. Writes invalidate only the entries whose store/category
+filters could include the written products.
+
+The cache is per worker process: writes made by another process (e.g. the
+importer run from the command line) become visible when the TTL runs out.
+"""
+from collections import OrderedDict
+from typing import Iterable, Optional
+import os
+import threading
+import time
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+
+
+def filter_key(filters: dict) -> tuple:
+    """Normalize request filters into a hashable cache key."""
+    return tuple(sorted((name, value) for name, value in filters.items() if value is not None))
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of encoded responses."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (body, expires_at, store_id filter, category_id filter)
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key) -> Optional[bytes]:
+        """Return the cached body for ``key`` or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, body: bytes, store_id: Optional[int] = None, category_id: Optional[int] = None):
+        """
+        Cache a response body.
+
+        Args:
+            key: Normalized request parameters
+            body: Encoded response
+            store_id: Store filter of the request (None = all stores)
+            category_id: Category filter of the request (None = all categories)
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (body, time.monotonic() + self.ttl, store_id, category_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, written: Iterable[tuple[int, Optional[int]]]):
+        """
+        Drop entries that could contain products written to the database.
+
+        Args:
+            written: (store_id, category_id) pairs of the inserted/updated products
+        """
+        written = set(written)
+        if not written:
+            return
+        with self._lock:
+            stale = [
+                key for key, (_, _, store_filter, category_filter) in self._entries.items()
+                if any(
+                    (store_filter is None or store_filter == store_id)
+                    and (category_filter is None or category_filter == category_id)
+                    for store_id, category_id in written
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every entry and reset the metrics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> dict:
+        """Size and hit/miss metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+search_cache = ResponseCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
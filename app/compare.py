@@ -0,0 +1,282 @@
+"""Cheapest in-stock offer per store for a search.
+
+Any query is answered with one windowed statement: the matching available
+products are ranked per store with ``ROW_NUMBER() OVER (PARTITION BY
+store_id ORDER BY price)`` and the first of each store is kept.
+
+Tracked queries - the importer's queries, plus any query asked for
+``COMPARE_TRACK_AFTER`` times - have their per-store minima materialized in
+``best_offers``. The API starts tracking a query on the single writer thread,
+so ``/compare`` itself only reads. Product writes in ``ingest`` update only the (query, store)
+pairs their rows affect, inside the same transaction.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional
+import os
+import threading
+import time
+
+from sqlalchemy import Integer, bindparam, delete, func, insert, literal, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from . import models, search
+from .text import fold
+
+# Live /compare requests after which a query gets precomputed offers (0 = never)
+COMPARE_TRACK_AFTER = int(os.getenv("COMPARE_TRACK_AFTER", "10"))
+
+# How long a process trusts its copy of the tracked query list
+TRACKED_RELOAD_SECONDS = 60
+
+best_offers_table = models.BestOffer.__table__
+
+
+def normalize(q: str) -> str:
+    """Normalized form a query is tracked under."""
+    return " ".join(search.tokenize(q))
+
+
+def ranked_offers(bind, q: str, store_ids: Optional[Iterable[int]] = None):
+    """
+    Subquery of the cheapest available product per store matching ``q``.
+
+    Columns: id, store_id, price.
+    """
+    rank = func.row_number().over(
+        partition_by=models.Product.store_id,
+        order_by=(models.Product.price, models.Product.id),
+    )
+    ranked = select(
+        models.Product.id, models.Product.store_id, models.Product.price, rank.label("rank")
+    ).where(models.Product.available == 1)
+    ranked = search.filter_products(ranked, bind, q=q)
+    if store_ids is not None:
+        ranked = ranked.where(models.Product.store_id.in_(store_ids))
+    ranked = ranked.subquery()
+    return select(ranked.c.id, ranked.c.store_id, ranked.c.price).where(ranked.c.rank == 1)
+
+
+def offer_ids(db, q: str, tracked_id: Optional[int] = None):
+    """Product IDs of the per-store best offers, as a subquery for an IN filter."""
+    if tracked_id is not None:
+        return select(best_offers_table.c.product_id).where(best_offers_table.c.tracked_query_id == tracked_id)
+    return select(ranked_offers(db.get_bind(), q).subquery().c.id)
+
+
+class TrackedQueries:
+    """
+    Process-wide map of tracked query -> ID, counting live hits.
+
+    Reloaded every TRACKED_RELOAD_SECONDS so queries tracked by another
+    process (the importer) are picked up; writers ask for a ``current`` map,
+    which is also reloaded as soon as the table's version (max ID and row
+    count) changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Optional[dict[str, int]] = None
+        self._version: Optional[tuple] = None
+        self._loaded_at = 0.0
+        self._hits: Counter = Counter()
+        self._pending: set[str] = set()
+
+    def get(self, db, current: bool = False) -> dict[str, int]:
+        """
+        Tracked queries, loading them when missing or stale.
+
+        Args:
+            db: Database session
+            current: Check the table's version first (one aggregate query), so
+                a query tracked by another process moments ago is included
+        """
+        version = None
+        if current:
+            version = tuple(db.query(func.max(models.TrackedQuery.id), func.count(models.TrackedQuery.id)).one())
+        with self._lock:
+            ids = self._ids
+            fresh = time.monotonic() - self._loaded_at < TRACKED_RELOAD_SECONDS
+            if current and version != self._version:
+                fresh = False
+        if ids is None or not fresh:
+            ids = dict(db.query(models.TrackedQuery.query, models.TrackedQuery.id).all())
+            if version is None:
+                version = (max(ids.values(), default=None), len(ids))
+            with self._lock:
+                self._ids, self._version, self._loaded_at = ids, version, time.monotonic()
+        return ids
+
+    def hit(self, query: str) -> bool:
+        """
+        Count a live request; True once the query is popular enough to track.
+
+        The query is then pending until ``done`` is called, so it is handed
+        out for tracking once at a time, and again if tracking failed.
+        """
+        if not COMPARE_TRACK_AFTER:
+            return False
+        with self._lock:
+            self._hits[query] += 1
+            if self._hits[query] < COMPARE_TRACK_AFTER or query in self._pending:
+                return False
+            self._pending.add(query)
+            return True
+
+    def done(self, query: str):
+        """Tracking of a pending query finished (or failed)."""
+        with self._lock:
+            self._pending.discard(query)
+
+    def invalidate(self):
+        """Reload the map on next use."""
+        with self._lock:
+            self._ids = None
+
+    def reset(self):
+        """Forget the loaded map and the hit counts."""
+        with self._lock:
+            self._ids = None
+            self._version = None
+            self._hits.clear()
+            self._pending.clear()
+
+
+tracked = TrackedQueries()
+
+
+def refresh(db, tracked_id: int, query: str, store_ids: Optional[Iterable[int]] = None):
+    """
+    Recompute the best offers of a tracked query (for some stores only).
+
+    Does not commit, so it can share the transaction of the write that caused it.
+    """
+    stale = delete(best_offers_table).where(best_offers_table.c.tracked_query_id == tracked_id)
+    if store_ids is not None:
+        store_ids = list(store_ids)
+        stale = stale.where(best_offers_table.c.store_id.in_(store_ids))
+    db.execute(stale)
+
+    offers = ranked_offers(db.get_bind(), query, store_ids).subquery()
+    db.execute(insert(best_offers_table).from_select(
+        ["tracked_query_id", "product_id", "store_id", "price"],
+        select(literal(tracked_id, Integer), offers.c.id,
+               offers.c.store_id, offers.c.price),
+    ))
+    db.query(models.TrackedQuery).filter(models.TrackedQuery.id == tracked_id)\
+        .update({"refreshed_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def track(db, q: str) -> Optional[int]:
+    """Start keeping the best offers of a query precomputed; returns its ID."""
+    query = normalize(q)
+    if not query:
+        return None
+    tracked_id = tracked.get(db).get(query)
+    if tracked_id is None:
+        tracked_id = db.query(models.TrackedQuery.id).filter(models.TrackedQuery.query == query).scalar()
+    if tracked_id is None:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.TrackedQuery).values(query=query))
+        except IntegrityError:
+            pass  # another process tracked it in the meantime
+        tracked_id = db.query(models.TrackedQuery.id).filter(models.TrackedQuery.query == query).scalar()
+    refresh(db, tracked_id, query)
+    db.commit()
+    tracked.invalidate()
+    return tracked_id
+
+
+def _matches(tokens: list[str], words: list[str]) -> bool:
+    # Same rule as the full-text match: every token prefixes some word of the name or SKU
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def products_changed(db, rows: Iterable[dict]):
+    """
+    Update the best offers affected by inserted or updated product rows.
+
+    Only tracked queries whose terms match a written name are considered,
+    and only for the stores of those rows. A row cheaper than the stored best
+    offer simply replaces it; the per-store minimum is recomputed with the
+    windowed query only when the current best offer got pricier or went out
+    of stock (or a new row has no SKU to look it up by). Does not commit.
+
+    Args:
+        db: Database session, inside the write's transaction
+        rows: Written rows (name, store_id, sku, price, available)
+    """
+    # Read in the write's transaction, so queries just tracked elsewhere are kept current too
+    queries = tracked.get(db, current=True)
+    if not queries:
+        return
+    terms = {tracked_id: fold(query).split() for query, tracked_id in queries.items()}
+    affected: dict[tuple[int, int], list[dict]] = {}
+    for row in rows:
+        words = fold(" ".join(search.tokenize(f"{row['name']} {row['sku'] or ''}"))).split()
+        for tracked_id, tokens in terms.items():
+            if _matches(tokens, words):
+                affected.setdefault((tracked_id, row["store_id"]), []).append(row)
+    if not affected:
+        return
+
+    current = db.execute(
+        select(best_offers_table.c.tracked_query_id, best_offers_table.c.store_id,
+               best_offers_table.c.price, models.Product.sku)
+        .join(models.Product, models.Product.id == best_offers_table.c.product_id)
+        .where(best_offers_table.c.tracked_query_id.in_({tracked_id for tracked_id, _ in affected}),
+               best_offers_table.c.store_id.in_({store_id for _, store_id in affected}))
+    )
+    best = {(tracked_id, store_id): (price, sku) for tracked_id, store_id, price, sku in current}
+
+    recompute: set[tuple[int, int]] = set()
+    cheaper: dict[tuple[int, int], dict] = {}
+    for key, written in affected.items():
+        price, sku = best.get(key, (None, None))
+        for row in written:
+            if sku is not None and row["sku"] == sku:
+                if not row["available"] or row["price"] > price:
+                    recompute.add(key)
+                    break
+            if row["available"] and (price is None or row["price"] < price):
+                if row["sku"] is None:
+                    recompute.add(key)
+                    break
+                cheaper[key] = row
+                price, sku = row["price"], row["sku"]
+
+    cheaper = {key: row for key, row in cheaper.items() if key not in recompute}
+    if cheaper:
+        ids = dict(
+            ((store_id, sku), product_id) for product_id, store_id, sku in db.execute(
+                select(models.Product.id, models.Product.store_id, models.Product.sku).where(
+                    tuple_(models.Product.store_id, models.Product.sku).in_(
+                        {(row["store_id"], row["sku"]) for row in cheaper.values()}
+                    )
+                )
+            )
+        )
+        db.execute(
+            delete(best_offers_table).where(
+                best_offers_table.c.tracked_query_id == bindparam("key_query"),
+                best_offers_table.c.store_id == bindparam("key_store"),
+            ),
+            [{"key_query": tracked_id, "key_store": store_id} for tracked_id, store_id in cheaper],
+        )
+        db.execute(insert(best_offers_table), [
+            {
+                "tracked_query_id": tracked_id,
+                "store_id": store_id,
+                "product_id": ids[(store_id, row["sku"])],
+                "price": row["price"],
+            }
+            for (tracked_id, store_id), row in cheaper.items()
+        ])
+
+    by_query: dict[int, set[int]] = {}
+    for tracked_id, store_id in recompute:
+        by_query.setdefault(tracked_id, set()).add(store_id)
+    names = {tracked_id: query for query, tracked_id in queries.items()}
+    for tracked_id, store_ids in by_query.items():
+        refresh(db, tracked_id, names[tracked_id], store_ids)
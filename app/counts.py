@@ -0,0 +1,130 @@
+"""Total-count strategies for paginated listings.
+
+Exact totals run a COUNT(*) per request. Estimated totals are answered from
+per-(store, category) counters loaded with one grouped query, or from a
+short-lived cache of COUNT results keyed on the filter set.
+"""
+from collections import Counter
+from typing import Optional
+import os
+import threading
+import time
+
+from sqlalchemy import func
+
+from . import models
+from .cache import filter_key
+
+# Seconds before cached counts and counters are recomputed from the database
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "60"))
+
+EXACT = "exact"
+ESTIMATED = "estimated"
+OMITTED = "omitted"
+
+# Filters the per-(store, category) counters can answer on their own
+COUNTER_FILTERS = {"store_id", "category_id"}
+
+
+def _matches(filters: dict, store_id: Optional[int], category_id: Optional[int]) -> bool:
+    """Whether rows in (store_id, category_id) can be counted by a filter set."""
+    if filters.get("store_id") is not None and filters["store_id"] != store_id:
+        return False
+    if filters.get("category_id") is not None and filters["category_id"] != category_id:
+        return False
+    return True
+
+
+class TotalEstimator:
+    """Cached and counter-based totals, shared by all requests of a worker."""
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts: dict[tuple, tuple[int, float]] = {}
+        self._groups: Optional[Counter] = None
+        self._groups_expire = 0.0
+
+    def estimate(self, db, query, filters: dict) -> int:
+        """
+        Return an approximate total for ``query``.
+
+        Args:
+            db: Database session
+            query: Filtered Product query (only counted on a cache miss)
+            filters: Filter values that produced ``query``, used as cache key
+        """
+        active = {name: value for name, value in filters.items() if value is not None}
+        if set(active) <= COUNTER_FILTERS:
+            groups = self._group_counts(db)
+            return sum(n for (store_id, category_id), n in groups.items() if _matches(active, store_id, category_id))
+
+        key = filter_key(active)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        total = query.count()
+        with self._lock:
+            self._counts[key] = (total, now + self.ttl)
+        return total
+
+    def _group_counts(self, db) -> Counter:
+        """Per-(store, category) product counters, reloaded after the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            if self._groups is not None and self._groups_expire > now:
+                return self._groups
+
+        rows = db.query(models.Product.store_id, models.Product.category_id, func.count())\
+            .group_by(models.Product.store_id, models.Product.category_id)\
+            .all()
+        groups = Counter({(store_id, category_id): n for store_id, category_id, n in rows})
+        with self._lock:
+            self._groups = groups
+            self._groups_expire = now + self.ttl
+        return groups
+
+    def record_products_added(self, added: Counter):
+        """
+        Account for inserted products.
+
+        Args:
+            added: Number of new products per (store_id, category_id)
+        """
+        with self._lock:
+            if self._groups is not None:
+                # Copy-on-write: estimate() sums the old Counter without the lock
+                self._groups = self._groups + added
+            stale = [
+                key for key in self._counts
+                if any(_matches(dict(key), store_id, category_id) for store_id, category_id in added)
+            ]
+            for key in stale:
+                del self._counts[key]
+
+    def reset(self):
+        """Forget all cached counts and counters."""
+        with self._lock:
+            self._counts.clear()
+            self._groups = None
+            self._groups_expire = 0.0
+
+
+estimator = TotalEstimator()
+
+
+def page_total(db, query, filters: dict, include_total: bool, estimate_total: bool) -> tuple[Optional[int], str]:
+    """
+    Compute the total for a paginated listing according to the request.
+
+    Returns:
+        Tuple of (total or None, total type: exact/estimated/omitted)
+    """
+    if not include_total:
+        return None, OMITTED
+    if estimate_total:
+        return estimator.estimate(db, query, filters), ESTIMATED
+    return query.count(), EXACT
@@ -1,20 +1,147 @@
 """Database configuration and session management."""
-from sqlalchemy import create_engine
+from pathlib import Path
+from typing import Union
+from fastapi import Depends
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
 
 # Database URL - SQLite por defecto, PostgreSQL en producción
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/price_search.db")
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+# Serve read endpoints through an async engine (aiosqlite / asyncpg) instead of
+# blocking sessions in the threadpool
+ASYNC_DB = os.getenv("ASYNC_DB", "false").lower() == "true"
 
-# Session factory
+# Apply pending migrations on startup; when false, only verify the schema revision
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# Revision matching the schema that create_all() built before migrations existed
+BASELINE_REVISION = "0001"
+
+# PostgreSQL connection pool, per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Test pooled connections before use, so server restarts and idle drops are survived
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Seconds after which a pooled connection is replaced
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Server-side limit per statement (0 = none); migrations run without it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# SQLite production profile: WAL, pragmas on connect and a read/write split
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "true").lower() == "true"
+
+# Bytes of the database file memory-mapped per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+# How long a connection waits for another process's write lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Read-only connections kept for GET endpoints
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+
+def sqlite_pragmas(read_only: bool) -> list[str]:
+    """
+    PRAGMAs run on every new SQLite connection of the tuned profile.
+
+    WAL lets readers run alongside the writer (and is persistent, so only
+    the writer sets it); synchronous=NORMAL is durable in WAL mode except
+    for the last transactions on power loss.
+    """
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA synchronous = NORMAL",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def tune_sqlite(engine, read_only: bool = False):
+    """Run sqlite_pragmas() on every connection ``engine`` opens."""
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas(read_only):
+            cursor.execute(pragma)
+        cursor.close()
+    return engine
+
+
+def is_postgres(url: str) -> bool:
+    """Whether ``url`` points at PostgreSQL (any driver)."""
+    return url.startswith(("postgresql", "postgres:"))
+
+
+def postgres_engine_options(asyncio: bool = False) -> dict:
+    """Pool sizing, pre-ping and statement timeout for PostgreSQL engines."""
+    if asyncio:
+        connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    else:
+        connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+
+
+def create_engines(url: str):
+    """
+    Create the writer and reader engines for ``url``.
+
+    With tuned SQLite, writes go through a single pooled connection (SQLite
+    has one writer anyway, so queuing in the pool beats failing on the file
+    lock) and reads through a pool of query_only connections that WAL never
+    blocks. PostgreSQL gets a sized pool (postgres_engine_options()) shared
+    by reads and writes. Other databases, and untuned SQLite, share one
+    default engine.
+
+    Returns:
+        Tuple of (writer engine, reader engine)
+    """
+    if is_postgres(url):
+        engine = create_engine(url, **postgres_engine_options())
+        return engine, engine
+    if not url.startswith("sqlite"):
+        engine = create_engine(url)
+        return engine, engine
+    connect_args = {"check_same_thread": False}
+    if not SQLITE_TUNING or url in ("sqlite://", "sqlite:///:memory:"):
+        engine = create_engine(url, connect_args=connect_args)
+        return engine, engine
+    writer = tune_sqlite(create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0))
+    reader = tune_sqlite(
+        create_engine(url, connect_args=connect_args, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0),
+        read_only=True,
+    )
+    return writer, reader
+
+
+# Create engines
+engine, read_engine = create_engines(DATABASE_URL)
+
+# Session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for models
 Base = declarative_base()
@@ -29,6 +156,129 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database - create all tables."""
-    Base.metadata.create_all(bind=engine)
+def get_read_db():
+    """Dependency for endpoints that only read (read-only connections with tuned SQLite)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """
+    Async session factory, created on first use.
+
+    Created lazily so the async drivers are only required when ASYNC_DB is on.
+    """
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        options = postgres_engine_options(asyncio=True) if is_postgres(DATABASE_URL) else {}
+        async_engine = create_async_engine(async_database_url(DATABASE_URL), **options)
+        if DATABASE_URL.startswith("sqlite") and SQLITE_TUNING:
+            # Only used for reads
+            tune_sqlite(async_engine.sync_engine, read_only=True)
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+class SyncReader:
+    """Runs read functions on a blocking Session in the threadpool."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        """Call ``fn(session, *args, **kwargs)`` without blocking the event loop."""
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+class AsyncReader:
+    """Runs read functions on an AsyncSession, awaiting the driver's I/O."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        """Call ``fn(session, *args, **kwargs)`` with a sync facade over the async connection."""
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+
+def get_sync_reader(db: Session = Depends(get_read_db)):
+    """Dependency for read endpoints in the default (threadpool) mode."""
+    return SyncReader(db)
+
+
+async def get_async_reader():
+    """Dependency for read endpoints when ASYNC_DB is enabled."""
+    async with get_async_sessionmaker()() as session:
+        yield AsyncReader(session)
+
+
+Reader = Union[SyncReader, AsyncReader]
+
+# Read endpoints depend on this; the mode is picked once at startup
+get_reader = get_async_reader if ASYNC_DB else get_sync_reader
+
+
+def alembic_config():
+    """Alembic configuration pointing at the bundled migrations."""
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def init_db(bind=None):
+    """
+    Initialize database - bring the schema up to the latest migration.
+
+    Databases created by the old create_all() are stamped at the baseline
+    revision first, so only the newer migrations run against them.
+
+    Raises:
+        RuntimeError: If the schema is behind and AUTO_MIGRATE is disabled
+    """
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    bind = bind or engine
+    config = alembic_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+
+    with bind.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Index builds on a large catalog outlast the per-statement limit
+            connection.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        config.attributes["connection"] = connection
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current is None and "products" in inspect(connection).get_table_names():
+            command.stamp(config, BASELINE_REVISION)
+            current = BASELINE_REVISION
+
+        if current == head:
+            return
+        if not AUTO_MIGRATE:
+            raise RuntimeError(
+                f"Database schema is at revision {current}, expected {head}. "
+                "Run 'alembic upgrade head'."
+            )
+        command.upgrade(config, "head")
@@ -0,0 +1,118 @@
+"""Streaming catalog export as NDJSON or CSV.
+
+Rows come from a single column-level SELECT read through a server-side cursor
+(``stream_results`` + ``yield_per``) and are encoded batch by batch, so memory
+does not grow with the catalog and no ORM or Pydantic objects are built.
+"""
+from typing import Iterator, Optional
+import csv
+import io
+import json
+import os
+import zlib
+
+from sqlalchemy import select
+
+from . import models, search
+
+# Rows fetched from the cursor and encoded per batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Output field name -> column
+EXPORT_COLUMNS = {
+    "id": models.Product.id,
+    "name": models.Product.name,
+    "sku": models.Product.sku,
+    "price": models.Product.price,
+    "currency": models.Product.currency,
+    "available": models.Product.available,
+    "store_url": models.Product.store_url,
+    "image_url": models.Product.image_url,
+    "store_id": models.Product.store_id,
+    "store": models.Store.name,
+    "category_id": models.Product.category_id,
+    "category": models.Category.name,
+    "last_updated": models.Product.last_updated,
+}
+
+
+def export_statement(bind, filters: dict):
+    """
+    SELECT for the export, joined with store and category names.
+
+    Args:
+        bind: Engine or connection (selects the full-text dialect)
+        filters: Same filters as /search (q is optional here)
+    """
+    statement = select(*(column.label(name) for name, column in EXPORT_COLUMNS.items()))\
+        .join(models.Store, models.Product.store_id == models.Store.id)\
+        .outerjoin(models.Category, models.Product.category_id == models.Category.id)
+    return search.filter_products(statement, bind, **filters).order_by(models.Product.id)
+
+
+def iter_batches(bind, filters: dict, batch_size: Optional[int] = None) -> Iterator[list]:
+    """Yield lists of export rows straight from a server-side cursor."""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    with bind.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size)\
+            .execute(export_statement(bind, filters))
+        for partition in result.partitions():
+            yield partition
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def encode_ndjson(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encode row batches as newline-delimited JSON."""
+    names = list(EXPORT_COLUMNS)
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for batch in batches:
+        yield "".join(
+            dumps(dict(zip(names, map(_json_value, row)))) + "\n" for row in batch
+        ).encode()
+
+
+def encode_csv(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encode row batches as CSV with a header line."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Incrementally gzip a byte stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_products(bind, filters: dict, format: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """
+    Stream the filtered catalog as encoded bytes.
+
+    Args:
+        bind: Engine to read from (a connection is held for the whole export)
+        filters: /search filters (q, store_id, category_id, min_price, max_price)
+        format: "ndjson" or "csv"
+        compress: Gzip the output
+    """
+    encode = encode_csv if format == "csv" else encode_ndjson
+    chunks = encode(iter_batches(bind, filters))
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,126 @@
+"""Facet counts for /search.
+
+All facets come from one grouped query over the rows matching ``q``: counts
+per (store, category, availability, price bucket, inside price filter). Each
+facet is then summed in Python under every active filter except its own, so
+picking a store still shows the counts of the other stores.
+
+The grouped rows only depend on the search terms and the price filter, so
+they are cached: drilling into a store or category reuses them. Any product
+write drops the cached rows.
+"""
+from collections import Counter
+from typing import Optional
+import os
+
+from sqlalchemy import and_, case, func, literal_column
+
+from . import cache, models, reference
+from .counts import COUNT_CACHE_TTL
+
+# Upper edges of the price histogram buckets (the last bucket is open-ended)
+PRICE_FACET_EDGES = [float(edge) for edge in os.getenv("PRICE_FACET_EDGES", "500,1000,2500,5000,10000,25000").split(",")]
+
+# Grouped facet rows keyed by (q, fuzzy, min_price, max_price)
+facet_cache = cache.ResponseCache(cache.SEARCH_CACHE_SIZE, COUNT_CACHE_TTL)
+
+
+def _number(value: float):
+    # Inlined rather than bound, so the expression in GROUP BY is textually the
+    # same as in SELECT (PostgreSQL compares them with their parameters)
+    return literal_column(repr(float(value)) if isinstance(value, float) else str(int(value)))
+
+
+def price_bucket():
+    """SQL expression numbering the price bucket of a product (0-based)."""
+    price = models.Product.price
+    return case(
+        *((price < _number(edge), _number(index)) for index, edge in enumerate(PRICE_FACET_EDGES)),
+        else_=_number(len(PRICE_FACET_EDGES)),
+    )
+
+
+def _in_price_range(min_price: Optional[float], max_price: Optional[float]):
+    # Same truthiness as search.filter_products
+    conditions = []
+    if min_price:
+        conditions.append(models.Product.price >= _number(float(min_price)))
+    if max_price:
+        conditions.append(models.Product.price <= _number(float(max_price)))
+    return case((and_(*conditions), _number(1)), else_=_number(0)) if conditions else None
+
+
+def search_facets(
+    db,
+    matched,
+    key: tuple,
+    store_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> dict:
+    """
+    Compute store, category, availability and price facets.
+
+    Args:
+        db: Database session
+        matched: Product query restricted to the search terms only
+        key: Cache key identifying ``matched`` (normalized q and fuzzy flag)
+        store_id, category_id, min_price, max_price: Active /search filters
+
+    Returns:
+        Tuple of (dict shaped like schemas.SearchFacets, number of rows
+        matching every filter or None if the rows came from the cache)
+    """
+    key = (key, min_price or None, max_price or None)
+    rows = facet_cache.get(key)
+    fresh = rows is None
+    if fresh:
+        groups = [models.Product.store_id, models.Product.category_id, models.Product.available, price_bucket()]
+        in_range = _in_price_range(min_price, max_price)
+        if in_range is not None:
+            groups.append(in_range)
+        rows = matched.order_by(None).with_entities(*groups, func.count()).group_by(*groups).all()
+        if in_range is None:
+            rows = [(*row[:4], 1, row[4]) for row in rows]
+        facet_cache.set(key, rows)
+
+    stores, categories, availability, buckets = Counter(), Counter(), Counter(), Counter()
+    total = 0
+    for row_store, row_category, available, row_bucket, row_in_range, count in rows:
+        store_ok = not store_id or row_store == store_id
+        category_ok = not category_id or row_category == category_id
+        if category_ok and row_in_range:
+            stores[row_store] += count
+        if store_ok and row_in_range:
+            categories[row_category] += count
+        if store_ok and category_ok and row_in_range:
+            availability[bool(available)] += count
+            total += count
+        if store_ok and category_ok:
+            buckets[row_bucket] += count
+
+    snapshot = reference.snapshot.ensure(db, store_ids=stores, category_ids=categories)
+    edges = [0.0, *PRICE_FACET_EDGES, None]
+    return {
+        "stores": [
+            {"value": value, "label": snapshot.stores[value].name if value in snapshot.stores else None, "count": n}
+            for value, n in stores.most_common()
+        ],
+        "categories": [
+            {
+                "value": value,
+                "label": snapshot.categories[value].name if value in snapshot.categories else None,
+                "count": n,
+            }
+            for value, n in categories.most_common()
+        ],
+        "availability": [
+            {"value": int(value), "label": "available" if value else "unavailable", "count": n}
+            for value, n in availability.most_common()
+        ],
+        "price": [
+            {"min": edges[index], "max": edges[index + 1], "count": buckets[index]}
+            for index in range(len(edges) - 1)
+        ],
+    }, total if fresh else None
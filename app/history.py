@@ -0,0 +1,305 @@
+"""Price history.
+
+Database triggers append a ``price_history`` row (price in integer cents)
+when a product is inserted and whenever an update changes its price, so every
+writer - ORM, bulk insert, upsert - records history without extra round
+trips, and refreshing an unchanged catalog adds nothing.
+
+Storage is bounded by ``compact``: raw points older than
+``PRICE_HISTORY_RAW_DAYS`` are rolled into daily min/max/close rows, daily
+rows older than ``PRICE_HISTORY_DAILY_DAYS`` into weekly ones, and weekly rows
+past ``PRICE_HISTORY_RETENTION_DAYS`` are dropped.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import os
+
+from sqlalchemy import bindparam, delete, event, insert, select
+
+from . import models
+
+# Raw price changes kept before rolling them into daily rows
+PRICE_HISTORY_RAW_DAYS = int(os.getenv("PRICE_HISTORY_RAW_DAYS", "30"))
+
+# Daily rows kept before rolling them into weekly rows
+PRICE_HISTORY_DAILY_DAYS = int(os.getenv("PRICE_HISTORY_DAILY_DAYS", "365"))
+
+# Weekly rows kept (0 = forever)
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", "1095"))
+
+# Product IDs compacted per transaction
+COMPACT_BATCH_SIZE = 10000
+
+RESOLUTIONS = ("raw", "daily", "weekly")
+
+SQLITE_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS price_history_ai AFTER INSERT ON products BEGIN
+        INSERT INTO price_history(product_id, price_cents, recorded_at)
+        VALUES (new.id, CAST(round(new.price * 100) AS INTEGER), COALESCE(new.last_updated, CURRENT_TIMESTAMP));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS price_history_au AFTER UPDATE OF price ON products
+    WHEN new.price IS NOT old.price BEGIN
+        INSERT INTO price_history(product_id, price_cents, recorded_at)
+        VALUES (new.id, CAST(round(new.price * 100) AS INTEGER),
+                CASE WHEN new.last_updated IS NOT old.last_updated THEN new.last_updated ELSE CURRENT_TIMESTAMP END);
+    END""",
+    # Foreign keys are not enforced by default on SQLite, so cascade by hand
+    """CREATE TRIGGER IF NOT EXISTS price_history_ad AFTER DELETE ON products BEGIN
+        DELETE FROM price_history WHERE product_id = old.id;
+        DELETE FROM price_rollups WHERE product_id = old.id;
+    END""",
+]
+
+# Statement-level triggers with transition tables: one INSERT ... SELECT per
+# bulk write instead of one per row
+POSTGRES_DDL = [
+    """CREATE OR REPLACE FUNCTION price_history_insert() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO price_history (product_id, price_cents, recorded_at)
+        SELECT id, round(price * 100)::integer, COALESCE(last_updated, now() AT TIME ZONE 'utc')
+        FROM new_rows;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION price_history_update() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO price_history (product_id, price_cents, recorded_at)
+        SELECT n.id, round(n.price * 100)::integer,
+               CASE WHEN n.last_updated IS DISTINCT FROM o.last_updated THEN n.last_updated
+                    ELSE now() AT TIME ZONE 'utc' END
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE n.price IS DISTINCT FROM o.price;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS price_history_ai ON products",
+    """CREATE TRIGGER price_history_ai AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_history_insert()""",
+    "DROP TRIGGER IF EXISTS price_history_au ON products",
+    """CREATE TRIGGER price_history_au AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_history_update()""",
+]
+
+history_table = models.PriceHistory.__table__
+rollups_table = models.PriceRollup.__table__
+
+
+def create_history_triggers(connection):
+    """Create the price history triggers for the connection's dialect."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        statements = SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = POSTGRES_DDL
+    else:
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def drop_history_triggers(connection):
+    """Drop the price history triggers (SQLite drops them with ``products``)."""
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("DROP TRIGGER IF EXISTS price_history_ai ON products")
+        connection.exec_driver_sql("DROP TRIGGER IF EXISTS price_history_au ON products")
+        connection.exec_driver_sql("DROP FUNCTION IF EXISTS price_history_insert()")
+        connection.exec_driver_sql("DROP FUNCTION IF EXISTS price_history_update()")
+
+
+def week_start(day: date) -> date:
+    """Monday of the week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+def _add(buckets: dict, key, low: int, high: int, close: int, changes: int):
+    # Inputs arrive oldest first, so the latest close wins
+    bucket = buckets.get(key)
+    if bucket is None:
+        buckets[key] = [low, high, close, changes]
+    else:
+        bucket[0] = min(bucket[0], low)
+        bucket[1] = max(bucket[1], high)
+        bucket[2] = close
+        bucket[3] += changes
+
+
+def price_history(
+    db,
+    product_id: int,
+    resolution: str = "daily",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list[dict]:
+    """
+    Price history of one product, downsampled to ``resolution``.
+
+    Raw points are only kept for PRICE_HISTORY_RAW_DAYS, so "raw" covers that
+    window. Compacted periods coarser than the resolution (weekly rows in a
+    daily series) are returned as they are.
+
+    Args:
+        db: Database session
+        product_id: Product ID
+        resolution: "raw", "daily" or "weekly"
+        since, until: Optional time range
+
+    Returns:
+        Points oldest first, shaped like schemas.PricePoint (prices in currency units)
+    """
+    raw = select(history_table.c.recorded_at, history_table.c.price_cents)\
+        .where(history_table.c.product_id == product_id)\
+        .order_by(history_table.c.recorded_at, history_table.c.id)
+    if since is not None:
+        raw = raw.where(history_table.c.recorded_at >= since)
+    if until is not None:
+        raw = raw.where(history_table.c.recorded_at < until)
+
+    if resolution == "raw":
+        return [
+            {"at": at, "min": cents / 100, "max": cents / 100, "close": cents / 100}
+            for at, cents in db.execute(raw)
+        ]
+
+    rollups = select(
+        rollups_table.c.period_start, rollups_table.c.days, rollups_table.c.min_cents,
+        rollups_table.c.max_cents, rollups_table.c.close_cents, rollups_table.c.changes,
+    ).where(rollups_table.c.product_id == product_id).order_by(rollups_table.c.period_start)
+    if since is not None:
+        rollups = rollups.where(rollups_table.c.period_start > since.date() - timedelta(days=7))
+    if until is not None:
+        rollups = rollups.where(rollups_table.c.period_start < until.date())
+
+    bucket_of = week_start if resolution == "weekly" else (lambda day: day)
+    buckets: dict[date, list] = {}
+    for start, days, low, high, close, changes in db.execute(rollups):
+        if since is not None and start + timedelta(days=days) <= since.date():
+            continue
+        _add(buckets, bucket_of(start) if days == 1 else start, low, high, close, changes)
+    for at, cents in db.execute(raw):
+        _add(buckets, bucket_of(at.date()), cents, cents, cents, 1)
+
+    return [
+        {
+            "at": datetime.combine(start, time()),
+            "min": low / 100,
+            "max": high / 100,
+            "close": close / 100,
+        }
+        for start, (low, high, close, changes) in sorted(buckets.items())
+    ]
+
+
+def _write_rollups(db, buckets: dict, days: int):
+    """Insert rollup rows, merging any that already exist for the same period."""
+    if not buckets:
+        return
+    product_ids = [product_id for product_id, _ in buckets]
+    starts = [start for _, start in buckets]
+    # Range scan rather than an IN list of every key (bounded by SQLite's variable limit)
+    existing = [
+        row for row in db.execute(
+            select(rollups_table).where(
+                rollups_table.c.product_id.between(min(product_ids), max(product_ids)),
+                rollups_table.c.period_start.between(min(starts), max(starts)),
+            )
+        )
+        if (row.product_id, row.period_start) in buckets
+    ]
+    if existing:
+        merged = {}
+        for row in existing:
+            _add(merged, (row.product_id, row.period_start), row.min_cents, row.max_cents, row.close_cents, row.changes)
+        for key, values in buckets.items():
+            _add(merged, key, *values)
+        buckets = merged
+        db.execute(
+            delete(rollups_table).where(
+                rollups_table.c.product_id == bindparam("key_product_id"),
+                rollups_table.c.period_start == bindparam("key_start"),
+            ),
+            [{"key_product_id": row.product_id, "key_start": row.period_start} for row in existing],
+        )
+    db.execute(insert(rollups_table), [
+        {
+            "product_id": product_id,
+            "period_start": start,
+            "days": days,
+            "min_cents": low,
+            "max_cents": high,
+            "close_cents": close,
+            "changes": changes,
+        }
+        for (product_id, start), (low, high, close, changes) in buckets.items()
+    ])
+
+
+def compact(db, now: Optional[datetime] = None) -> dict:
+    """
+    Roll old raw points into daily rows and old daily rows into weekly rows.
+
+    Cutoffs are aligned to day and week boundaries so a period is always
+    compacted in one piece. Runs in product ID windows of COMPACT_BATCH_SIZE,
+    committing after each.
+
+    Returns:
+        Counts of raw points and daily rows compacted, and weekly rows expired
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = datetime.combine(now.date() - timedelta(days=PRICE_HISTORY_RAW_DAYS), time())
+    daily_cutoff = week_start(now.date() - timedelta(days=PRICE_HISTORY_DAILY_DAYS))
+    stats = {"raw": 0, "daily": 0, "expired": 0}
+
+    last_id = db.scalar(select(history_table.c.product_id).order_by(history_table.c.product_id.desc()).limit(1))
+    last_rollup = db.scalar(select(rollups_table.c.product_id).order_by(rollups_table.c.product_id.desc()).limit(1))
+    end = max(last_id or 0, last_rollup or 0)
+
+    for low in range(0, end, COMPACT_BATCH_SIZE):
+        high = low + COMPACT_BATCH_SIZE
+        daily: dict[tuple, list] = {}
+        raw_filter = (
+            history_table.c.product_id > low,
+            history_table.c.product_id <= high,
+            history_table.c.recorded_at < raw_cutoff,
+        )
+        rows = db.execute(
+            select(history_table.c.product_id, history_table.c.recorded_at, history_table.c.price_cents)
+            .where(*raw_filter)
+            .order_by(history_table.c.product_id, history_table.c.recorded_at, history_table.c.id)
+        )
+        for product_id, at, cents in rows:
+            _add(daily, (product_id, at.date()), cents, cents, cents, 1)
+            stats["raw"] += 1
+        if daily:
+            _write_rollups(db, daily, days=1)
+            db.execute(delete(history_table).where(*raw_filter))
+
+        daily_filter = (
+            rollups_table.c.product_id > low,
+            rollups_table.c.product_id <= high,
+            rollups_table.c.days == 1,
+            rollups_table.c.period_start < daily_cutoff,
+        )
+        weekly: dict[tuple, list] = {}
+        rows = db.execute(
+            select(rollups_table.c.product_id, rollups_table.c.period_start, rollups_table.c.min_cents,
+                   rollups_table.c.max_cents, rollups_table.c.close_cents, rollups_table.c.changes)
+            .where(*daily_filter)
+            .order_by(rollups_table.c.product_id, rollups_table.c.period_start)
+        ).all()
+        if rows:
+            db.execute(delete(rollups_table).where(*daily_filter))
+            for product_id, start, low_cents, high_cents, close, changes in rows:
+                _add(weekly, (product_id, week_start(start)), low_cents, high_cents, close, changes)
+            stats["daily"] += len(rows)
+            _write_rollups(db, weekly, days=7)
+        db.commit()
+
+    if PRICE_HISTORY_RETENTION_DAYS:
+        expired = db.execute(delete(rollups_table).where(
+            rollups_table.c.period_start < now.date() - timedelta(days=PRICE_HISTORY_RETENTION_DAYS)
+        ))
+        stats["expired"] = expired.rowcount
+        db.commit()
+    return stats
+
+
+event.listen(history_table, "after_create", lambda target, connection, **kw: create_history_triggers(connection))
+event.listen(history_table, "before_drop", lambda target, connection, **kw: drop_history_triggers(connection))
@@ -0,0 +1,366 @@
+"""Set-based product writes shared by the bulk endpoints and the importer.
+
+Rows are validated up front against the in-memory reference snapshot and the
+existing (store_id, sku) keys, then inserted in executemany chunks with one
+transaction per chunk. If a chunk still fails (e.g. a concurrent writer took
+a SKU), only that chunk is retried row by row so errors stay per row.
+
+Upserts classify each row against the stored version first, so unchanged rows
+are never written and the rest go out as one INSERT ... ON CONFLICT
+(store_id, sku) DO UPDATE per chunk. Other backends get a portable fallback:
+the classified rows are written with plain INSERTs and keyed UPDATEs.
+
+On PostgreSQL, large chunks are loaded with COPY into a staging table and
+merged with one INSERT ... SELECT (see ``pgcopy``).
+
+Each chunk also refreshes the precomputed best offers (``compare``) that its
+rows affect, in the same transaction.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Sequence
+import os
+
+from sqlalchemy import bindparam, func, insert, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from . import cache, compare, counts, facets, models, pgcopy, reference, schemas
+from .text import fold
+
+# Core table inserts (not ORM bulk inserts) so rows with NULLs share one statement
+products_table = models.Product.__table__
+
+# Rows per INSERT executemany / transaction
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# An upserted row is only written when one of these differs from the stored row
+TRACKED_COLUMNS = ("price", "available", "store_url", "image_url")
+
+# Columns refreshed from the feed when a tracked column changed
+UPDATE_COLUMNS = (
+    "name", "name_normalized", "price", "currency", "store_url", "image_url", "available", "last_updated",
+)
+
+# Dialects with INSERT ... ON CONFLICT; the rest use the select-then-write fallback
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+@dataclass
+class WriteResult:
+    """Outcome of a bulk write."""
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: list[str] = field(default_factory=list)
+    # New rows per (store_id, category_id), for counters and cache invalidation
+    added: Counter = field(default_factory=Counter)
+    # (store_id, category_id) of updated rows, before and after the update
+    touched: set = field(default_factory=set)
+    # Outcome and error message per payload index; only kept when not None,
+    # so a write shared by several callers can be split back (see writer)
+    outcomes: Optional[dict[int, str]] = None
+    row_errors: dict[int, str] = field(default_factory=dict)
+
+    def record(self, outcome: str, indexes: Iterable[int]):
+        """Count rows as created, updated or unchanged."""
+        indexes = list(indexes)
+        setattr(self, outcome, getattr(self, outcome) + len(indexes))
+        if self.outcomes is not None:
+            self.outcomes.update(dict.fromkeys(indexes, outcome))
+
+    def fail(self, idx: int, message: str):
+        """Record a per-row failure."""
+        self.failed += 1
+        self.errors.append(f"Product {idx}: {message}")
+        if self.outcomes is not None:
+            self.outcomes[idx] = "failed"
+            self.row_errors[idx] = message
+
+
+def chunked(items: list, size: int) -> Iterable[list]:
+    """Split a list into consecutive chunks of at most ``size`` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def products_written(added: Counter, updated: Iterable[tuple[int, Optional[int]]] = ()):
+    """Refresh counters and drop cached searches after products were written."""
+    counts.estimator.record_products_added(added)
+    cache.search_cache.invalidate(set(added) | set(updated))
+    facets.facet_cache.invalidate(set(added) | set(updated))
+
+
+def existing_skus(db, keys: set[tuple[int, str]]) -> set[tuple[int, str]]:
+    """Return which (store_id, sku) keys are already stored."""
+    found = set()
+    for chunk in chunked(list(keys), BULK_CHUNK_SIZE):
+        rows = db.execute(
+            select(models.Product.store_id, models.Product.sku)
+            .where(tuple_(models.Product.store_id, models.Product.sku).in_(chunk))
+        )
+        found.update((store_id, sku) for store_id, sku in rows)
+    return found
+
+
+def validate_products(
+    db,
+    products: list[schemas.ProductCreate],
+    result: WriteResult,
+    offset: int = 0,
+    reject_existing: bool = True,
+    indexes: Optional[Sequence[int]] = None,
+) -> list[tuple[int, dict]]:
+    """
+    Check foreign keys and SKU uniqueness without touching each row in SQL.
+
+    Args:
+        db: Database session
+        products: Products to validate
+        result: Collects the per-row errors
+        offset: Index of ``products[0]`` in the original payload
+        reject_existing: Fail rows whose (store_id, sku) is already stored
+        indexes: Payload index of each product, when they are not consecutive
+
+    Returns:
+        List of (payload index, column values) for the valid rows
+    """
+    snapshot = reference.snapshot.ensure(
+        db,
+        store_ids={p.store_id for p in products},
+        category_ids={p.category_id for p in products},
+    )
+
+    valid = []
+    seen = set()
+    if indexes is None:
+        indexes = range(offset, offset + len(products))
+    for idx, product in zip(indexes, products):
+        if product.store_id not in snapshot.stores:
+            result.fail(idx, f"Store ID {product.store_id} not found")
+            continue
+        if product.category_id and product.category_id not in snapshot.categories:
+            result.fail(idx, f"Category ID {product.category_id} not found")
+            continue
+        if product.sku is not None:
+            key = (product.store_id, product.sku)
+            if key in seen:
+                result.fail(idx, f"Duplicate SKU {product.sku!r} for store {product.store_id} in request")
+                continue
+            seen.add(key)
+        valid.append((idx, product.model_dump()))
+
+    taken = existing_skus(db, seen) if seen and reject_existing else set()
+    if taken:
+        kept = []
+        for idx, row in valid:
+            if (row["store_id"], row["sku"]) in taken:
+                result.fail(idx, f"SKU {row['sku']!r} already exists for store {row['store_id']}")
+            else:
+                kept.append((idx, row))
+        valid = kept
+    return valid
+
+
+def insert_products(
+    db,
+    products: list[schemas.ProductCreate],
+    offset: int = 0,
+    indexes: Optional[Sequence[int]] = None,
+    result: Optional[WriteResult] = None,
+) -> WriteResult:
+    """
+    Validate and insert products in executemany chunks.
+
+    Args:
+        db: Database session (committed once per chunk)
+        products: Products to insert
+        offset: Index of ``products[0]`` in the original payload, for errors
+        indexes: Payload index of each product, when they are not consecutive
+        result: WriteResult to fill in (e.g. one keeping per-row outcomes)
+
+    Returns:
+        WriteResult with created/failed counts and per-row errors
+    """
+    result = result or WriteResult()
+    valid = validate_products(db, products, result, offset, indexes=indexes)
+
+    for chunk in chunked(valid, BULK_CHUNK_SIZE):
+        try:
+            rows = [row for _, row in chunk]
+            if pgcopy.use_copy(db, len(rows)):
+                db.execute(insert(products_table).from_select(pgcopy.COPY_COLUMNS, pgcopy.copy_to_staging(db, rows)))
+            else:
+                db.execute(insert(products_table), rows)
+            compare.products_changed(db, (row for _, row in chunk))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            _insert_rows_individually(db, chunk, result)
+            continue
+
+        result.record("created", (idx for idx, _ in chunk))
+        result.added.update((row["store_id"], row["category_id"]) for _, row in chunk)
+
+    products_written(result.added)
+    return result
+
+
+def _insert_rows_individually(db, chunk: list[tuple[int, dict]], result: WriteResult):
+    """Slow path for a failed chunk: one transaction per row to find the culprits."""
+    for idx, row in chunk:
+        try:
+            db.execute(insert(products_table), [row])
+            compare.products_changed(db, [row])
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            result.fail(idx, f"Integrity error - {e.orig}")
+            continue
+        except SQLAlchemyError as e:
+            db.rollback()
+            result.fail(idx, str(e))
+            continue
+        result.record("created", [idx])
+        result.added[(row["store_id"], row["category_id"])] += 1
+
+
+def upsert_statement(dialect: str, source=None):
+    """
+    INSERT ... ON CONFLICT (store_id, sku) DO UPDATE for the given dialect.
+
+    The update only fires when a tracked column differs, so a concurrent
+    writer that already stored the same values is not rewritten.
+
+    Args:
+        dialect: Dialect name
+        source: Select to insert from (pgcopy staging), instead of executemany parameters
+    """
+    dialect_insert = UPSERT_INSERTS.get(dialect)
+    if dialect_insert is None:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+    statement = dialect_insert(products_table)
+    if source is not None:
+        statement = statement.from_select(pgcopy.COPY_COLUMNS, source)
+    excluded = statement.excluded
+    columns = products_table.c
+    return statement.on_conflict_do_update(
+        index_elements=[columns.store_id, columns.sku],
+        set_={
+            **{name: excluded[name] for name in UPDATE_COLUMNS},
+            "category_id": func.coalesce(excluded.category_id, columns.category_id),
+        },
+        where=or_(*(columns[name].is_distinct_from(excluded[name]) for name in TRACKED_COLUMNS)),
+    )
+
+
+def _write_upserts_portably(db, rows: list[dict], stored: dict):
+    """
+    Fallback for dialects without ON CONFLICT: insert new keys, update stored ones.
+
+    ``stored`` is the chunk's select of existing keys, so a key taken by a
+    concurrent writer since then fails the chunk like any insert conflict.
+    """
+    inserts = [row for row in rows if (row["store_id"], row["sku"]) not in stored]
+    updates = [
+        {
+            **{name: row[name] for name in UPDATE_COLUMNS if name in row},
+            "name_normalized": fold(row["name"]),
+            "category_id": row["category_id"] or stored[(row["store_id"], row["sku"])].category_id,
+            "key_store": row["store_id"],
+            "key_sku": row["sku"],
+        }
+        for row in rows
+        if (row["store_id"], row["sku"]) in stored
+    ]
+    if inserts:
+        db.execute(insert(products_table), inserts)
+    if updates:
+        columns = products_table.c
+        keyed = products_table.update()\
+            .where(columns.store_id == bindparam("key_store"), columns.sku == bindparam("key_sku"))
+        db.execute(keyed, updates)
+
+
+def upsert_products(
+    db,
+    products: list[schemas.ProductCreate],
+    offset: int = 0,
+    indexes: Optional[Sequence[int]] = None,
+    result: Optional[WriteResult] = None,
+) -> WriteResult:
+    """
+    Insert new products and update changed ones, keyed on (store_id, sku).
+
+    Rows whose tracked columns match the stored row are counted as unchanged
+    and not written. Rows without a SKU cannot be matched and are inserted.
+
+    Args:
+        db: Database session (committed once per chunk)
+        products: Products to upsert
+        offset: Index of ``products[0]`` in the original payload, for errors
+        indexes: Payload index of each product, when they are not consecutive
+        result: WriteResult to fill in (e.g. one keeping per-row outcomes)
+
+    Returns:
+        WriteResult with created/updated/unchanged/failed counts
+    """
+    result = result or WriteResult()
+    valid = validate_products(db, products, result, offset, reject_existing=False, indexes=indexes)
+    dialect = db.get_bind().dialect.name
+    statement = upsert_statement(dialect) if dialect in UPSERT_INSERTS else None
+
+    for chunk in chunked(valid, BULK_CHUNK_SIZE):
+        keys = [(row["store_id"], row["sku"]) for _, row in chunk if row["sku"] is not None]
+        stored = {}
+        if keys:
+            rows = db.execute(
+                select(products_table.c.store_id, products_table.c.sku, products_table.c.category_id,
+                       *(products_table.c[name] for name in TRACKED_COLUMNS))
+                .where(tuple_(products_table.c.store_id, products_table.c.sku).in_(keys))
+            )
+            stored = {(row.store_id, row.sku): row for row in rows}
+
+        inserts, upserts = [], []
+        added, touched = Counter(), set()
+        outcomes: dict[str, list[int]] = {"created": [], "updated": [], "unchanged": []}
+        for idx, row in chunk:
+            current = stored.get((row["store_id"], row["sku"])) if row["sku"] is not None else None
+            if current is None:
+                (upserts if row["sku"] is not None else inserts).append(row)
+                added[(row["store_id"], row["category_id"])] += 1
+                outcomes["created"].append(idx)
+            elif any(getattr(current, name) != row[name] for name in TRACKED_COLUMNS):
+                upserts.append(row)
+                outcomes["updated"].append(idx)
+                touched.add((current.store_id, current.category_id))
+                touched.add((row["store_id"], row["category_id"] or current.category_id))
+            else:
+                outcomes["unchanged"].append(idx)
+
+        try:
+            if upserts and pgcopy.use_copy(db, len(upserts)):
+                db.execute(upsert_statement(dialect, pgcopy.copy_to_staging(db, upserts)))
+            elif upserts and statement is not None:
+                db.execute(statement, upserts)
+            elif upserts:
+                _write_upserts_portably(db, upserts, stored)
+            if inserts:
+                db.execute(insert(products_table), inserts)
+            compare.products_changed(db, upserts + inserts)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            for idx, _ in chunk:
+                result.fail(idx, f"Batch failed - {getattr(e, 'orig', e)}")
+            continue
+
+        for outcome, chunk_indexes in outcomes.items():
+            result.record(outcome, chunk_indexes)
+        result.added.update(added)
+        result.touched |= touched
+
+    products_written(result.added, result.touched)
+    return result
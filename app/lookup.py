@@ -0,0 +1,85 @@
+"""Batch product lookups: many IDs, or many (store, SKU) pairs, in one query.
+
+Both lookups select the rows with a single ``IN`` over the primary key or
+the unique ``(store_id, sku)`` index and go through the fast serialization
+path, so stores and categories come from the reference snapshot instead of
+extra queries. Results follow the order of the request; keys that match
+nothing are reported back as missing.
+"""
+from typing import Iterable, Optional
+import os
+
+from sqlalchemy import tuple_
+
+from . import models, serialization
+
+# Most IDs or SKUs accepted by one lookup request
+LOOKUP_MAX_KEYS = int(os.getenv("LOOKUP_MAX_KEYS", "200"))
+
+
+class InvalidLookup(ValueError):
+    """Raised when a lookup names too many (or malformed) keys."""
+
+
+def _check_size(count: int):
+    if not count:
+        raise InvalidLookup("No products requested")
+    if count > LOOKUP_MAX_KEYS:
+        raise InvalidLookup(f"At most {LOOKUP_MAX_KEYS} products per request (got {count})")
+
+
+def parse_ids(ids: str) -> list[int]:
+    """
+    Parse an ``ids`` query parameter.
+
+    Args:
+        ids: Comma-separated product IDs
+
+    Returns:
+        Distinct IDs in the order given
+    """
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise InvalidLookup("ids must be comma-separated integers")
+    parsed = list(dict.fromkeys(parsed))
+    _check_size(len(parsed))
+    return parsed
+
+
+def by_ids(db, ids: list[int], fields: Optional[tuple[str, ...]] = None) -> tuple[list[dict], list[int]]:
+    """
+    Fetch products by ID.
+
+    Returns:
+        Tuple of (product dicts in the order of ``ids``, IDs not found)
+    """
+    rows = serialization.product_columns(
+        db.query(models.Product).filter(models.Product.id.in_(ids)), fields
+    ).all()
+    position = {product_id: index for index, product_id in enumerate(ids)}
+    rows.sort(key=lambda row: position[row.id])
+    found = {row.id for row in rows}
+    return serialization.product_dicts(db, rows, fields), [product_id for product_id in ids if product_id not in found]
+
+
+def by_skus(
+    db, keys: Iterable[tuple[int, str]], fields: Optional[tuple[str, ...]] = None
+) -> tuple[list[dict], list[tuple[int, str]]]:
+    """
+    Fetch products by (store_id, sku).
+
+    Returns:
+        Tuple of (product dicts in the order of ``keys``, keys not found)
+    """
+    keys = list(dict.fromkeys(keys))
+    _check_size(len(keys))
+    # store_id and sku are needed to order the rows, whatever the fieldset
+    selected = None if fields is None else (*fields, "store_id", "sku")
+    rows = serialization.product_columns(
+        db.query(models.Product).filter(tuple_(models.Product.store_id, models.Product.sku).in_(keys)), selected
+    ).all()
+    position = {key: index for index, key in enumerate(keys)}
+    rows.sort(key=lambda row: position[(row.store_id, row.sku)])
+    found = {(row.store_id, row.sku) for row in rows}
+    return serialization.product_dicts(db, rows, fields), [key for key in keys if key not in found]
@@ -1,19 +1,28 @@
 """FastAPI application - Main entry point."""
-from fastapi import FastAPI, Depends, HTTPException, Query, Body
+from fastapi import FastAPI, Depends, HTTPException, Query, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import FiniteFloat
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime
 from typing import Optional
 import logging
 import math
+import zlib
 
-from . import models, schemas
-from .database import get_db, init_db, engine
+from . import (
+    cache, compare, counts, export, facets, history, lookup, matching, models, pagination, reference, schemas,
+    search, serialization, streaming, suggest, writer,
+)
+from .database import ReadSessionLocal, Reader, get_read_db, get_reader, init_db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Store and category are serialized with every product; load them in the same SELECT
+PRODUCT_RELATIONS = (joinedload(models.Product.store), joinedload(models.Product.category))
+
 # Create FastAPI app
 app = FastAPI(
     title="Magic Solutions Price API",
@@ -39,12 +48,44 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(pagination.InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: pagination.InvalidCursor):
+    """Reject cursors that were not issued by this API."""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(serialization.InvalidFields)
+async def invalid_fields_handler(request: Request, exc: serialization.InvalidFields):
+    """Reject fieldsets naming unknown product fields."""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(lookup.InvalidLookup)
+async def invalid_lookup_handler(request: Request, exc: lookup.InvalidLookup):
+    """Reject empty, malformed or oversized batch lookups."""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(writer.WriterBusy)
+async def writer_busy_handler(request: Request, exc: writer.WriterBusy):
+    """Ask producers to back off while the write queue is full."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup."""
     logger.info("Initializing database...")
     init_db()
     logger.info("Database initialized successfully")
+    suggest.index.start(ReadSessionLocal)
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush queued writes and stop the suggestion refresher."""
+    writer.writes.stop(timeout=30)
+    suggest.index.stop(timeout=5)
 
 
 @app.get("/", tags=["Root"])
@@ -64,16 +105,32 @@ def health_check():
     return {"status": "healthy"}
 
 
-@app.get("/search", response_model=schemas.ProductSearchResponse, tags=["Products"])
-def search_products(
+@app.get("/cache/stats", tags=["Health"])
+def cache_stats():
+    """Hit/miss metrics of the /search response cache."""
+    return cache.search_cache.stats()
+
+
+@app.get("/search", response_model=schemas.SearchResponse, tags=["Products"])
+async def search_products(
     q: str = Query(..., min_length=2, description="Search query"),
     store_id: Optional[int] = Query(None, description="Filter by store ID"),
     category_id: Optional[int] = Query(None, description="Filter by category ID"),
-    min_price: Optional[float] = Query(None, description="Minimum price"),
-    max_price: Optional[float] = Query(None, description="Maximum price"),
+    min_price: Optional[FiniteFloat] = Query(None, description="Minimum price"),
+    max_price: Optional[FiniteFloat] = Query(None, description="Maximum price"),
     page: int = Query(1, ge=1, description="Page number (starts at 1)"),
     per_page: int = Query(50, ge=1, le=100, description="Results per page (max 100)"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from pagination.next_cursor (overrides page)"),
+    include_total: bool = Query(True, description="Set to false to skip counting the matches"),
+    estimate_total: bool = Query(False, description="Return a cached/approximate total instead of an exact count"),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    fuzzy: bool = Query(False, description="Tolerate typos and rank by similarity"),
+    sort: Optional[str] = Query(
+        None, pattern="^(price|relevance|relevance_then_price)$",
+        description="price, relevance or relevance_then_price (default: price, similarity with fuzzy)"
+    ),
+    include_facets: bool = Query(False, alias="facets", description="Add store/category/availability/price facets"),
+    reader: Reader = Depends(get_reader)
 ):
     """
     Search products by name with filters and pagination.
@@ -85,80 +142,396 @@ def search_products(
     - **max_price**: Optional maximum price filter
     - **page**: Page number (default 1)
     - **per_page**: Results per page (default 50, max 100)
+    - **cursor**: Opaque cursor for keyset pagination (constant cost on deep pages)
+    - **include_total**: Count the matches (default true)
+    - **estimate_total**: Use a cached or counter-based estimate instead of COUNT(*)
+    - **fields**: Only return these product fields (e.g. `id,name,price`), or
+      `summary` for `id,name,price,store_id,image_url`
+    - **fuzzy**: Match accent- and typo-insensitively ("telefono samsumg") and
+      sort by similarity; use `page`, cursors are not supported
+    - **sort**: `price` (cheapest first), `relevance` (BM25 over name and SKU,
+      boosted for products in stock) or `relevance_then_price` (cheapest first
+      among similarly relevant matches); relevance sorts use `page`, not cursors
+    - **facets**: Add counts per store, category, availability and price
+      bucket; each facet applies every active filter except its own
+
+    Responses are cached per normalized parameter set (see `/cache/stats`).
     """
-    # Build query
-    query = db.query(models.Product).filter(models.Product.name.ilike(f"%{q}%"))
-
-    # Apply filters
-    if store_id:
-        query = query.filter(models.Product.store_id == store_id)
-    if category_id:
-        query = query.filter(models.Product.category_id == category_id)
-    if min_price:
-        query = query.filter(models.Product.price >= min_price)
-    if max_price:
-        query = query.filter(models.Product.price <= max_price)
-
-    # Get total count
-    total = query.count()
-
-    # Calculate pagination
-    total_pages = math.ceil(total / per_page) if total > 0 else 0
-    offset = (page - 1) * per_page
-
-    # Get paginated results
-    products = query.order_by(models.Product.price).offset(offset).limit(per_page).all()
-
-    return schemas.ProductSearchResponse(
-        products=products,
-        pagination=schemas.PaginationMeta(
-            page=page,
-            per_page=per_page,
-            total=total,
-            total_pages=total_pages
-        )
+    projection = serialization.parse_fields(fields)
+    suggest.index.record_query(q)
+    if fuzzy and cursor:
+        raise pagination.InvalidCursor("Cursors are not supported with fuzzy=true; use page")
+    ranked = sort in ("relevance", "relevance_then_price") or (sort is None and fuzzy)
+    if ranked and cursor:
+        raise pagination.InvalidCursor("Cursors are only supported with sort=price; use page")
+    filters = {
+        "q": " ".join(search.tokenize(q)),
+        "fuzzy": True if fuzzy else None,
+        "store_id": store_id,
+        "category_id": category_id,
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+
+    # Serve hot queries straight from the response cache
+    cache_key = (
+        cache.filter_key(filters), sort, page, per_page, cursor, include_total, estimate_total, projection,
+        include_facets
     )
+    cached = cache.search_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    def read(db: Session):
+        # Build query against the full-text (or trigram) index and apply filters
+        matched = db.query(models.Product)
+        if fuzzy:
+            # The filters must apply before the fuzzy candidate cut
+            query, score = search.fuzzy_match_products(
+                db, matched, q,
+                store_id=store_id, category_id=category_id, min_price=min_price, max_price=max_price
+            )
+            # The candidate cut depends on the filters, so facets count the
+            # listed candidates only (cached per filter set)
+            matched, facet_key = query, (filters["q"], fuzzy, store_id, category_id)
+        else:
+            if ranked:
+                matched, score = search.ranked_match(matched, q, db.get_bind())
+            else:
+                matched = search.match_products(matched, q, db.get_bind())
+            facet_key = (filters["q"], fuzzy)
+            query = search.filter_products(
+                matched, db.get_bind(),
+                store_id=store_id, category_id=category_id, min_price=min_price, max_price=max_price
+            )
+
+        # Freshly computed facets come with the exact total, so skip the COUNT
+        # then; fuzzy pages always count their own candidates
+        facet_counts, facet_total = None, None
+        if include_facets:
+            facet_counts, facet_total = facets.search_facets(
+                db, matched, facet_key,
+                store_id=store_id, category_id=category_id, min_price=min_price, max_price=max_price
+            )
+        if facet_total is not None and not fuzzy and include_total and not estimate_total:
+            total, total_type = facet_total, counts.EXACT
+        else:
+            total, total_type = counts.page_total(db, query, filters, include_total, estimate_total)
+
+        # Calculate pagination
+        total_pages = math.ceil(total / per_page) if total is not None else None
+        offset = (page - 1) * per_page
+
+        # Get paginated results, seeking past the cursor when one is given
+        if ranked:
+            # Best matches first, picked by ORDER BY ... LIMIT in the database;
+            # the score is not a cursor key, so pages use OFFSET
+            if sort == "relevance_then_price":
+                query = search.order_by_relevance_then_price(db, query, score)
+            else:
+                query = query.order_by(score.desc(), models.Product.price, models.Product.id)
+            query = query.offset(offset)
+        else:
+            query = query.order_by(models.Product.price, models.Product.id)
+            if cursor:
+                query = pagination.after_price_cursor(query, cursor)
+            else:
+                query = query.offset(offset)
+        rows = serialization.product_columns(query, projection).limit(per_page + 1).all()
+        if ranked or fuzzy:
+            rows, next_cursor = rows[:per_page], None
+        else:
+            rows, next_cursor = pagination.split_page(rows, per_page, pagination.price_cursor)
+
+        body = serialization.dumps({
+            "products": serialization.product_dicts(db, rows, projection),
+            "pagination": schemas.PaginationMeta(
+                page=page,
+                per_page=per_page,
+                total=total,
+                total_pages=total_pages,
+                total_type=total_type,
+                next_cursor=next_cursor
+            ).model_dump(),
+            "facets": facet_counts
+        })
+        cache.search_cache.set(cache_key, body, store_id=store_id, category_id=category_id)
+        return Response(content=body, media_type="application/json")
+
+    return await reader.run(read)
+
+
+@app.get("/suggest", response_model=schemas.SuggestResponse, tags=["Products"])
+def suggest_terms(
+    prefix: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(suggest.SUGGEST_TOP_K, ge=1, le=suggest.SUGGEST_TOP_K, description="Maximum suggestions"),
+):
+    """
+    Autocomplete the search box from memory.
+
+    Suggests product-name words and popular searches starting with `prefix`
+    (accent- and case-insensitive), most popular first. New products are
+    picked up within `SUGGEST_REFRESH_SECONDS` by the background refresher;
+    nothing is suggested until its first build finishes.
+    """
+    body = serialization.dumps({"prefix": prefix, "suggestions": suggest.index.suggest(prefix, limit)})
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/writer/stats", tags=["Health"])
+def writer_stats():
+    """Write queue depth, and batches/transaction groups/rows written by this worker."""
+    return writer.writes.stats()
+
+
+@app.get("/suggest/stats", tags=["Health"])
+def suggest_stats():
+    """Size and memory use of this worker's suggestion index."""
+    return suggest.index.stats()
+
+
+@app.get("/compare", response_model=schemas.CompareResponse, tags=["Products"])
+async def compare_prices(
+    q: str = Query(..., min_length=2, description="Search query"),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    reader: Reader = Depends(get_reader)
+):
+    """
+    Compare stores: the cheapest in-stock product matching `q` in each store,
+    cheapest first.
+
+    Tracked queries (imported ones, and queries asked for often) are answered
+    from precomputed rows kept current by every import; the rest run one
+    windowed query. A query asked for often starts being tracked in the
+    background, on the writer thread.
+    """
+    projection = serialization.parse_fields(fields)
+    query = compare.normalize(q)
+
+    def read(db):
+        tracked_id = compare.tracked.get(db).get(query)
+        rows = db.query(models.Product)\
+            .filter(models.Product.id.in_(compare.offer_ids(db, query, tracked_id)))\
+            .order_by(models.Product.price, models.Product.id)
+        rows = serialization.product_columns(rows, projection).all()
+        return tracked_id, serialization.dumps({
+            "query": query,
+            "precomputed": tracked_id is not None,
+            "offers": serialization.product_dicts(db, rows, projection),
+        })
+
+    tracked_id, body = await reader.run(read)
+    if tracked_id is None and query and compare.tracked.hit(query):
+        try:
+            future = writer.writes.submit_task(lambda db: compare.track(db, query))
+        except writer.WriterBusy:
+            compare.tracked.done(query)
+        else:
+            future.add_done_callback(lambda _: compare.tracked.done(query))
+    return Response(content=body, media_type="application/json")
+
+
+@app.post("/compare/tracked", response_model=schemas.TrackedQuery, tags=["Products"])
+def track_query(q: str = Query(..., min_length=2, description="Search query")):
+    """
+    Keep the best offers of `q` precomputed from now on (the importer tracks its queries).
+
+    Runs on the single writer (503 when its queue is full).
+    """
+    query = compare.normalize(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    tracked_id = writer.writes.submit_task(lambda db: compare.track(db, query)).result()
+    return schemas.TrackedQuery(id=tracked_id, query=query)
+
+
+@app.post("/products/match", response_model=schemas.MatchResponse, tags=["Products"])
+def match_products(limit: Optional[int] = Query(None, ge=1, description="Stop after this many listings")):
+    """
+    Group products not yet matched with the same product in other stores.
+
+    Runs on the single writer (503 when its queue is full).
+    """
+    matched = writer.writes.submit_task(lambda db: matching.Matcher().match_pending(db, limit=limit)).result()
+    return schemas.MatchResponse(matched=matched)
+
+
+@app.get("/products", response_model=schemas.ProductBatch, tags=["Products"])
+async def get_products(
+    ids: str = Query(..., description="Comma-separated product IDs"),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    reader: Reader = Depends(get_reader)
+):
+    """
+    Get several products by ID in one request (cart and watch list views).
+
+    - **ids**: Product IDs, e.g. `12,7,31` (at most `LOOKUP_MAX_KEYS`)
+    - **fields**: Only return these product fields, or `summary`
+
+    Products are returned in the order requested; unknown IDs are listed in `missing`.
+    """
+    projection = serialization.parse_fields(fields)
+    product_ids = lookup.parse_ids(ids)
+
+    def read(db: Session):
+        products, missing = lookup.by_ids(db, product_ids, projection)
+        body = serialization.dumps({"products": products, "missing": missing})
+        return Response(content=body, media_type="application/json")
+
+    return await reader.run(read)
+
+
+@app.post("/products/lookup", response_model=schemas.ProductLookupResponse, tags=["Products"])
+def lookup_products(
+    keys: schemas.ProductLookup = Body(...),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Resolve store SKUs to products in one request.
+
+    - **products**: List of `{store_id, sku}` (at most `LOOKUP_MAX_KEYS`)
+    - **fields**: Only return these product fields, or `summary`
+
+    Products are returned in the order requested; unknown SKUs are listed in `missing`.
+    """
+    projection = serialization.parse_fields(fields)
+    products, missing = lookup.by_skus(db, [(key.store_id, key.sku) for key in keys.products], projection)
+    body = serialization.dumps({
+        "products": products,
+        "missing": [{"store_id": store_id, "sku": sku} for store_id, sku in missing],
+    })
+    return Response(content=body, media_type="application/json")
 
 
 @app.get("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
-def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, reader: Reader = Depends(get_reader)):
     """
     Get product by ID.
 
     - **product_id**: Product ID
     """
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    def read(db: Session):
+        product = db.query(models.Product)\
+            .options(*PRODUCT_RELATIONS)\
+            .filter(models.Product.id == product_id)\
+            .first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return schemas.Product.model_validate(product)
+
+    return await reader.run(read)
+
+
+@app.get("/products/{product_id}/offers", response_model=schemas.ProductOffers, tags=["Products"])
+async def get_product_offers(product_id: int, reader: Reader = Depends(get_reader)):
+    """
+    Get the same product across every store, cheapest first.
+
+    - **product_id**: Product ID (any listing of the product)
+
+    Listings not matched yet have no canonical product and only list themselves.
+    """
+    def read(db: Session):
+        listing = db.query(models.Product.id, models.Product.canonical_id)\
+            .filter(models.Product.id == product_id)\
+            .first()
+        if not listing:
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        canonical = None
+        query = db.query(models.Product)
+        if listing.canonical_id is None:
+            query = query.filter(models.Product.id == product_id)
+        else:
+            canonical = db.get(models.CanonicalProduct, listing.canonical_id)
+            query = query.filter(models.Product.canonical_id == listing.canonical_id)
+        rows = serialization.product_columns(query.order_by(models.Product.price, models.Product.id)).all()
+
+        body = serialization.dumps({
+            "canonical": schemas.CanonicalProduct.model_validate(canonical).model_dump() if canonical else None,
+            "offers": serialization.product_dicts(db, rows),
+        })
+        return Response(content=body, media_type="application/json")
+
+    return await reader.run(read)
+
+
+@app.get("/products/{product_id}/history", response_model=schemas.PriceHistory, tags=["Products"])
+async def get_price_history(
+    product_id: int,
+    resolution: str = Query("daily", pattern="^(raw|daily|weekly)$", description="raw, daily or weekly"),
+    since: Optional[datetime] = Query(None, description="Only points from this time on"),
+    until: Optional[datetime] = Query(None, description="Only points before this time"),
+    reader: Reader = Depends(get_reader)
+):
+    """
+    Get the price history of a product, downsampled on the server.
+
+    - **resolution**: `raw` (every change, recent days only), `daily` or
+      `weekly` min/max/close
+    - **since** / **until**: Optional time range (UTC)
+    """
+    def read(db: Session):
+        product = db.query(models.Product.currency).filter(models.Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return {
+            "product_id": product_id,
+            "currency": product.currency or "MXN",
+            "resolution": resolution,
+            "points": history.price_history(db, product_id, resolution, since, until),
+        }
+
+    return await reader.run(read)
 
 
 @app.get("/stores", response_model=list[schemas.Store], tags=["Stores"])
-def get_stores(db: Session = Depends(get_db)):
-    """Get all available stores."""
-    stores = db.query(models.Store).all()
-    return stores
+async def get_stores(request: Request, reader: Reader = Depends(get_reader)):
+    """Get all available stores (served from memory, supports If-None-Match)."""
+    def read(db: Session):
+        snapshot = reference.snapshot.get(db)
+        return reference.etag_response(request, snapshot.store_list_body, snapshot.version)
+
+    return await reader.run(read)
+
+
+@app.post("/stores", response_model=schemas.Store, tags=["Stores"])
+def create_store(store: schemas.StoreCreate = Body(...)):
+    """
+    Create a store, or return the existing one with the same name.
+
+    Runs on the single writer (503 when its queue is full).
+    """
+    return writer.writes.submit_task(
+        lambda db: schemas.Store.model_validate(reference.get_or_create_store(db, store))
+    ).result()
 
 
 @app.get("/stores/{store_id}", response_model=schemas.Store, tags=["Stores"])
-def get_store(store_id: int, db: Session = Depends(get_db)):
+async def get_store(store_id: int, request: Request, reader: Reader = Depends(get_reader)):
     """
     Get store by ID.
 
     - **store_id**: Store ID
     """
-    store = db.query(models.Store).filter(models.Store.id == store_id).first()
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
-    return store
+    def read(db: Session):
+        snapshot = reference.snapshot.ensure(db, store_ids=[store_id])
+        if store_id not in snapshot.stores:
+            raise HTTPException(status_code=404, detail="Store not found")
+        return reference.etag_response(request, snapshot.store_bodies[store_id], snapshot.version)
+
+    return await reader.run(read)
 
 
 @app.get("/stores/{store_id}/products", response_model=list[schemas.Product], tags=["Stores"])
-def get_store_products(
+async def get_store_products(
     store_id: int,
     limit: int = Query(50, le=100),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header (overrides offset)"),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    reader: Reader = Depends(get_reader)
 ):
     """
     Get all products from a specific store.
@@ -166,47 +539,83 @@ def get_store_products(
     - **store_id**: Store ID
     - **limit**: Maximum results (default 50, max 100)
     - **offset**: Offset for pagination
+    - **cursor**: Opaque cursor for keyset pagination; the next one is returned
+      in the `X-Next-Cursor` response header
+    - **fields**: Only return these product fields (e.g. `id,name,price`), or
+      `summary` for `id,name,price,store_id,image_url`
     """
-    # Verify store exists
-    store = db.query(models.Store).filter(models.Store.id == store_id).first()
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
+    projection = serialization.parse_fields(fields)
 
-    products = db.query(models.Product)\
-        .filter(models.Product.store_id == store_id)\
-        .offset(offset)\
-        .limit(limit)\
-        .all()
+    def read(db: Session):
+        # Verify store exists
+        if store_id not in reference.snapshot.ensure(db, store_ids=[store_id]).stores:
+            raise HTTPException(status_code=404, detail="Store not found")
 
-    return products
+        query = db.query(models.Product)\
+            .filter(models.Product.store_id == store_id)\
+            .order_by(models.Product.id)
+        if cursor:
+            query = pagination.after_id_cursor(query, cursor)
+        else:
+            query = query.offset(offset)
+        rows = serialization.product_columns(query, projection).limit(limit + 1).all()
+        rows, next_cursor = pagination.split_page(rows, limit, pagination.id_cursor)
+
+        body = serialization.dumps(serialization.product_dicts(db, rows, projection))
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    return await reader.run(read)
 
 
 @app.get("/categories", response_model=list[schemas.Category], tags=["Categories"])
-def get_categories(db: Session = Depends(get_db)):
-    """Get all available product categories."""
-    categories = db.query(models.Category).order_by(models.Category.name).all()
-    return categories
+async def get_categories(request: Request, reader: Reader = Depends(get_reader)):
+    """Get all available product categories (served from memory, supports If-None-Match)."""
+    def read(db: Session):
+        snapshot = reference.snapshot.get(db)
+        return reference.etag_response(request, snapshot.category_list_body, snapshot.version)
+
+    return await reader.run(read)
+
+
+@app.post("/categories", response_model=schemas.Category, tags=["Categories"])
+def create_category(category: schemas.CategoryCreate = Body(...)):
+    """
+    Create a category, or return the existing one with the same name.
+
+    Runs on the single writer (503 when its queue is full).
+    """
+    return writer.writes.submit_task(
+        lambda db: schemas.Category.model_validate(reference.get_or_create_category(db, category))
+    ).result()
 
 
 @app.get("/categories/{category_id}", response_model=schemas.Category, tags=["Categories"])
-def get_category(category_id: int, db: Session = Depends(get_db)):
+async def get_category(category_id: int, request: Request, reader: Reader = Depends(get_reader)):
     """
     Get category by ID.
 
     - **category_id**: Category ID
     """
-    category = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    return category
+    def read(db: Session):
+        snapshot = reference.snapshot.ensure(db, category_ids=[category_id])
+        if category_id not in snapshot.categories:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return reference.etag_response(request, snapshot.category_bodies[category_id], snapshot.version)
+
+    return await reader.run(read)
 
 
 @app.get("/categories/{category_id}/products", response_model=schemas.ProductSearchResponse, tags=["Categories"])
-def get_category_products(
+async def get_category_products(
     category_id: int,
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from pagination.next_cursor (overrides page)"),
+    include_total: bool = Query(True, description="Set to false to skip counting the matches"),
+    estimate_total: bool = Query(False, description="Return a cached/approximate total instead of an exact count"),
+    fields: Optional[str] = Query(None, description="Comma-separated product fields, or 'summary'"),
+    reader: Reader = Depends(get_reader)
 ):
     """
     Get all products from a specific category.
@@ -214,85 +623,169 @@ def get_category_products(
     - **category_id**: Category ID
     - **page**: Page number (default 1)
     - **per_page**: Results per page (default 50, max 100)
+    - **cursor**: Opaque cursor for keyset pagination (constant cost on deep pages)
+    - **include_total**: Count the matches (default true)
+    - **estimate_total**: Use a cached or counter-based estimate instead of COUNT(*)
+    - **fields**: Only return these product fields (e.g. `id,name,price`), or
+      `summary` for `id,name,price,store_id,image_url`
     """
-    # Verify category exists
-    category = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
+    projection = serialization.parse_fields(fields)
+
+    def read(db: Session):
+        # Verify category exists
+        if category_id not in reference.snapshot.ensure(db, category_ids=[category_id]).categories:
+            raise HTTPException(status_code=404, detail="Category not found")
+
+        # Build query
+        query = db.query(models.Product).filter(models.Product.category_id == category_id)
+
+        # Get total count
+        filters = {"category_id": category_id}
+        total, total_type = counts.page_total(db, query, filters, include_total, estimate_total)
+
+        # Calculate pagination
+        total_pages = math.ceil(total / per_page) if total is not None else None
+        offset = (page - 1) * per_page
+
+        # Get paginated results, seeking past the cursor when one is given
+        query = query.order_by(models.Product.price, models.Product.id)
+        if cursor:
+            query = pagination.after_price_cursor(query, cursor)
+        else:
+            query = query.offset(offset)
+        rows = serialization.product_columns(query, projection).limit(per_page + 1).all()
+        rows, next_cursor = pagination.split_page(rows, per_page, pagination.price_cursor)
+
+        body = serialization.dumps({
+            "products": serialization.product_dicts(db, rows, projection),
+            "pagination": schemas.PaginationMeta(
+                page=page,
+                per_page=per_page,
+                total=total,
+                total_pages=total_pages,
+                total_type=total_type,
+                next_cursor=next_cursor
+            ).model_dump()
+        })
+        return Response(content=body, media_type="application/json")
+
+    return await reader.run(read)
 
-    # Build query
-    query = db.query(models.Product).filter(models.Product.category_id == category_id)
 
-    # Get total count
-    total = query.count()
+@app.post("/products/bulk", response_model=schemas.BulkCreateResponse, tags=["Products"])
+def bulk_create_products(bulk_data: schemas.ProductBulkCreate = Body(...)):
+    """
+    Bulk create products.
 
-    # Calculate pagination
-    total_pages = math.ceil(total / per_page) if total > 0 else 0
-    offset = (page - 1) * per_page
+    - **products**: List of products to create
 
-    # Get paginated results
-    products = query.order_by(models.Product.price).offset(offset).limit(per_page).all()
+    Rows are validated up front and inserted in batches, one transaction per
+    batch; invalid rows are reported individually and do not block the rest.
+    Writes go through the single writer, which may share a transaction with
+    other small requests; 503 means the write queue is full.
+    """
+    result = writer.writes.write("insert", bulk_data.products)
 
-    return schemas.ProductSearchResponse(
-        products=products,
-        pagination=schemas.PaginationMeta(
-            page=page,
-            per_page=per_page,
-            total=total,
-            total_pages=total_pages
-        )
+    return schemas.BulkCreateResponse(
+        created=result.created,
+        failed=result.failed,
+        errors=result.errors
     )
 
 
-@app.post("/products/bulk", response_model=schemas.BulkCreateResponse, tags=["Products"])
-def bulk_create_products(
-    bulk_data: schemas.ProductBulkCreate = Body(...),
-    db: Session = Depends(get_db)
-):
+@app.post("/products/upsert", response_model=schemas.UpsertResponse, tags=["Products"])
+def bulk_upsert_products(bulk_data: schemas.ProductBulkCreate = Body(...)):
     """
-    Bulk create products.
+    Bulk create or update products, matched on (store_id, sku).
 
-    - **products**: List of products to create
+    - **products**: List of products to create or update
+
+    Existing products are only written when their price, availability or URLs
+    changed; the rest are reported as unchanged. Products without a SKU are
+    always created. Writes go through the single writer (503 when its queue is full).
     """
-    created = 0
-    failed = 0
-    errors = []
+    result = writer.writes.write("upsert", bulk_data.products)
+
+    return schemas.UpsertResponse(
+        created=result.created,
+        updated=result.updated,
+        unchanged=result.unchanged,
+        failed=result.failed,
+        errors=result.errors
+    )
 
-    for idx, product_data in enumerate(bulk_data.products):
-        try:
-            # Verify store exists
-            store = db.query(models.Store).filter(models.Store.id == product_data.store_id).first()
-            if not store:
-                errors.append(f"Product {idx}: Store ID {product_data.store_id} not found")
-                failed += 1
-                continue
-
-            # Verify category exists if provided
-            if product_data.category_id:
-                category = db.query(models.Category).filter(models.Category.id == product_data.category_id).first()
-                if not category:
-                    errors.append(f"Product {idx}: Category ID {product_data.category_id} not found")
-                    failed += 1
-                    continue
-
-            # Create product
-            db_product = models.Product(**product_data.model_dump())
-            db.add(db_product)
-            db.commit()
-            db.refresh(db_product)
-            created += 1
-
-        except IntegrityError as e:
-            db.rollback()
-            errors.append(f"Product {idx}: Integrity error - {str(e.orig)}")
-            failed += 1
-        except Exception as e:
-            db.rollback()
-            errors.append(f"Product {idx}: {str(e)}")
-            failed += 1
 
-    return schemas.BulkCreateResponse(
-        created=created,
-        failed=failed,
-        errors=errors
+@app.post("/products/ingest", response_model=schemas.IngestJob, tags=["Products"])
+async def ingest_products(
+    request: Request,
+    upsert: bool = Query(False, description="Update existing (store_id, sku) instead of rejecting them"),
+    job_id: Optional[str] = Query(None, pattern=r"^[A-Za-z0-9_-]{1,64}$", description="Client-chosen ID to poll")
+):
+    """
+    Stream products as newline-delimited JSON (one ProductCreate per line).
+
+    The body may be gzip-compressed (``Content-Encoding: gzip``). Lines are
+    validated and written in batches as they arrive, so large loads never
+    have to fit in memory. Pass ``job_id`` to poll ``/products/ingest/{job_id}``
+    for progress while the upload runs. Products are numbered from 0 in the
+    order they appear in the stream.
+    """
+    job = streaming.jobs.start(upsert, job_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail=f"Ingest job {job_id} is already running")
+    compressed = request.headers.get("content-encoding", "").lower() in ("gzip", "x-gzip")
+    try:
+        await streaming.ingest_stream(request.stream(), job, compressed=compressed)
+    except streaming.LineTooLong as e:
+        raise HTTPException(status_code=413, detail=f"{e} (job {job.id})")
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e} (job {job.id})")
+
+    return JSONResponse(
+        content=schemas.IngestJob.model_validate(job).model_dump(mode="json"),
+        headers={"X-Ingest-Job": job.id}
     )
+
+
+@app.get("/products/ingest/{job_id}", response_model=schemas.IngestJob, tags=["Products"])
+def get_ingest_job(job_id: str):
+    """Progress of a streaming ingest started by this worker."""
+    job = streaming.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
+
+
+@app.get("/export", tags=["Products"])
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv"),
+    gzip: bool = Query(False, description="Gzip-compress the output"),
+    q: Optional[str] = Query(None, min_length=2, description="Search query (optional)"),
+    store_id: Optional[int] = Query(None, description="Filter by store ID"),
+    category_id: Optional[int] = Query(None, description="Filter by category ID"),
+    min_price: Optional[FiniteFloat] = Query(None, description="Minimum price"),
+    max_price: Optional[FiniteFloat] = Query(None, description="Maximum price"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Stream the product catalog with store and category names.
+
+    Accepts the same filters as `/search`, with `q` optional. Rows are read
+    from a server-side cursor and encoded as they arrive, ordered by ID.
+    """
+    filters = {
+        "q": q,
+        "store_id": store_id,
+        "category_id": category_id,
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+    # The stream opens its own connection: the request session is closed
+    # before the response body is sent
+    body = export.export_products(db.get_bind(), filters, format=format, compress=gzip)
+
+    # Gzip output is served as a .gz file rather than a transfer encoding
+    filename = f"products.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else export.FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
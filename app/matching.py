@@ -0,0 +1,260 @@
+"""Cross-store product matching.
+
+Listings are clustered into canonical products. Each name is reduced to a
+signature (brand, model tokens, significant tokens) and to blocking keys
+such as ``samsung:s23``; a listing is only scored against canonical
+products sharing one of its keys, so matching never compares all pairs.
+
+Matching is incremental: ``Matcher.match_pending`` assigns listings whose
+``canonical_id`` is still NULL, in batches with a handful of statements per
+batch. Keys and signatures seen during a run are kept in memory, so later
+batches only query keys they have not seen yet.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional
+import os
+
+from sqlalchemy import bindparam, insert, select, update
+
+from . import models
+from .text import fold
+
+# Minimum token similarity (0-1) to join an existing canonical product
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", "0.5"))
+
+# Listings assigned per batch / transaction
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "2000"))
+
+# Candidates scored per blocking key (most recent canonical products first)
+MAX_BLOCK_SIZE = 50
+
+BRANDS = {
+    "acer", "apple", "asus", "bose", "canon", "dell", "hisense", "hp", "huawei", "jbl", "lenovo", "lg",
+    "microsoft", "motorola", "nikon", "nintendo", "oppo", "philips", "realme", "samsung", "sony", "tcl",
+    "xbox", "xiaomi",
+}
+
+# Units glued to the preceding number ("128 GB" -> "128gb"), so capacities compare as one token
+UNITS = {"gb", "tb", "mb", "mp", "hz", "w", "mah", "pulgadas", "pulg", "cm", "mm", "kg", "g", "ml", "l"}
+
+# Words that say nothing about which product it is
+STOPWORDS = {
+    "a", "al", "color", "con", "de", "del", "el", "en", "envio", "gratis", "la", "las", "los", "modelo",
+    "nuevo", "nueva", "original", "para", "por", "sin", "y",
+}
+
+products_table = models.Product.__table__
+canonical_table = models.CanonicalProduct.__table__
+keys_table = models.CanonicalKey.__table__
+
+
+@dataclass(frozen=True)
+class Signature:
+    """What a product name says about the product."""
+    brand: Optional[str]
+    models: frozenset
+    tokens: frozenset
+
+    def keys(self) -> set[str]:
+        """
+        Blocking keys: each model token (or, without one, each long word),
+        alone and prefixed with the brand when it is known.
+
+        The unprefixed key lets listings that omit the brand ("iPhone 15")
+        meet the ones that state it ("Apple iPhone 15").
+        """
+        words = self.models or {token for token in self.tokens if len(token) >= 4 and token != self.brand}
+        keys = {f"*:{word}" for word in words}
+        if self.brand:
+            keys.update(f"{self.brand}:{word}" for word in words)
+        return keys
+
+
+def signature(name: str) -> Signature:
+    """Reduce a product name to its signature."""
+    tokens = []
+    for token in fold(name).split():
+        if token in UNITS and tokens and tokens[-1].isdigit():
+            tokens[-1] += token
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    brand = next((token for token in tokens if token in BRANDS), None)
+    model_tokens = frozenset(token for token in tokens if any(c.isdigit() for c in token))
+    return Signature(brand, model_tokens, frozenset(tokens))
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """
+    Score two signatures (0-1).
+
+    Different brands, or model tokens that contradict each other (neither
+    set contains the other: "iphone 15" vs "iphone 14"), never match.
+    """
+    if a.brand and b.brand and a.brand != b.brand:
+        return 0.0
+    if a.models and b.models and not (a.models <= b.models or b.models <= a.models):
+        return 0.0
+    union = len(a.tokens | b.tokens)
+    return len(a.tokens & b.tokens) / union if union else 0.0
+
+
+class Matcher:
+    """Assigns listings to canonical products, remembering blocks between batches."""
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        # blocking key -> canonical IDs (a key absent from the dict was never queried)
+        self._blocks: dict[str, list[int]] = {}
+        self._keyed: set[tuple[str, int]] = set()
+        self._signatures: dict[int, Signature] = {}
+
+    def _load_blocks(self, db, keys: Iterable[str]):
+        missing = [key for key in keys if key not in self._blocks]
+        for key in missing:
+            self._blocks[key] = []
+        for start in range(0, len(missing), 500):
+            rows = db.execute(
+                select(keys_table.c.key, canonical_table.c.id, canonical_table.c.brand,
+                       canonical_table.c.model, canonical_table.c.tokens)
+                .join(canonical_table, canonical_table.c.id == keys_table.c.canonical_id)
+                .where(keys_table.c.key.in_(missing[start:start + 500]))
+                .order_by(canonical_table.c.id)
+            )
+            for key, canonical_id, brand, model, tokens in rows:
+                self._blocks[key].append(canonical_id)
+                self._keyed.add((key, canonical_id))
+                if canonical_id not in self._signatures:
+                    self._signatures[canonical_id] = Signature(
+                        brand, frozenset((model or "").split()), frozenset(tokens.split())
+                    )
+
+    def best_match(self, sig: Signature) -> Optional[int]:
+        """Best canonical ID for a signature among its (loaded) blocks, if any is close enough."""
+        best_id, best_score = None, self.threshold
+        seen = set()
+        for key in sig.keys():
+            for canonical_id in self._blocks.get(key, ())[-MAX_BLOCK_SIZE:]:
+                if canonical_id in seen:
+                    continue
+                seen.add(canonical_id)
+                score = similarity(sig, self._signatures[canonical_id])
+                if score >= best_score:
+                    best_id, best_score = canonical_id, score
+        return best_id
+
+    def assign(self, db, listings: list[tuple[int, str]]) -> dict[int, int]:
+        """
+        Assign a batch of listings to canonical products and commit.
+
+        Args:
+            db: Database session
+            listings: (product ID, name) pairs
+
+        Returns:
+            Mapping of product ID -> canonical ID
+        """
+        signatures = [(product_id, name, signature(name)) for product_id, name in listings]
+        self._load_blocks(db, {key for _, _, sig in signatures for key in sig.keys()})
+
+        assigned: dict[int, object] = {}
+        new_keys: list[tuple[str, object]] = []
+        created: list[_Pending] = []
+        for product_id, name, sig in signatures:
+            canonical_id = self.best_match(sig)
+            if canonical_id is None:
+                # Placeholder until the batch's canonical rows are inserted
+                canonical_id = _Pending(name, sig)
+                created.append(canonical_id)
+                self._signatures[canonical_id] = sig
+            for key in sig.keys():
+                if (key, canonical_id) not in self._keyed:
+                    self._keyed.add((key, canonical_id))
+                    self._blocks.setdefault(key, []).append(canonical_id)
+                    new_keys.append((key, canonical_id))
+            assigned[product_id] = canonical_id
+
+        if created:
+            ids = db.execute(
+                insert(canonical_table).returning(canonical_table.c.id, sort_by_parameter_order=True),
+                [pending.row() for pending in created],
+            ).scalars().all()
+            for pending, canonical_id in zip(created, ids):
+                pending.id = canonical_id
+                self._signatures[canonical_id] = self._signatures.pop(pending)
+            # Placeholders only ever sit in blocks that received a new key
+            for key, cid in new_keys:
+                if isinstance(cid, _Pending):
+                    self._keyed.discard((key, cid))
+                    self._keyed.add((key, cid.id))
+            for key in {key for key, cid in new_keys if isinstance(cid, _Pending)}:
+                self._blocks[key] = [_real(cid) for cid in self._blocks[key]]
+
+        if new_keys:
+            db.execute(insert(keys_table), [{"key": key, "canonical_id": _real(cid)} for key, cid in new_keys])
+        if assigned:
+            db.execute(
+                update(products_table)
+                .where(products_table.c.id == bindparam("product_id"))
+                .values(canonical_id=bindparam("match_id")),
+                [{"product_id": pid, "match_id": _real(cid)} for pid, cid in assigned.items()],
+            )
+        db.commit()
+        return {pid: _real(cid) for pid, cid in assigned.items()}
+
+    def match_pending(self, db, limit: Optional[int] = None) -> int:
+        """
+        Match every listing without a canonical product, oldest first.
+
+        Args:
+            db: Database session
+            limit: Stop after this many listings (None = all)
+
+        Returns:
+            Number of listings assigned
+        """
+        done = 0
+        last_id = 0
+        while limit is None or done < limit:
+            size = MATCH_BATCH_SIZE if limit is None else min(MATCH_BATCH_SIZE, limit - done)
+            listings = db.execute(
+                select(products_table.c.id, products_table.c.name)
+                .where(products_table.c.canonical_id.is_(None), products_table.c.id > last_id)
+                .order_by(products_table.c.id)
+                .limit(size)
+            ).all()
+            if not listings:
+                break
+            self.assign(db, [tuple(row) for row in listings])
+            done += len(listings)
+            last_id = listings[-1][0]
+        return done
+
+
+class _Pending:
+    """Canonical product created in the current batch, not inserted yet."""
+    __slots__ = ("name", "signature", "id")
+
+    def __init__(self, name: str, sig: Signature):
+        self.name = name
+        self.signature = sig
+        self.id: Optional[int] = None
+
+    def row(self) -> dict:
+        return {
+            "name": self.name,
+            "brand": self.signature.brand,
+            "model": " ".join(sorted(self.signature.models)) or None,
+            "tokens": " ".join(sorted(self.signature.tokens)),
+        }
+
+
+def _real(canonical_id) -> int:
+    return canonical_id.id if isinstance(canonical_id, _Pending) else canonical_id
+
+
+def reset(db):
+    """Forget every match (for a full re-clustering)."""
+    db.execute(update(products_table).values(canonical_id=None))
+    db.execute(keys_table.delete())
+    db.execute(canonical_table.delete())
+    db.commit()
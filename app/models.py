@@ -1,8 +1,15 @@
 """SQLAlchemy database models."""
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
+from .text import fold
+
+
+def _default_name_normalized(context):
+    """Fold the name for Core inserts that do not set name_normalized."""
+    name = context.get_current_parameters().get("name")
+    return fold(name) if name is not None else None
 
 
 class Store(Base):
@@ -41,9 +48,23 @@ class Category(Base):
 class Product(Base):
     """Product model - represents products from stores."""
     __tablename__ = "products"
+    __table_args__ = (
+        # Upsert key for store feeds (NULL SKUs never collide)
+        Index("ix_products_store_id_sku", "store_id", "sku", unique=True),
+        # Store listings ordered by id
+        Index("ix_products_store_id_id", "store_id", "id"),
+        # Filtered listings ordered by price (id breaks ties for cursors)
+        Index("ix_products_store_id_price", "store_id", "price", "id"),
+        Index("ix_products_category_id_price", "category_id", "price", "id"),
+        Index("ix_products_available_price", "available", "price", "id"),
+        Index("ix_products_price", "price", "id"),
+        # Offers of a canonical product ordered by price
+        Index("ix_products_canonical_id_price", "canonical_id", "price"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
+    name_normalized = Column(String, default=_default_name_normalized)  # Nombre sin acentos, para búsqueda difusa
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     store_url = Column(String, nullable=False)  # URL del producto específico
@@ -52,12 +73,92 @@ class Product(Base):
     currency = Column(String, default="MXN")
     image_url = Column(String)
     available = Column(Integer, default=1)  # 1 = disponible, 0 = no disponible
+    canonical_id = Column(Integer, ForeignKey("canonical_products.id"), nullable=True)  # Mismo producto en otras tiendas
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     store = relationship("Store", back_populates="products")
     category = relationship("Category", back_populates="products")
+    canonical = relationship("CanonicalProduct", back_populates="products")
 
     def __repr__(self):
         return f"<Product(name='{self.name}', price={self.price})>"
+
+
+class CanonicalProduct(Base):
+    """CanonicalProduct model - one real-world product listed by several stores."""
+    __tablename__ = "canonical_products"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)  # Nombre del primer listado agrupado
+    brand = Column(String)
+    model = Column(String)  # Tokens de modelo (con dígitos), separados por espacio
+    tokens = Column(String, nullable=False)  # Tokens significativos, para comparar nuevos listados
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationship
+    products = relationship("Product", back_populates="canonical")
+
+    def __repr__(self):
+        return f"<CanonicalProduct(name='{self.name}')>"
+
+
+class CanonicalKey(Base):
+    """Blocking key -> canonical product, so matching only compares within a block."""
+    __tablename__ = "canonical_keys"
+
+    key = Column(String, primary_key=True)  # "marca:modelo", p. ej. "samsung:s23"
+    canonical_id = Column(Integer, ForeignKey("canonical_products.id"), primary_key=True)
+
+
+class PriceHistory(Base):
+    """PriceHistory model - one row per price change (written by database triggers)."""
+    __tablename__ = "price_history"
+    __table_args__ = (
+        Index("ix_price_history_product_id_recorded_at", "product_id", "recorded_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    price_cents = Column(Integer, nullable=False)  # Precio en centavos
+    recorded_at = Column(DateTime, nullable=False)
+
+
+class PriceRollup(Base):
+    """PriceRollup model - compacted price history for one day or one week."""
+    __tablename__ = "price_rollups"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    period_start = Column(Date, primary_key=True)  # Día, o lunes de la semana
+    days = Column(Integer, nullable=False)  # 1 = diario, 7 = semanal
+    min_cents = Column(Integer, nullable=False)
+    max_cents = Column(Integer, nullable=False)
+    close_cents = Column(Integer, nullable=False)  # Último precio del periodo
+    changes = Column(Integer, nullable=False)  # Cambios de precio agregados
+
+
+class TrackedQuery(Base):
+    """TrackedQuery model - search whose cheapest offer per store is kept precomputed."""
+    __tablename__ = "tracked_queries"
+
+    id = Column(Integer, primary_key=True)
+    query = Column(String, unique=True, nullable=False)  # Normalizada: "samsung galaxy"
+    refreshed_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BestOffer(Base):
+    """BestOffer model - cheapest available product of a store for a tracked query."""
+    __tablename__ = "best_offers"
+
+    tracked_query_id = Column(Integer, ForeignKey("tracked_queries.id", ondelete="CASCADE"), primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    price = Column(Float, nullable=False)
+
+
+@event.listens_for(Product.name, "set")
+def _normalize_name(target, value, oldvalue, initiator):
+    """Keep name_normalized in step with ORM writes to name."""
+    target.name_normalized = fold(value) if value is not None else None
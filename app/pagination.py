@@ -0,0 +1,74 @@
+"""Opaque keyset cursors for product listings.
+
+A cursor encodes the sort key of the last row of a page, so the next page is
+a range seek on an index instead of an OFFSET scan over the skipped rows.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+
+from sqlalchemy import tuple_
+
+from . import models
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(*values) -> str:
+    """Encode sort key values into an opaque URL-safe cursor."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor back into its ``size`` sort key values."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+    ):
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def price_cursor(product) -> str:
+    """Cursor for listings ordered by ``(price, id)``."""
+    return encode_cursor(product.price, product.id)
+
+
+def id_cursor(product) -> str:
+    """Cursor for listings ordered by ``id``."""
+    return encode_cursor(product.id)
+
+
+def after_price_cursor(query, cursor: str):
+    """Restrict a ``(price, id)``-ordered query to rows after the cursor."""
+    price, product_id = decode_cursor(cursor, 2)
+    return query.filter(tuple_(models.Product.price, models.Product.id) > tuple_(price, product_id))
+
+
+def after_id_cursor(query, cursor: str):
+    """Restrict an ``id``-ordered query to rows after the cursor."""
+    (product_id,) = decode_cursor(cursor, 1)
+    return query.filter(models.Product.id > product_id)
+
+
+def split_page(rows: list, per_page: int, make_cursor) -> tuple[list, Optional[str]]:
+    """
+    Split a ``per_page + 1`` fetch into the page and the next cursor.
+
+    The extra row only tells us whether another page exists; the cursor is
+    built from the last row that is actually returned.
+    """
+    page = rows[:per_page]
+    next_cursor = make_cursor(page[-1]) if len(rows) > per_page and page else None
+    return page, next_cursor
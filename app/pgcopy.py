@@ -0,0 +1,103 @@
+"""COPY-based bulk loads for PostgreSQL.
+
+Large product chunks are streamed with ``COPY ... FROM STDIN`` into a
+temporary staging table and merged into ``products`` with one
+``INSERT ... SELECT`` (plain, or ``ON CONFLICT`` for upserts) in the same
+transaction. COPY skips per-row bind and parse work, which dominates
+executemany on big batches; the merge keeps the constraints, the upsert
+rules and the statement-level history triggers exactly as before.
+
+Only used with psycopg2 (``copy_expert``) and for chunks of at least
+``PG_COPY_MIN_ROWS`` rows; everything else keeps the executemany path.
+"""
+from datetime import datetime
+from typing import Iterable
+import io
+import os
+
+from sqlalchemy import Column, MetaData, Table, select
+
+from . import models
+from .text import fold
+
+# Load large PostgreSQL chunks with COPY + merge instead of executemany
+PG_COPY = os.getenv("PG_COPY", "true").lower() == "true"
+
+# Smaller chunks are not worth the staging round trip
+PG_COPY_MIN_ROWS = int(os.getenv("PG_COPY_MIN_ROWS", "100"))
+
+STAGING_TABLE = "products_staging"
+
+# Columns loaded through staging; the rest are filled by the database
+COPY_COLUMNS = (
+    "name", "name_normalized", "store_id", "category_id", "store_url", "sku", "price", "currency", "image_url",
+    "available", "last_updated", "created_at",
+)
+
+products_table = models.Product.__table__
+
+# Handle on the temporary table for building the merge statements
+staging = Table(
+    STAGING_TABLE,
+    MetaData(),
+    *(Column(name, products_table.c[name].type) for name in COPY_COLUMNS),
+)
+
+
+def use_copy(db, rows: int) -> bool:
+    """Whether a chunk of ``rows`` rows should be loaded with COPY."""
+    dialect = db.get_bind().dialect
+    return PG_COPY and rows >= PG_COPY_MIN_ROWS and dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+
+def _escape(value) -> str:
+    """Encode one value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def copy_text(rows: Iterable[dict]) -> str:
+    """
+    Encode product rows as COPY text, one line per row in COPY_COLUMNS order.
+
+    Columns the bulk writers leave to Python-side defaults (folded name,
+    timestamps) are filled in here, since COPY bypasses them.
+    """
+    now = datetime.utcnow()
+    lines = []
+    for row in rows:
+        values = {
+            "currency": "MXN",
+            "available": 1,
+            **row,
+            "last_updated": now,
+            "created_at": now,
+        }
+        values["name_normalized"] = fold(values["name"])
+        lines.append("\t".join(_escape(values.get(name)) for name in COPY_COLUMNS))
+    return "\n".join(lines) + "\n"
+
+
+def copy_to_staging(db, rows: list[dict]):
+    """
+    COPY rows into the session's staging table (emptied at commit).
+
+    Returns:
+        Select over the staged rows, in COPY_COLUMNS order, to merge from
+    """
+    cursor = db.connection().connection.driver_connection.cursor()
+    try:
+        columns = ", ".join(COPY_COLUMNS)
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ON COMMIT DELETE ROWS AS "
+            f"SELECT {columns} FROM products WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN", io.StringIO(copy_text(rows)))
+    finally:
+        cursor.close()
+    return select(*(staging.c[name] for name in COPY_COLUMNS))
@@ -0,0 +1,191 @@
+"""Process-local snapshot of the stores and categories tables.
+
+Both tables are tiny and change a few times a year, so reads are served from
+memory. Every reload bumps the snapshot version, and responses carry a strong
+ETag (a hash of the encoded body) so clients can revalidate with
+If-None-Match and get a 304 instead of the payload.
+"""
+from typing import Iterable, Optional
+import hashlib
+import os
+import threading
+import time
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from . import models, schemas
+
+# Seconds before the snapshot is reloaded to pick up writes from other processes
+REFERENCE_TTL = float(os.getenv("REFERENCE_TTL", "300"))
+
+# Minimum seconds between reloads triggered by lookups of the same unknown ID
+MISS_RELOAD_INTERVAL = 5.0
+
+# Unknown IDs remembered for rate limiting before expired ones are dropped
+MAX_TRACKED_MISSES = 1000
+
+_store_list = TypeAdapter(list[schemas.Store])
+_category_list = TypeAdapter(list[schemas.Category])
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for an encoded response body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class Snapshot:
+    """Immutable view of stores and categories with pre-encoded responses."""
+
+    def __init__(self, version: int, stores: list[schemas.Store], categories: list[schemas.Category]):
+        self.version = version
+        self.stores = {store.id: store for store in stores}
+        self.categories = {category.id: category for category in categories}
+        self.stores_by_name = {store.name: store for store in stores}
+        self.categories_by_name = {category.name: category for category in categories}
+
+        self.store_list_body = _store_list.dump_json(stores)
+        self.category_list_body = _category_list.dump_json(categories)
+        self.store_dicts = {store.id: store.model_dump(mode="json") for store in stores}
+        self.category_dicts = {category.id: category.model_dump(mode="json") for category in categories}
+        self.store_bodies = {store.id: store.model_dump_json().encode() for store in stores}
+        self.category_bodies = {category.id: category.model_dump_json().encode() for category in categories}
+
+
+class ReferenceCache:
+    """Holds the current snapshot and reloads it after writes or the TTL."""
+
+    def __init__(self, ttl: float = REFERENCE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self._expires = 0.0
+        self._miss_reloads: dict[tuple[str, int], float] = {}
+        self._version = 0
+
+    def get(self, db) -> Snapshot:
+        """Return the current snapshot, loading it from ``db`` if needed."""
+        snapshot = self._snapshot
+        if snapshot is not None and self._expires > time.monotonic():
+            return snapshot
+        return self._load(db)
+
+    def ensure(self, db, store_ids: Iterable[int] = (), category_ids: Iterable[Optional[int]] = ()) -> Snapshot:
+        """
+        Return a snapshot, reloading once if it lacks any of the given IDs.
+
+        Unknown IDs may have been created by another process since the last
+        load. Reloads triggered this way are rate limited per ID, so lookups
+        of IDs that really do not exist cannot hammer the database while a
+        newly created store or category is still picked up at once.
+        """
+        snapshot = self.get(db)
+        missing = [("store", i) for i in store_ids if i not in snapshot.stores] + [
+            ("category", i) for i in category_ids if i is not None and i not in snapshot.categories
+        ]
+        if not missing:
+            return snapshot
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                key for key in missing
+                if key not in self._miss_reloads or now - self._miss_reloads[key] >= MISS_RELOAD_INTERVAL
+            ]
+            if len(self._miss_reloads) + len(due) > MAX_TRACKED_MISSES:
+                self._miss_reloads = {
+                    key: at for key, at in self._miss_reloads.items() if now - at < MISS_RELOAD_INTERVAL
+                }
+            for key in due:
+                self._miss_reloads[key] = now
+        return self._load(db) if due else snapshot
+
+    def _load(self, db) -> Snapshot:
+        stores = [schemas.Store.model_validate(s) for s in db.query(models.Store).order_by(models.Store.id)]
+        categories = [
+            schemas.Category.model_validate(c)
+            for c in db.query(models.Category).order_by(models.Category.name)
+        ]
+        with self._lock:
+            self._version += 1
+            snapshot = Snapshot(self._version, stores, categories)
+            self._snapshot = snapshot
+            self._expires = time.monotonic() + self.ttl
+        return snapshot
+
+    def invalidate(self):
+        """Force a reload on next access (call after writing stores/categories)."""
+        with self._lock:
+            self._expires = 0.0
+
+    def reset(self):
+        """Drop the snapshot entirely."""
+        with self._lock:
+            self._snapshot = None
+            self._expires = 0.0
+            self._miss_reloads.clear()
+
+
+snapshot = ReferenceCache()
+
+
+def get_or_create_store(db, store: schemas.StoreCreate) -> models.Store:
+    """Return the store with this name, creating it if needed (commits)."""
+    row = db.query(models.Store).filter(models.Store.name == store.name).first()
+    if row is None:
+        row = models.Store(**store.model_dump())
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+        snapshot.invalidate()
+    return row
+
+
+def get_or_create_category(db, category: schemas.CategoryCreate) -> models.Category:
+    """Return the category with this name, creating it if needed (commits)."""
+    row = db.query(models.Category).filter(models.Category.name == category.name).first()
+    if row is None:
+        row = models.Category(**category.model_dump())
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+        snapshot.invalidate()
+    return row
+
+
+def load_dicts(db, store_ids: Iterable[int] = (), category_ids: Iterable[int] = ()) -> tuple[dict, dict]:
+    """
+    Read stores and categories straight from the database, bypassing the snapshot.
+
+    Returns:
+        Tuple of (store dicts by ID, category dicts by ID), shaped like Snapshot's
+    """
+    store_ids, category_ids = set(store_ids), set(category_ids)
+    stores = db.query(models.Store).filter(models.Store.id.in_(store_ids)).all() if store_ids else []
+    categories = (
+        db.query(models.Category).filter(models.Category.id.in_(category_ids)).all() if category_ids else []
+    )
+    return (
+        {store.id: schemas.Store.model_validate(store).model_dump(mode="json") for store in stores},
+        {category.id: schemas.Category.model_validate(category).model_dump(mode="json") for category in categories},
+    )
+
+
+def etag_response(request: Request, body: bytes, version: int) -> Response:
+    """
+    Serve a pre-encoded body with a strong ETag, or 304 if the client has it.
+
+    Args:
+        request: Incoming request (for If-None-Match)
+        body: Encoded JSON response
+        version: Snapshot version, exposed in X-Reference-Version
+    """
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Reference-Version": str(version)}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,7 +1,7 @@
 """Pydantic schemas for request/response validation."""
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 
 class StoreBase(BaseModel):
@@ -71,6 +71,7 @@ class ProductBulkCreate(BaseModel):
 class Product(ProductBase):
     """Schema for Product response."""
     id: int
+    canonical_id: Optional[int] = None
     last_updated: datetime
     created_at: datetime
     store: Store
@@ -80,12 +81,26 @@ class Product(ProductBase):
         from_attributes = True
 
 
+class ProductSummary(BaseModel):
+    """Slim product for grid views (``fields=summary``)."""
+    id: int
+    name: str
+    price: float
+    store_id: int
+    image_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PaginationMeta(BaseModel):
     """Schema for pagination metadata."""
     page: int
     per_page: int
-    total: int
-    total_pages: int
+    total: Optional[int]
+    total_pages: Optional[int]
+    total_type: Literal["exact", "estimated", "omitted"] = "exact"
+    next_cursor: Optional[str] = None
 
 
 class ProductSearchResponse(BaseModel):
@@ -94,8 +109,149 @@ class ProductSearchResponse(BaseModel):
     pagination: PaginationMeta
 
 
+class FacetCount(BaseModel):
+    """Number of matches for one facet value."""
+    value: Optional[int]
+    label: Optional[str]
+    count: int
+
+
+class PriceBucket(BaseModel):
+    """Number of matches in a price range (max is exclusive, None = open-ended)."""
+    min: float
+    max: Optional[float]
+    count: int
+
+
+class SearchFacets(BaseModel):
+    """Facet counts; each facet ignores its own filter but applies the others."""
+    stores: list[FacetCount]
+    categories: list[FacetCount]
+    availability: list[FacetCount]
+    price: list[PriceBucket]
+
+
+class SearchResponse(ProductSearchResponse):
+    """Schema for /search response."""
+    facets: Optional[SearchFacets] = None
+
+
+class CanonicalProduct(BaseModel):
+    """Schema for a product matched across stores."""
+    id: int
+    name: str
+    brand: Optional[str] = None
+    model: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductOffers(BaseModel):
+    """Schema for the offers of one product across stores, cheapest first."""
+    canonical: Optional[CanonicalProduct] = None
+    offers: list[Product]
+
+
+class ProductBatch(BaseModel):
+    """Schema for products fetched by ID, in request order."""
+    products: list[Product]
+    missing: list[int]
+
+
+class ProductKey(BaseModel):
+    """A store's SKU, identifying one product."""
+    store_id: int
+    sku: str
+
+
+class ProductLookup(BaseModel):
+    """Schema for looking up products by store SKU."""
+    products: list[ProductKey]
+
+
+class ProductLookupResponse(BaseModel):
+    """Schema for products found by store SKU, in request order."""
+    products: list[Product]
+    missing: list[ProductKey]
+
+
+class Suggestion(BaseModel):
+    """One autocomplete suggestion."""
+    text: str
+    kind: Literal["query", "word"]
+    score: float
+
+
+class SuggestResponse(BaseModel):
+    """Schema for /suggest."""
+    prefix: str
+    suggestions: list[Suggestion]
+
+
+class CompareResponse(BaseModel):
+    """Schema for /compare: the cheapest in-stock match of each store, cheapest first."""
+    query: str
+    precomputed: bool
+    offers: list[Product]
+
+
+class PricePoint(BaseModel):
+    """Price at a point in time, or min/max/last price over a day or week."""
+    at: datetime
+    min: float
+    max: float
+    close: float
+
+
+class PriceHistory(BaseModel):
+    """Schema for a product's price history."""
+    product_id: int
+    currency: str
+    resolution: Literal["raw", "daily", "weekly"]
+    points: list[PricePoint]
+
+
 class BulkCreateResponse(BaseModel):
     """Schema for bulk create response."""
     created: int
     failed: int
     errors: list[str]
+
+
+class UpsertResponse(BaseModel):
+    """Schema for bulk upsert response."""
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    errors: list[str]
+
+
+class TrackedQuery(BaseModel):
+    """Schema for a query whose best offers are kept precomputed."""
+    id: int
+    query: str
+
+
+class MatchResponse(BaseModel):
+    """Schema for a cross-store matching run."""
+    matched: int
+
+
+class IngestJob(BaseModel):
+    """Schema for streaming ingest progress."""
+    id: str
+    upsert: bool
+    status: Literal["running", "completed", "failed"]
+    lines: int
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    errors: list[str]
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,369 @@
+"""Full-text search index for product names.
+
+SQLite uses an external-content FTS5 table over name and SKU kept in sync
+with ``products`` by triggers. PostgreSQL uses a GIN index over the weighted
+``to_tsvector('simple', ...)`` of the same fields, which the planner keeps up
+to date by itself.
+
+Relevance ranking (``ranked_match``) scores matches with BM25 (FTS5
+``bm25()``, PostgreSQL ``ts_rank``) using per-field weights, multiplied by the
+boosts in ``RANK_BOOSTS``; the database orders and limits, so only one page
+of rows is ever returned.
+
+Fuzzy (typo-tolerant) search runs over ``name_normalized``, the accent-folded
+name: SQLite indexes it with an FTS5 ``trigram`` table, PostgreSQL with a
+pg_trgm GIN index. Matches are ranked by trigram word similarity.
+"""
+from typing import Callable, Optional
+import os
+import re
+
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, case, event, false, func, literal, literal_column, select, text,
+)
+
+from . import models
+from .text import fold
+
+FTS_TABLE = "products_fts"
+# Shares the products_fts prefix so include_name() hides it from autogenerate
+TRIGRAM_TABLE = "products_fts_trigram"
+
+# Minimum word similarity (0-1) for a fuzzy match
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.3"))
+
+# Trigram index hits scored per fuzzy query (best first)
+FUZZY_CANDIDATES = int(os.getenv("FUZZY_CANDIDATES", "500"))
+
+# BM25 weight of each indexed field (a name hit counts more than a SKU hit)
+FIELD_WEIGHTS = {
+    name: float(weight)
+    for name, weight in (item.split("=") for item in os.getenv("SEARCH_FIELD_WEIGHTS", "name=1.0,sku=0.5").split(","))
+}
+
+# Relevance multiplier for products in stock
+AVAILABILITY_BOOST = float(os.getenv("SEARCH_AVAILABILITY_BOOST", "1.5"))
+
+# Score steps of sort=relevance_then_price (within a step, cheapest first)
+RELEVANCE_BANDS = int(os.getenv("SEARCH_RELEVANCE_BANDS", "10"))
+
+# Lightweight handle on the FTS5 table so it can be used in SQLAlchemy queries.
+# It lives outside Base.metadata because create_all cannot build virtual tables.
+products_fts = Table(
+    FTS_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", String),
+    Column("sku", String),
+)
+
+products_trigram = Table(
+    TRIGRAM_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name_normalized", String),
+    Column("rank", Float),
+)
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name,
+        sku,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        name_normalized,
+        content='products',
+        content_rowid='id',
+        tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_trigram_au AFTER UPDATE OF name_normalized ON products BEGIN
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+]
+
+# Must stay textually identical to postgres_document() for the planner to use it
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(sku, '')), 'B')"
+)
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_products_search_fts ON products USING gin (({POSTGRES_DOCUMENT}))",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm "
+    "ON products USING gin (name_normalized gin_trgm_ops)",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(q: str) -> list[str]:
+    """Split a search query into lowercase word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(q)]
+
+
+def fts5_query(tokens: list[str]) -> str:
+    """Build an FTS5 MATCH expression requiring every token (as a prefix)."""
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def tsquery(tokens: list[str]) -> str:
+    """Build a PostgreSQL tsquery requiring every token (as a prefix)."""
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def trigrams(word: str) -> set[str]:
+    """pg_trgm-style trigrams of a word (padded with two spaces before, one after)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_similarity(query_words: list[str], name: str) -> float:
+    """
+    Average, over the query words, of the best trigram similarity to any word
+    of ``name`` (both already folded).
+    """
+    name_trigrams = [trigrams(word) for word in name.split()]
+    if not query_words or not name_trigrams:
+        return 0.0
+    total = 0.0
+    for word in query_words:
+        query_trigrams = trigrams(word)
+        total += max(len(query_trigrams & other) / len(query_trigrams | other) for other in name_trigrams)
+    return total / len(query_words)
+
+
+def create_search_index(connection):
+    """Create the full-text index objects for the connection's dialect."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        existing = {
+            name for (name,) in connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (:fts, :trigram)"),
+                {"fts": FTS_TABLE, "trigram": TRIGRAM_TABLE},
+            )
+        }
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        for table in (FTS_TABLE, TRIGRAM_TABLE):
+            if table not in existing:
+                # Index rows that were inserted before the FTS table existed
+                connection.exec_driver_sql(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Alembic autogenerate filter hiding the FTS5 table and its shadow tables."""
+    return not (type_ == "table" and name.startswith(FTS_TABLE))
+
+
+def drop_search_index(connection):
+    """Drop the full-text index objects (triggers go away with ``products``)."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}")
+
+
+def postgres_document():
+    """The indexed tsvector (see POSTGRES_DOCUMENT): name weighted A, SKU weighted B."""
+    simple = literal_column("'simple'::regconfig")
+    return func.setweight(func.to_tsvector(simple, models.Product.name), literal_column("'A'")).op("||")(
+        func.setweight(func.to_tsvector(simple, func.coalesce(models.Product.sku, literal_column("''"))),
+                       literal_column("'B'"))
+    )
+
+
+def postgres_query(tokens: list[str]):
+    """to_tsquery requiring every token as a prefix."""
+    return func.to_tsquery(literal_column("'simple'::regconfig"), tsquery(tokens))
+
+
+def match_products(query, q: str, bind):
+    """
+    Restrict a Product query to rows whose name contains every token of ``q``.
+
+    Tokens are matched as word prefixes, so "lap" finds "Laptop". The match is
+    a plain filter, so any other filters on ``query`` run in the same statement.
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return query.filter(false())
+
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        matches = select(products_fts.c.rowid).where(
+            literal_column(FTS_TABLE).op("MATCH")(fts5_query(tokens))
+        )
+        return query.filter(models.Product.id.in_(matches))
+    if dialect == "postgresql":
+        return query.filter(postgres_document().op("@@")(postgres_query(tokens)))
+
+    # Other backends have no index support; fall back to per-token ILIKE
+    for token in fold(" ".join(tokens)).split():
+        query = query.filter(models.Product.name_normalized.ilike(f"%{token}%"))
+    return query
+
+
+def fuzzy_match_products(db, query, q: str, **filters):
+    """
+    Restrict a Product query to names similar to ``q``, tolerating typos.
+
+    On SQLite only the best FUZZY_CANDIDATES trigram hits are scored, so the
+    /search filters (``filter_products`` keywords) must be passed here to be
+    applied before that cut; they also restrict the returned query.
+
+    Returns:
+        Tuple of (filtered query, similarity expression to ORDER BY descending)
+    """
+    words = fold(q).split()
+    if not words:
+        return query.filter(false()), literal(0.0)
+    query = filter_products(query, db.get_bind(), **filters)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # The trigram index narrows the table to names sharing trigrams with the
+        # query (best BM25 first); only those candidates are scored in Python
+        grams = {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+        if not grams:
+            return match_products(query, q, db.get_bind()), literal(0.0)
+        candidates = select(products_trigram.c.rowid, products_trigram.c.name_normalized)\
+            .where(literal_column(TRIGRAM_TABLE).op("MATCH")(" OR ".join(f'"{g}"' for g in sorted(grams))))
+        if any(value is not None for value in filters.values()):
+            candidates = filter_products(
+                candidates.join(models.Product, models.Product.id == products_trigram.c.rowid), db.get_bind(),
+                **filters
+            )
+        candidates = db.execute(candidates.order_by(products_trigram.c.rank).limit(FUZZY_CANDIDATES))
+        scores = {}
+        for product_id, name in candidates:
+            score = word_similarity(words, name or "")
+            if score >= FUZZY_THRESHOLD:
+                scores[product_id] = round(score, 4)
+        if not scores:
+            return query.filter(false()), literal(0.0)
+        similarity = case(scores, value=models.Product.id, else_=0.0)
+        return query.filter(models.Product.id.in_(scores)), similarity
+    if dialect == "postgresql":
+        # <% uses the GIN trigram index (threshold: pg_trgm.word_similarity_threshold)
+        folded = " ".join(words)
+        similarity = func.word_similarity(folded, models.Product.name_normalized)
+        return query.filter(literal(folded).op("<%")(models.Product.name_normalized)), similarity
+
+    return match_products(query, q, db.get_bind()), literal(0.0)
+
+
+def availability_boost():
+    """Rank products in stock above otherwise equal ones that are not."""
+    return case((models.Product.available == 1, AVAILABILITY_BOOST), else_=1.0)
+
+
+# Multipliers applied to the BM25 score; append to plug in more signals
+RANK_BOOSTS: list[Callable] = [availability_boost]
+
+
+def ranked_match(query, q: str, bind):
+    """
+    Like match_products, but also return a relevance score (higher is better).
+
+    The score is BM25 over the weighted fields times every RANK_BOOSTS factor.
+    It is meant for ORDER BY ... LIMIT, so the database picks the top rows.
+
+    Returns:
+        Tuple of (filtered query, score expression)
+    """
+    tokens = tokenize(q)
+    if not tokens:
+        return query.filter(false()), literal(0.0)
+
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        # bm25() needs the FTS table in FROM; it returns lower-is-better scores
+        query = query.join(products_fts, products_fts.c.rowid == models.Product.id)\
+            .filter(literal_column(FTS_TABLE).op("MATCH")(fts5_query(tokens)))
+        score = -func.bm25(literal_column(FTS_TABLE), FIELD_WEIGHTS.get("name", 1.0), FIELD_WEIGHTS.get("sku", 1.0))
+    elif dialect == "postgresql":
+        document, tsq = postgres_document(), postgres_query(tokens)
+        query = query.filter(document.op("@@")(tsq))
+        # ts_rank weights are listed for labels {D, C, B, A}, scaled to at most 1
+        top = max(FIELD_WEIGHTS.values()) or 1.0
+        weights = f"{{0, 0, {FIELD_WEIGHTS.get('sku', 1.0) / top}, {FIELD_WEIGHTS.get('name', 1.0) / top}}}"
+        score = func.ts_rank(literal_column(f"'{weights}'::float4[]"), document, tsq)
+    else:
+        return match_products(query, q, bind), literal(0.0)
+
+    for boost in RANK_BOOSTS:
+        score = score * boost()
+    return query, score
+
+
+def order_by_relevance_then_price(db, query, score):
+    """
+    Order a ranked_match query by relevance band, then price.
+
+    A band is one of RELEVANCE_BANDS steps of the best score among the
+    matches, so equally relevant matches are listed cheapest first. The
+    scores are computed in a subquery: FTS5 does not allow bm25() inside a
+    window function.
+    """
+    scored = query.with_entities(models.Product.id.label("id"), score.label("score")).subquery()
+    best = func.max(scored.c.score).over()
+    band = func.round(scored.c.score * RELEVANCE_BANDS / case((best > 0, best), else_=1.0))
+    banded = select(scored.c.id, band.label("band")).subquery()
+    return db.query(models.Product).join(banded, banded.c.id == models.Product.id)\
+        .order_by(banded.c.band.desc(), models.Product.price, models.Product.id)
+
+
+def filter_products(
+    query,
+    bind,
+    q: Optional[str] = None,
+    store_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+):
+    """
+    Apply the /search filters to a Product query or Core select.
+
+    Shared by /search and the catalog export so both return the same rows.
+    """
+    if q is not None:
+        query = match_products(query, q, bind)
+    if store_id:
+        query = query.filter(models.Product.store_id == store_id)
+    if category_id:
+        query = query.filter(models.Product.category_id == category_id)
+    if min_price:
+        query = query.filter(models.Product.price >= min_price)
+    if max_price:
+        query = query.filter(models.Product.price <= max_price)
+    return query
+
+
+event.listen(models.Product.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+event.listen(models.Product.__table__, "after_drop", lambda target, connection, **kw: drop_search_index(connection))
@@ -0,0 +1,143 @@
+"""Fast JSON path for product list responses.
+
+List endpoints select plain product columns instead of ORM entities, attach
+the store and category from the in-memory reference snapshot, and encode the
+resulting dicts directly. The data comes from our own database, so it is not
+re-validated through ``schemas.Product``; the field order and encoding match
+what the schema would produce, so the documented response shape is unchanged.
+
+Listings also accept a sparse fieldset (``fields=id,name,price`` or the
+``summary`` projection); only the columns backing those fields are selected
+and the store/category lookups are skipped unless requested.
+"""
+from datetime import datetime
+from typing import Any, Optional
+import json
+
+from . import models, reference
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Response field name -> column, in schemas.Product field order
+PRODUCT_COLUMNS = {
+    "name": models.Product.name,
+    "store_id": models.Product.store_id,
+    "category_id": models.Product.category_id,
+    "store_url": models.Product.store_url,
+    "sku": models.Product.sku,
+    "price": models.Product.price,
+    "currency": models.Product.currency,
+    "image_url": models.Product.image_url,
+    "available": models.Product.available,
+    "id": models.Product.id,
+    "canonical_id": models.Product.canonical_id,
+    "last_updated": models.Product.last_updated,
+    "created_at": models.Product.created_at,
+}
+
+# Embedded objects, served from the reference snapshot
+RELATION_FIELDS = {"store": "store_id", "category": "category_id"}
+
+# Built-in projection for grid views (schemas.ProductSummary)
+SUMMARY_FIELDS = ("id", "name", "price", "store_id", "image_url")
+
+# Columns every listing needs for ordering and cursors
+KEY_COLUMNS = ("id", "price")
+
+
+class InvalidFields(ValueError):
+    """Raised when ``fields`` names something that is not a product field."""
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """
+    Parse a ``fields`` query parameter.
+
+    Args:
+        fields: Comma-separated field names, "summary", or None for every field
+
+    Returns:
+        Requested field names in response order, or None for the full product
+    """
+    if fields is None:
+        return None
+    if fields.strip() == "summary":
+        return SUMMARY_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(PRODUCT_COLUMNS) - set(RELATION_FIELDS)
+    if unknown or not requested:
+        raise InvalidFields(f"Unknown product fields: {', '.join(sorted(unknown)) or '(none given)'}")
+    return tuple(name for name in (*PRODUCT_COLUMNS, *RELATION_FIELDS) if name in requested)
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def product_columns(query, fields: Optional[tuple[str, ...]] = None):
+    """
+    Switch a Product query to the columns needed for a response.
+
+    Args:
+        query: Filtered and ordered Product query
+        fields: Parsed fieldset (None = every field)
+    """
+    if fields is None:
+        names = set(PRODUCT_COLUMNS)
+    else:
+        names = {RELATION_FIELDS.get(name, name) for name in fields} | set(KEY_COLUMNS)
+    return query.with_entities(*(column.label(name) for name, column in PRODUCT_COLUMNS.items() if name in names))
+
+
+def product_dicts(db, rows, fields: Optional[tuple[str, ...]] = None) -> list[dict]:
+    """
+    Build response dicts from ``product_columns`` rows.
+
+    Stores and categories come from the reference snapshot, which is reloaded
+    once if a row points at one created since the last load; any still
+    missing (the reload is rate limited) are read from the database.
+    """
+    with_store = fields is None or "store" in fields
+    with_category = fields is None or "category" in fields
+    columns = None if fields is None else [name for name in fields if name not in RELATION_FIELDS]
+
+    if with_store or with_category:
+        snapshot = reference.snapshot.ensure(
+            db,
+            store_ids={row.store_id for row in rows} if with_store else (),
+            category_ids={row.category_id for row in rows} if with_category else (),
+        )
+        stores, categories = snapshot.store_dicts, snapshot.category_dicts
+        missing_stores = {row.store_id for row in rows} - stores.keys() if with_store else ()
+        missing_categories = (
+            {row.category_id for row in rows if row.category_id is not None} - categories.keys()
+            if with_category else ()
+        )
+        if missing_stores or missing_categories:
+            found_stores, found_categories = reference.load_dicts(db, missing_stores, missing_categories)
+            stores, categories = {**stores, **found_stores}, {**categories, **found_categories}
+
+    products = []
+    for row in rows:
+        if columns is None:
+            product = row._asdict()
+        else:
+            product = {name: getattr(row, name) for name in columns}
+        if with_store:
+            product["store"] = stores.get(row.store_id)
+        if with_category:
+            product["category"] = categories.get(row.category_id)
+        products.append(product)
+    return products
@@ -0,0 +1,195 @@
+"""Streaming NDJSON product ingest.
+
+The request body is read as it arrives, optionally gunzipped, split into
+lines and validated one product at a time. Valid products are written in
+chunks of ``BULK_CHUNK_SIZE`` through the single ``writer`` thread, so
+memory stays bounded by one chunk plus one line regardless of upload size.
+
+Progress is kept in a small per-process registry so another request can poll
+a running job.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import os
+import threading
+import uuid
+import zlib
+
+from pydantic import ValidationError
+
+from . import ingest, schemas, writer
+
+# Longest accepted NDJSON line (one product), in bytes
+MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(64 * 1024)))
+
+# Per-row errors kept on a job; the rest are only counted
+MAX_REPORTED_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", "100"))
+
+# Finished jobs kept for polling
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+
+# Decompressed bytes produced per zlib call, so a small gzip cannot expand unbounded
+DECOMPRESS_CHUNK = 64 * 1024
+
+
+class LineTooLong(ValueError):
+    """An NDJSON line exceeded MAX_LINE_BYTES."""
+
+
+@dataclass
+class IngestJob:
+    """Progress of one streaming ingest."""
+    id: str
+    upsert: bool
+    status: str = "running"
+    lines: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: list[str] = field(default_factory=list)
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    def fail(self, idx: int, message: str):
+        """Record a row that never reached the writer."""
+        self.failed += 1
+        self._report(f"Product {idx}: {message}")
+
+    def add(self, result: ingest.WriteResult):
+        """Merge the outcome of one written chunk."""
+        self.created += result.created
+        self.updated += result.updated
+        self.unchanged += result.unchanged
+        self.failed += result.failed
+        for error in result.errors:
+            self._report(error)
+
+    def finish(self, status: str = "completed", error: Optional[str] = None):
+        """Mark the job as done."""
+        self.status = status
+        self.finished_at = datetime.utcnow()
+        if error:
+            self._report(error)
+
+    def _report(self, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+class JobRegistry:
+    """Bounded, thread-safe registry of recent ingest jobs."""
+
+    def __init__(self, maxsize: int = INGEST_JOB_HISTORY):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+
+    def start(self, upsert: bool, job_id: Optional[str] = None) -> Optional[IngestJob]:
+        """Register a new running job, or return None if ``job_id`` is running."""
+        job = IngestJob(id=job_id or uuid.uuid4().hex, upsert=upsert)
+        with self._lock:
+            current = self._jobs.pop(job.id, None)
+            if current is not None and current.status == "running":
+                self._jobs[current.id] = current
+                return None
+            self._jobs[job.id] = job
+            finished = [key for key, j in self._jobs.items() if j.status != "running"]
+            while len(self._jobs) > self.maxsize and finished:
+                del self._jobs[finished.pop(0)]
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Return a job by ID, or None if unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def clear(self):
+        """Forget every job."""
+        with self._lock:
+            self._jobs.clear()
+
+
+jobs = JobRegistry()
+
+
+async def gunzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Incrementally decompress a gzip stream."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk, DECOMPRESS_CHUNK)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise zlib.error("Truncated gzip stream")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a byte stream into non-empty lines.
+
+    Raises:
+        LineTooLong: If a line grows past MAX_LINE_BYTES
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise LineTooLong(f"Line longer than {MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield buffer
+
+
+async def ingest_stream(chunks: AsyncIterator[bytes], job: IngestJob, compressed: bool = False):
+    """
+    Validate and write NDJSON products as they arrive.
+
+    Chunks go through the single writer, so a full write queue slows the
+    upload down instead of piling batches up in memory.
+
+    Args:
+        chunks: Raw request body chunks
+        job: Job to report progress on
+        compressed: Whether the body is gzip-encoded
+    """
+    kind = "upsert" if job.upsert else "insert"
+    stream = gunzip(chunks) if compressed else chunks
+
+    batch: list[schemas.ProductCreate] = []
+    indexes: list[int] = []
+    try:
+        async for line in iter_lines(stream):
+            idx = job.lines
+            job.lines += 1
+            try:
+                batch.append(schemas.ProductCreate.model_validate_json(line))
+                indexes.append(idx)
+            except ValidationError as e:
+                error = e.errors(include_url=False)[0]
+                location = ".".join(str(part) for part in error["loc"])
+                job.fail(idx, f"{location}: {error['msg']}" if location else error["msg"])
+            if len(batch) >= ingest.BULK_CHUNK_SIZE:
+                await _write_batch(kind, batch, indexes, job)
+                batch, indexes = [], []
+        if batch:
+            await _write_batch(kind, batch, indexes, job)
+    except Exception as e:
+        # Malformed stream, client disconnect or database outage
+        job.finish("failed", str(e) or type(e).__name__)
+        raise
+    job.finish()
+
+
+async def _write_batch(kind: str, batch: list, indexes: list[int], job: IngestJob):
+    """Write one chunk through the writer thread."""
+    job.add(await writer.writes.write_async(kind, batch, indexes))
@@ -0,0 +1,281 @@
+"""In-memory prefix suggestions for the search box.
+
+Terms are the folded words of product names, weighted by how many products
+contain them, plus searches weighted by how often they were run. They are
+kept in a sorted array (a flattened trie: every completion of a prefix is one
+contiguous slice, found by bisection); the best ``SUGGEST_TOP_K`` completions
+of every prefix up to ``CACHED_PREFIX_LENGTH`` characters are precomputed,
+since short prefixes have the largest slices. Longer prefixes rank their
+(small) slice on the fly.
+
+The index is per worker process and maintained by a background thread
+started with the app (``start``), never by a request: it builds the index,
+then every ``SUGGEST_REFRESH_SECONDS`` folds in rows with IDs above the last
+one seen and the searches queued by ``record_query``; a full rebuild every
+``SUGGEST_REBUILD_SECONDS`` drops words of deleted or renamed products.
+Builds work on local structures that are swapped in under the lock, so
+lookups and ``record_query`` (a deque append) never wait on a scan.
+"""
+from bisect import bisect_left, insort
+from collections import Counter, deque
+from typing import Optional
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import select
+
+from . import models
+from .text import fold
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_TOP_K = int(os.getenv("SUGGEST_TOP_K", "10"))
+
+# Seconds between checks for newly imported products
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "30"))
+
+# Seconds between full rebuilds
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", "3600"))
+
+# Weight of one search run, relative to one product containing a word
+QUERY_WEIGHT = float(os.getenv("SUGGEST_QUERY_WEIGHT", "5"))
+
+# Searches run fewer times than this are not suggested (keeps typos out)
+MIN_QUERY_COUNT = int(os.getenv("SUGGEST_MIN_QUERY_COUNT", "3"))
+
+# Prefixes up to this length have precomputed completions
+CACHED_PREFIX_LENGTH = 4
+
+# Product names read per batch while building
+BUILD_BATCH_SIZE = 10000
+
+MIN_TERM_LENGTH = 2
+
+# Distinct searches counted before the rarest are forgotten
+MAX_COUNTED_QUERIES = 100000
+
+# Searches queued between refreshes; older ones are dropped when it is full
+MAX_PENDING_QUERIES = 100000
+
+
+def _weight(words: Counter, queries: Counter, term: str) -> float:
+    queries_run = queries[term] if queries[term] >= MIN_QUERY_COUNT else 0
+    return words[term] + QUERY_WEIGHT * queries_run
+
+
+def _build(words: Counter, queries: Counter) -> tuple[list[str], dict[str, list]]:
+    """Sorted terms and the cached top list of every short prefix."""
+    weights = {term: _weight(words, queries, term) for term in (*words, *queries)}
+    weights = {term: weight for term, weight in weights.items() if weight}
+    top: dict[str, list] = {}
+    for term in sorted(weights, key=lambda term: (-weights[term], term)):
+        for length in range(1, min(len(term), CACHED_PREFIX_LENGTH) + 1):
+            entries = top.setdefault(term[:length], [])
+            if len(entries) < SUGGEST_TOP_K:
+                entries.append((-weights[term], term))
+    return sorted(weights), top
+
+
+class SuggestIndex:
+    """Weighted prefix index over product words and popular searches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: deque = deque(maxlen=MAX_PENDING_QUERIES)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._words: Counter = Counter()
+        self._queries: Counter = Counter()
+        self._terms: list[str] = []
+        self._top: dict[str, list[tuple[float, str]]] = {}
+        self.last_product_id = 0
+        self.built_at: Optional[float] = None
+        self.checked_at = 0.0
+
+    def weight(self, term: str) -> float:
+        """Popularity of a term: products containing it plus weighted searches."""
+        return _weight(self._words, self._queries, term)
+
+    def _update(self, terms):
+        # Weights only grow between rebuilds, so a term either enters a
+        # prefix's top list or moves up inside it. Called under the lock.
+        for term in terms:
+            weight = self.weight(term)
+            if not weight:
+                continue
+            index = bisect_left(self._terms, term)
+            if index == len(self._terms) or self._terms[index] != term:
+                self._terms.insert(index, term)
+            for length in range(1, min(len(term), CACHED_PREFIX_LENGTH) + 1):
+                prefix = term[:length]
+                top = [entry for entry in self._top.get(prefix, ()) if entry[1] != term]
+                insort(top, (-weight, term))
+                self._top[prefix] = top[:SUGGEST_TOP_K]
+
+    @staticmethod
+    def _count_products(db, after_id: int) -> tuple[int, Counter]:
+        """Count the words of products with ID > ``after_id``; returns the last ID and the counts."""
+        counted: Counter = Counter()
+        last_id = after_id
+        while True:
+            rows = db.execute(
+                select(models.Product.id, models.Product.name_normalized)
+                .where(models.Product.id > last_id)
+                .order_by(models.Product.id)
+                .limit(BUILD_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for _, name in rows:
+                counted.update({word for word in (name or "").split() if len(word) >= MIN_TERM_LENGTH})
+            last_id = rows[-1][0]
+        return last_id, counted
+
+    def _drain_queries(self) -> Counter:
+        """Searches queued by record_query since the last refresh."""
+        queued: Counter = Counter()
+        while True:
+            try:
+                queued[self._pending.popleft()] += 1
+            except IndexError:
+                return queued
+
+    def refresh(self, db):
+        """
+        One refresher pass: full rebuild when due, otherwise fold in new products and searches.
+
+        Runs on the background thread (or a script); the database scan and any
+        rebuild happen outside the lock, which is only held to swap results in.
+        """
+        now = time.monotonic()
+        queued = self._drain_queries()
+        if self.built_at is None or now - self.built_at >= SUGGEST_REBUILD_SECONDS:
+            # Full rebuild; search counts are kept
+            last_id, words = self._count_products(db, 0)
+            queries = self._queries + queued
+            terms, top = _build(words, queries)
+            with self._lock:
+                self._words, self._queries, self._terms, self._top = words, queries, terms, top
+                self.last_product_id, self.built_at = last_id, now
+        else:
+            last_id, words = self._count_products(db, self.last_product_id)
+            changed = set(words) | {
+                query for query in queued if self._queries[query] + queued[query] >= MIN_QUERY_COUNT
+            }
+            if len(changed) > len(self._terms) // 10:
+                all_words, queries = self._words + words, self._queries + queued
+                terms, top = _build(all_words, queries)
+                with self._lock:
+                    self._words, self._queries, self._terms, self._top = all_words, queries, terms, top
+                    self.last_product_id = last_id
+            else:
+                with self._lock:
+                    self._words.update(words)
+                    self._queries.update(queued)
+                    self._update(sorted(changed))
+                    self.last_product_id = last_id
+        if len(self._queries) > MAX_COUNTED_QUERIES:
+            # Forget the long tail of one-off searches (applied at the next rebuild)
+            with self._lock:
+                self._queries = Counter(dict(self._queries.most_common(MAX_COUNTED_QUERIES // 2)))
+        self.checked_at = now
+
+    def start(self, session_factory):
+        """Start the background refresher (first pass builds the index)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(session_factory,), name="suggest-refresher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background refresher."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self, session_factory):
+        while True:
+            db = session_factory()
+            try:
+                self.refresh(db)
+            except Exception:
+                logger.exception("Suggestion index refresh failed")
+            finally:
+                db.close()
+            if self._stop.wait(max(SUGGEST_REFRESH_SECONDS, 1.0)):
+                return
+
+    def record_query(self, q: str):
+        """Queue a search to be counted on the next refresh; never blocks."""
+        query = fold(q)
+        if len(query) >= MIN_TERM_LENGTH:
+            self._pending.append(query)
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_TOP_K) -> list[dict]:
+        """
+        Best completions of ``prefix``, most popular first.
+
+        Returns:
+            Dicts shaped like schemas.Suggestion
+        """
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        top = self._completions(prefix, limit)
+        if not top and " " in prefix:
+            # No popular search starts this way: complete the last word instead
+            head, last = prefix.rsplit(" ", 1)
+            top = [(weight, f"{head} {term}") for weight, term in self._completions(last, limit)]
+        return [
+            {"text": term, "kind": "query" if self._queries[term] >= MIN_QUERY_COUNT else "word", "score": -weight}
+            for weight, term in top
+        ]
+
+    def _completions(self, prefix: str, limit: int) -> list[tuple[float, str]]:
+        if len(prefix) <= CACHED_PREFIX_LENGTH:
+            return self._top.get(prefix, [])[:limit]
+        terms = self._terms
+        start = bisect_left(terms, prefix)
+        end = bisect_left(terms, prefix + "\uffff", start)
+        return heapq.nsmallest(limit, ((-self.weight(term), term) for term in terms[start:end]))
+
+    def stats(self) -> dict:
+        """Size of the index, for sizing worker memory."""
+        with self._lock:
+            terms, top, words, queries = self._terms, self._top, self._words, self._queries
+            memory = (
+                sys.getsizeof(terms) + sum(sys.getsizeof(term) for term in terms)
+                + sys.getsizeof(words) + sys.getsizeof(queries)
+                + sum(sys.getsizeof(term) for term in queries)
+                + sys.getsizeof(top)
+                + sum(sys.getsizeof(prefix) + sys.getsizeof(entries) + 80 * len(entries)
+                      for prefix, entries in top.items())
+            )
+            return {
+                "terms": len(terms),
+                "cached_prefixes": len(top),
+                "counted_queries": len(queries),
+                "last_product_id": self.last_product_id,
+                "memory_bytes": memory,
+            }
+
+    def reset(self):
+        """Drop the index, the search counts and the queued searches."""
+        with self._lock:
+            self._reset()
+            self._pending.clear()
+
+
+index = SuggestIndex()
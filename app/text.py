@@ -0,0 +1,30 @@
+"""Text normalization shared by slugs and product search."""
+import re
+
+# Spanish accent folding (the rules create_slug has always used)
+_ACCENTS = [
+    (re.compile(r"[áàäâ]"), "a"),
+    (re.compile(r"[éèëê]"), "e"),
+    (re.compile(r"[íìïî]"), "i"),
+    (re.compile(r"[óòöô]"), "o"),
+    (re.compile(r"[úùüû]"), "u"),
+    (re.compile(r"[ñ]"), "n"),
+]
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase, strip accents and collapse punctuation into single spaces.
+
+    "Audífonos Sony WH-1000XM5" -> "audifonos sony wh 1000xm5"
+    """
+    text = text.lower()
+    for pattern, replacement in _ACCENTS:
+        text = pattern.sub(replacement, text)
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def slugify(text: str) -> str:
+    """URL slug: the folded text joined with hyphens."""
+    return fold(text).replace(" ", "-")
@@ -0,0 +1,238 @@
+"""Single writer thread for product writes.
+
+Every product write of the API process (``/products/bulk``,
+``/products/upsert``, streaming ingest) is submitted as a batch to one
+thread that owns the write session, through a bounded queue: producers
+block when ``WRITER_QUEUE_SIZE`` batches are waiting (backpressure) and get
+``WriterBusy`` after ``WRITER_SUBMIT_TIMEOUT`` seconds.
+
+The thread takes the first waiting batch, lingers ``WRITER_LINGER_MS`` for
+more of the same kind, and writes up to ``WRITER_COALESCE_ROWS`` rows with
+one ``ingest`` call, so many small batches share transactions. Rows are
+renumbered for the combined write and the per-row outcomes are split back
+into one ``WriteResult`` per caller, with the caller's own row numbers.
+Batches touching a (store_id, sku) already in the group wait for the next
+group, so two callers' rows never clash as in-request duplicates.
+
+Other writes of the API process (starting to track a ``/compare`` query)
+are queued as tasks with ``submit_task`` and run alone on the same session.
+"""
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Sequence
+import logging
+import os
+import queue
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from . import ingest, schemas
+
+logger = logging.getLogger(__name__)
+
+# Batches waiting for the writer before producers block
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", "64"))
+
+# Seconds a producer waits for room in the queue before giving up
+WRITER_SUBMIT_TIMEOUT = float(os.getenv("WRITER_SUBMIT_TIMEOUT", "30"))
+
+# Rows written together at most (batches are never split)
+WRITER_COALESCE_ROWS = int(os.getenv("WRITER_COALESCE_ROWS", "2000"))
+
+# How long the writer waits for more batches to join a small group
+WRITER_LINGER_MS = float(os.getenv("WRITER_LINGER_MS", "5"))
+
+WRITES = {"insert": ingest.insert_products, "upsert": ingest.upsert_products}
+
+
+class WriterBusy(Exception):
+    """Raised when the write queue stays full for WRITER_SUBMIT_TIMEOUT seconds."""
+
+
+@dataclass
+class WriteBatch:
+    """One producer's rows and the future its WriteResult is delivered on."""
+    kind: str
+    products: list[schemas.ProductCreate]
+    indexes: Sequence[int]
+    future: Future = field(default_factory=Future)
+    # Set for "task" batches: called with the write session instead of ingest
+    task: Optional[Callable] = None
+
+    def keys(self) -> set[tuple[int, str]]:
+        """(store_id, sku) of the rows that have a SKU."""
+        return {(p.store_id, p.sku) for p in self.products if p.sku is not None}
+
+
+class SingleWriter:
+    """Owns the write session; see the module docstring."""
+
+    def __init__(self, session_factory=None):
+        # Resolved on first use so tests can point the writer at their database
+        self.session_factory = session_factory
+        self._queue: queue.Queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._held: Optional[WriteBatch] = None
+        self._stats = {"batches": 0, "groups": 0, "rows": 0}
+
+    def start(self):
+        """Start the writer thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="product-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Write what is queued, then stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def submit(
+        self, kind: str, products: list[schemas.ProductCreate], indexes: Optional[Sequence[int]] = None
+    ) -> Future:
+        """
+        Queue a batch for writing.
+
+        Args:
+            kind: "insert" or "upsert"
+            products: Rows to write
+            indexes: Payload index of each product (default 0..n-1), used in errors
+
+        Returns:
+            Future resolving to the batch's WriteResult
+
+        Raises:
+            WriterBusy: If the queue stayed full for WRITER_SUBMIT_TIMEOUT seconds
+        """
+        if kind not in WRITES:
+            raise ValueError(f"Unknown write kind {kind!r}")
+        self.start()
+        batch = WriteBatch(kind, products, indexes if indexes is not None else range(len(products)))
+        try:
+            self._queue.put(batch, timeout=WRITER_SUBMIT_TIMEOUT)
+        except queue.Full:
+            raise WriterBusy(f"Write queue full ({WRITER_QUEUE_SIZE} batches waiting)")
+        return batch.future
+
+    def submit_task(self, task: Callable) -> Future:
+        """
+        Queue ``task(db)`` to run on the writer thread; never blocks.
+
+        Returns:
+            Future resolving to the task's return value
+
+        Raises:
+            WriterBusy: If the queue is full
+        """
+        self.start()
+        batch = WriteBatch("task", [], (), task=task)
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            raise WriterBusy(f"Write queue full ({WRITER_QUEUE_SIZE} batches waiting)")
+        return batch.future
+
+    def write(
+        self, kind: str, products: list[schemas.ProductCreate], indexes: Optional[Sequence[int]] = None
+    ) -> ingest.WriteResult:
+        """Submit a batch and wait for its result (from a worker thread)."""
+        return self.submit(kind, products, indexes).result()
+
+    async def write_async(
+        self, kind: str, products: list[schemas.ProductCreate], indexes: Optional[Sequence[int]] = None
+    ) -> ingest.WriteResult:
+        """Submit a batch and wait for its result without blocking the event loop."""
+        return await run_in_threadpool(self.write, kind, products, indexes)
+
+    def stats(self) -> dict:
+        """Queue depth and how much coalescing happened."""
+        return {"queued": self._queue.qsize(), **self._stats}
+
+    def _next(self, timeout: Optional[float] = None) -> Optional[WriteBatch]:
+        if self._held is not None:
+            batch, self._held = self._held, None
+            return batch
+        return self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+
+    def _collect(self, first: WriteBatch) -> tuple[list[WriteBatch], bool]:
+        """Group queued batches with ``first``; returns the group and whether to stop after it."""
+        group, rows, keys = [first], len(first.products), first.keys()
+        if first.task is not None:
+            return group, False
+        deadline = time.monotonic() + WRITER_LINGER_MS / 1000
+        while rows < WRITER_COALESCE_ROWS:
+            try:
+                batch = self._next(max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if batch is None:
+                return group, True
+            batch_keys = batch.keys()
+            if batch.kind != first.kind or rows + len(batch.products) > WRITER_COALESCE_ROWS or keys & batch_keys:
+                self._held = batch
+                break
+            group.append(batch)
+            rows += len(batch.products)
+            keys |= batch_keys
+        return group, False
+
+    def _run(self):
+        while True:
+            first = self._next()
+            if first is None:
+                return
+            group, stop = self._collect(first)
+            self._write(group)
+            if stop:
+                if self._held is not None:
+                    self._write([self._held])
+                    self._held = None
+                return
+
+    def _write(self, group: list[WriteBatch]):
+        """Write a group with one ingest call and hand each batch its share of the result."""
+        products = [product for batch in group for product in batch.products]
+        result = ingest.WriteResult(outcomes={})
+        db = None
+        try:
+            if self.session_factory is None:
+                from .database import SessionLocal
+                self.session_factory = SessionLocal
+            db = self.session_factory()
+            if group[0].task is not None:
+                group[0].future.set_result(group[0].task(db))
+                return
+            WRITES[group[0].kind](db, products, result=result)
+        except Exception as e:
+            # Every waiting producer gets the error; none is left blocked on its future
+            logger.exception("Writer task failed" if group[0].task is not None else "Product write failed")
+            for batch in group:
+                batch.future.set_exception(e)
+            return
+        finally:
+            if db is not None:
+                db.close()
+
+        self._stats["batches"] += len(group)
+        self._stats["groups"] += 1
+        self._stats["rows"] += len(products)
+        start = 0
+        for batch in group:
+            share = ingest.WriteResult()
+            for position, idx in enumerate(batch.indexes, start):
+                outcome = result.outcomes.get(position)
+                if outcome == "failed":
+                    share.fail(idx, result.row_errors[position])
+                elif outcome is not None:
+                    setattr(share, outcome, getattr(share, outcome) + 1)
+            start += len(batch.products)
+            batch.future.set_result(share)
+
+
+writes = SingleWriter()
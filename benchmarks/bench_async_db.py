@@ -0,0 +1,44 @@
+"""
+Benchmark the read endpoints in sync (threadpool) vs async database mode.
+
+Usage:
+    python -m benchmarks.bench_async_db --products 200000 --concurrency 64
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import QUERIES, api_server, load_test, print_table, seed_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--database-url", help="Existing database to use instead of a seeded SQLite file")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        url = f"sqlite:///{path}"
+        print(f"Seeding {args.products} products into {path}...")
+        seed_database(url, args.products)
+
+    paths = [f"/search?q={q}&per_page=50" for q in QUERIES] + ["/categories/1/products", "/stores/1/products", "/products/1"]
+    results = {}
+    for mode in ("false", "true"):
+        # Disable the response cache so every request reaches the database
+        env = {"DATABASE_URL": url, "ASYNC_DB": mode, "SEARCH_CACHE_SIZE": "0"}
+        with api_server(env) as base_url:
+            load_test(base_url, paths, concurrency=4, duration=1)  # warm up
+            results["async" if mode == "true" else "sync (threadpool)"] = load_test(
+                base_url, paths, concurrency=args.concurrency, duration=args.duration
+            )
+
+    print_table(f"Read endpoints, concurrency={args.concurrency}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark /products/bulk: per-row commits (previous behavior) vs set-based inserts.
+
+Usage:
+    python -m benchmarks.bench_bulk --rows 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import ingest, models, reference, schemas
+from benchmarks.common import print_table, product_rows, seed_database
+
+
+def fresh_session(workdir: str, name: str):
+    """Session on a new migrated SQLite file with stores and categories only."""
+    url = f"sqlite:///{os.path.join(workdir, name)}"
+    seed_database(url, 0)
+    return sessionmaker(bind=create_engine(url))()
+
+
+def per_row(db, products):
+    """The previous endpoint loop: lookups, commit and refresh for every row."""
+    for product in products:
+        db.query(models.Store).filter(models.Store.id == product.store_id).first()
+        if product.category_id:
+            db.query(models.Category).filter(models.Category.id == product.category_id).first()
+        row = models.Product(**product.model_dump())
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+
+
+def set_based(db, products):
+    """The current endpoint implementation."""
+    ingest.insert_products(db, products)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    products = [schemas.ProductCreate(**row) for row in product_rows(args.rows, list(range(1, 7)), list(range(1, 7)))]
+    workdir = tempfile.mkdtemp()
+    results = {}
+    for name, write in (("per-row commits", per_row), ("set-based", set_based)):
+        reference.snapshot.reset()
+        db = fresh_session(workdir, f"{write.__name__}.db")
+        start = time.perf_counter()
+        write(db, products)
+        elapsed = time.perf_counter() - start
+        db.close()
+        results[name] = {"rows": args.rows, "seconds": round(elapsed, 2), "rows_per_s": round(args.rows / elapsed)}
+
+    speedup = results["set-based"]["rows_per_s"] / results["per-row commits"]["rows_per_s"]
+    print_table(f"Bulk insert of {args.rows} products (speedup {speedup:.0f}x)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark the catalog export: throughput and peak memory at two catalog sizes.
+
+The ORM baseline serializes the same rows through ``schemas.Product`` with
+``yield_per``, which is what exporting through the API models would cost.
+
+Usage:
+    python -m benchmarks.bench_export --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, selectinload
+
+from app import export, models, schemas
+from benchmarks.common import print_table, seed_database
+
+
+def orm_pydantic(engine):
+    """Baseline: ORM rows validated and encoded through the response schema."""
+    with Session(engine) as db:
+        statement = select(models.Product)\
+            .options(selectinload(models.Product.store), selectinload(models.Product.category))\
+            .order_by(models.Product.id)\
+            .execution_options(yield_per=export.EXPORT_BATCH_SIZE)
+        for product in db.scalars(statement):
+            yield (schemas.Product.model_validate(product).model_dump_json() + "\n").encode()
+
+
+def streamed(engine):
+    """Column-level rows from a server-side cursor."""
+    return export.export_products(engine, {})
+
+
+def measure(produce, engine, rows: int) -> dict:
+    """Time one untraced run, then trace a second run for peak memory."""
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in produce(engine))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in produce(engine):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": rows,
+        "rows_per_s": round(rows / elapsed),
+        "output_mb": round(size / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = {}
+    for rows in (args.rows, args.rows * 4):
+        url = f"sqlite:///{os.path.join(workdir, f'export_{rows}.db')}"
+        seed_database(url, rows)
+        engine = create_engine(url)
+        results[f"orm+pydantic {rows}"] = measure(orm_pydantic, engine, rows)
+        results[f"export {rows}"] = measure(streamed, engine, rows)
+        engine.dispose()
+
+    print_table("NDJSON export (peak_mb should not grow with rows)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark the latency facets add to /search.
+
+Usage:
+    python -m benchmarks.bench_facets --products 100000
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import QUERIES, api_server, load_test, print_table, seed_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Seeding {args.products} products...")
+    seed_database(url, args.products)
+
+    results = {}
+    # Disable the response (and facet) caches so every request reaches the database
+    with api_server({"DATABASE_URL": url, "SEARCH_CACHE_SIZE": "0"}) as base_url:
+        for label, extra in (("without facets", ""), ("with facets (cold)", "&facets=true")):
+            paths = [f"/search?q={q}&store_id=1{extra}" for q in QUERIES]
+            load_test(base_url, paths, concurrency=4, duration=1)  # warm up
+            results[label] = load_test(base_url, paths, concurrency=args.concurrency, duration=args.duration)
+
+    # Drill-down: distinct URLs (so no response cache hits) over the same terms,
+    # which reuse the cached facet rows
+    with api_server({"DATABASE_URL": url}) as base_url:
+        paths = [
+            f"/search?q={q}&store_id={store}&page={page}&facets=true"
+            for page in range(1, 11) for store in range(1, 7) for q in QUERIES
+        ]
+        load_test(base_url, [f"/search?q={q}&facets=true" for q in QUERIES], concurrency=1, duration=1)
+        results["with facets (drill-down)"] = load_test(
+            base_url, paths, concurrency=args.concurrency, duration=args.duration
+        )
+
+    print_table(f"/search facets, concurrency={args.concurrency}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark cross-store matching throughput (listings per hour, one core).
+
+Matches the whole seeded catalog from scratch, then again in small batches as
+the importer does after each upsert.
+
+Usage:
+    python -m benchmarks.bench_matching --products 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import matching, models
+from benchmarks.common import print_table, seed_database
+
+
+def run(session, limit=None, batch_size=None) -> dict:
+    matcher = matching.Matcher()
+    started = time.perf_counter()
+    matched = 0
+    if batch_size:
+        while True:
+            done = matcher.match_pending(session, limit=batch_size)
+            matched += done
+            if not done:
+                break
+    else:
+        matched = matcher.match_pending(session, limit=limit)
+    elapsed = time.perf_counter() - started
+    canonical = session.scalar(select(func.count()).select_from(models.CanonicalProduct))
+    return {
+        "listings": matched,
+        "seconds": round(elapsed, 2),
+        "per_hour": f"{matched / elapsed * 3600:,.0f}",
+        "canonical": canonical,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--import-batch", type=int, default=50, help="Listings per importer-sized run")
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Seeding {args.products} products...")
+    seed_database(url, args.products)
+    session = sessionmaker(bind=create_engine(url))()
+
+    results = {"full catalog": run(session)}
+    matching.reset(session)
+    results[f"batches of {args.import_batch}"] = run(session, batch_size=args.import_batch)
+    session.close()
+
+    print_table("Cross-store matching", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Benchmark /search latency per sort order.
+
+Relevance is scored and limited inside the database, so it should cost
+about the same as the price order.
+
+Usage:
+    python -m benchmarks.bench_relevance --products 100000
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import QUERIES, api_server, load_test, print_table, seed_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Seeding {args.products} products...")
+    seed_database(url, args.products)
+
+    results = {}
+    # Disable the response cache so every request reaches the database
+    with api_server({"DATABASE_URL": url, "SEARCH_CACHE_SIZE": "0"}) as base_url:
+        for sort in ("price", "relevance", "relevance_then_price"):
+            paths = [f"/search?q={q}&sort={sort}&include_total=false" for q in QUERIES]
+            load_test(base_url, paths, concurrency=4, duration=1)  # warm up
+            results[f"sort={sort}"] = load_test(base_url, paths, concurrency=args.concurrency, duration=args.duration)
+
+    print_table(f"/search sort orders, concurrency={args.concurrency}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark list endpoints against an older revision of the API.
+
+The baseline revision is checked out into a temporary git worktree and both
+versions are served with the response cache disabled, so every request
+builds and encodes a full page.
+
+Usage:
+    python -m benchmarks.bench_serialization --baseline-rev <commit before the fast path>
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+
+from benchmarks.common import QUERIES, api_server, load_test, print_table, seed_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline-rev", default="HEAD~1", help="Git revision to compare against")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    print(f"Seeding {args.products} products...")
+    seed_database(url, args.products)
+
+    baseline = os.path.join(workdir, "baseline")
+    subprocess.run(["git", "worktree", "add", "--detach", baseline, args.baseline_rev], cwd=ROOT, check=True)
+
+    endpoints = {
+        "/search": [f"/search?q={q}&per_page=100" for q in QUERIES],
+        "/categories/{id}/products": [f"/categories/{i}/products?per_page=100" for i in range(1, 7)],
+    }
+    results = {}
+    try:
+        for label, cwd in ((args.baseline_rev, baseline), ("current", ROOT)):
+            env = {"DATABASE_URL": url, "SEARCH_CACHE_SIZE": "0"}
+            with api_server(env, cwd=cwd) as base_url:
+                for endpoint, paths in endpoints.items():
+                    load_test(base_url, paths, concurrency=4, duration=1)  # warm up
+                    results[f"{label} {endpoint}"] = load_test(
+                        base_url, paths, concurrency=args.concurrency, duration=args.duration
+                    )
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", baseline], cwd=ROOT, check=False)
+
+    print_table(f"100-item pages, concurrency={args.concurrency}", results)
+
+
+if __name__ == "__main__":
+    main()
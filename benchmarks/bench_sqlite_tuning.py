@@ -0,0 +1,71 @@
+"""
+Benchmark mixed read/write load on SQLite, default vs tuned profile.
+
+Readers hit /search and /products/{id} while writers upsert batches, the way
+the importer does during a crawl. The default profile uses rollback journal
+mode, so readers wait on every write and writers fail with "database is
+locked" under contention; the tuned profile uses WAL, pragmas and the
+read/write connection split.
+
+Usage:
+    python -m benchmarks.bench_sqlite_tuning --products 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+
+from benchmarks.common import QUERIES, STORES, api_server, load_test, print_table, product_rows, seed_database
+
+UPSERT_BATCH = 200
+
+
+def upsert_body(count: int):
+    """Body factory for load_test: a batch of upserts over existing SKUs with new prices."""
+    rows = list(product_rows(count, list(range(1, len(STORES) + 1)), list(range(1, 7))))
+
+    def body(i: int):
+        rng = random.Random(i)
+        batch = rng.sample(rows, UPSERT_BATCH)
+        return {"products": [{**row, "price": round(rng.uniform(199, 49999), 2)} for row in batch]}
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    reads = [f"/search?q={q}&include_total=false" for q in QUERIES]
+    reads += [f"/products/{product_id}" for product_id in range(1, args.products, args.products // 50)]
+    body = upsert_body(args.products)
+
+    results = {}
+    workdir = tempfile.mkdtemp()
+    for profile, tuning in (("default", "false"), ("tuned", "true")):
+        url = f"sqlite:///{os.path.join(workdir, f'{profile}.db')}"
+        print(f"Seeding {args.products} products ({profile})...")
+        seed_database(url, args.products)
+        env = {"DATABASE_URL": url, "SQLITE_TUNING": tuning, "SEARCH_CACHE_SIZE": "0"}
+        with api_server(env, workers=args.workers) as base_url:
+            load_test(base_url, reads, concurrency=4, duration=1)  # warm up
+            writes = {}
+            writer = threading.Thread(target=lambda: writes.update(load_test(
+                base_url, ["/products/upsert"], concurrency=args.writers, duration=args.duration,
+                method="POST", body=body,
+            )))
+            writer.start()
+            results[f"{profile} reads"] = load_test(base_url, reads, concurrency=args.readers, duration=args.duration)
+            writer.join()
+            results[f"{profile} writes ({UPSERT_BATCH}/req)"] = writes
+
+    print_table(f"Mixed load, {args.readers} readers + {args.writers} writers, {args.workers} workers", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark /suggest: index build time, memory and per-keystroke latency.
+
+Usage:
+    python -m benchmarks.bench_suggest --products 200000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import suggest
+from benchmarks.common import BRANDS, KINDS, QUERIES, api_server, load_test, print_table, seed_database
+
+
+def keystrokes(count: int, seed: int = 7) -> list[str]:
+    """Prefixes as typed one character at a time."""
+    rng = random.Random(seed)
+    words = [word.lower() for word in (*BRANDS, *KINDS, *QUERIES)]
+    prefixes = []
+    while len(prefixes) < count:
+        word = rng.choice(words)
+        prefixes.extend(word[:length] for length in range(1, len(word) + 1))
+    return prefixes[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Seeding {args.products} products...")
+    seed_database(url, args.products)
+
+    db = sessionmaker(bind=create_engine(url))()
+    started = time.perf_counter()
+    suggest.index.refresh(db)
+    build = time.perf_counter() - started
+    db.close()
+    stats = suggest.index.stats()
+    print(f"Build: {build:.2f}s, {stats['terms']} terms, {stats['memory_bytes'] / 1e6:.1f} MB")
+
+    prefixes = keystrokes(100_000)
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        suggest.index.suggest(prefix)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    results = {"in-process": {
+        "calls": len(latencies),
+        "p50_us": round(statistics.median(latencies) * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+    }}
+
+    paths = [f"/suggest?prefix={prefix}" for prefix in prefixes[:5000]]
+    with api_server({"DATABASE_URL": url}) as base_url:
+        load_test(base_url, paths[:10], concurrency=1, duration=3)  # the refresher builds the index at startup
+        results["http"] = load_test(base_url, paths, concurrency=args.concurrency, duration=args.duration)
+
+    print_table("/suggest", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark concurrent small writes through the single writer.
+
+Many clients upsert small batches at once (scheduler jobs, partner feeds)
+while readers search. Without coalescing (WRITER_COALESCE_ROWS=1) every
+batch is its own transaction; with it, batches queued together share one.
+Pass ``--baseline`` with a checkout from before the writer to compare
+against writes from request threads racing for the SQLite lock.
+
+Usage:
+    python -m benchmarks.bench_writer --products 50000
+    python -m benchmarks.bench_writer --baseline /path/to/old/checkout
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+
+from benchmarks.common import QUERIES, STORES, api_server, load_test, print_table, product_rows, seed_database
+
+
+def upsert_body(count: int, batch_size: int):
+    """Body factory for load_test: small batches of existing SKUs with new prices."""
+    rows = list(product_rows(count, list(range(1, len(STORES) + 1)), list(range(1, 7))))
+
+    def body(i: int):
+        rng = random.Random(i)
+        batch = rng.sample(rows, batch_size)
+        return {"products": [{**row, "price": round(rng.uniform(199, 49999), 2)} for row in batch]}
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--baseline", help="Checkout to run as the 'no writer' configuration")
+    args = parser.parse_args()
+
+    body = upsert_body(args.products, args.batch)
+    reads = [f"/search?q={q}&include_total=false" for q in QUERIES]
+    configurations = [
+        ("no coalescing", {"WRITER_COALESCE_ROWS": "1"}, None),
+        ("coalescing", {}, None),
+    ]
+    if args.baseline:
+        configurations.insert(0, ("no writer (baseline)", {}, args.baseline))
+
+    results = {}
+    workdir = tempfile.mkdtemp()
+    for label, env, cwd in configurations:
+        url = f"sqlite:///{os.path.join(workdir, label.replace(' ', '_') + '.db')}"
+        print(f"Seeding {args.products} products ({label})...")
+        seed_database(url, args.products)
+        with api_server({"DATABASE_URL": url, "SEARCH_CACHE_SIZE": "0", **env}, cwd=cwd) as base_url:
+            load_test(base_url, reads, concurrency=2, duration=1)  # warm up
+            read = {}
+            reader = threading.Thread(target=lambda: read.update(
+                load_test(base_url, reads, concurrency=args.readers, duration=args.duration)
+            ))
+            reader.start()
+            results[f"{label} writes"] = load_test(
+                base_url, ["/products/upsert"], concurrency=args.writers, duration=args.duration,
+                method="POST", body=body,
+            )
+            reader.join()
+            results[f"{label} reads"] = read
+
+    print_table(
+        f"{args.writers} clients upserting {args.batch} rows/request + {args.readers} readers", results
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Shared helpers for the benchmarks: seeding, server processes and load."""
+from contextlib import contextmanager
+from typing import Optional
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from sqlalchemy import create_engine, insert
+
+from app.database import init_db
+from app import models
+
+BRANDS = ["Samsung", "Apple", "Sony", "LG", "Xiaomi", "HP", "Dell", "Lenovo", "Nintendo", "Bose"]
+KINDS = ["Laptop", "Smart TV", "Audífonos", "Tablet", "Cámara", "Consola", "Bocina", "Monitor", "Teléfono", "Reloj"]
+STORES = ["Amazon MX", "Walmart MX", "Liverpool", "Mercado Libre", "Coppel", "Elektra"]
+CATEGORIES = ["Computación", "TV y Video", "Audio", "Celulares", "Gaming", "Cámaras"]
+
+# Search terms used by the load generators
+QUERIES = ["laptop", "samsung", "smart tv", "audifonos sony", "tablet", "camara", "apple", "consola nintendo"]
+
+
+def product_rows(count: int, store_ids: list[int], category_ids: list[int], seed: int = 42):
+    """Yield ``count`` synthetic product dicts."""
+    rng = random.Random(seed)
+    for i in range(count):
+        brand, kind = rng.choice(BRANDS), rng.choice(KINDS)
+        yield {
+            "name": f"{kind} {brand} modelo {rng.randint(1, 999)} {rng.choice(['Pro', 'Max', 'Lite', ''])}".strip(),
+            "store_id": rng.choice(store_ids),
+            "category_id": rng.choice(category_ids),
+            "store_url": f"https://tienda.mx/p/{i}",
+            "sku": f"SKU-{i}",
+            "price": round(rng.uniform(199, 49999), 2),
+            "currency": "MXN",
+            "image_url": f"https://img.tienda.mx/{i}.jpg",
+            "available": 1 if rng.random() > 0.1 else 0,
+        }
+
+
+def seed_database(url: str, count: int, batch: int = 5000):
+    """Create a migrated database at ``url`` holding ``count`` products."""
+    engine = create_engine(url)
+    init_db(engine)
+    with engine.begin() as connection:
+        store_ids = [
+            connection.execute(insert(models.Store).values(name=name, url="https://tienda.mx")).inserted_primary_key[0]
+            for name in STORES
+        ]
+        category_ids = [
+            connection.execute(
+                insert(models.Category).values(name=name, slug=name.lower().replace(" ", "-"))
+            ).inserted_primary_key[0]
+            for name in CATEGORIES
+        ]
+        rows = []
+        for row in product_rows(count, store_ids, category_ids):
+            rows.append(row)
+            if len(rows) >= batch:
+                connection.execute(insert(models.Product), rows)
+                rows = []
+        if rows:
+            connection.execute(insert(models.Product), rows)
+    engine.dispose()
+
+
+@contextmanager
+def api_server(env: dict, port: int = 8765, workers: int = 1, cwd: Optional[str] = None):
+    """Run the API (from ``cwd``, e.g. another checkout) under uvicorn and yield its base URL."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, **env},
+        cwd=cwd,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("API server did not start")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def _load(base_url: str, paths: list[str], concurrency: int, duration: float, method: str = "GET", body=None):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += concurrency
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body(i) if body else None)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    return latencies, errors
+
+
+def load_test(base_url: str, paths: list[str], concurrency: int = 32, duration: float = 10.0, **kwargs) -> dict:
+    """Hit ``paths`` round-robin with ``concurrency`` clients and summarize."""
+    latencies, errors = asyncio.run(_load(base_url, paths, concurrency, duration, **kwargs))
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+        "errors": errors,
+    }
+
+
+def print_table(title: str, rows: dict[str, dict]):
+    """Print benchmark results, one line per configuration."""
+    print(f"\n{title}")
+    print("-" * len(title))
+    for name, result in rows.items():
+        print(f"{name:<28} " + "  ".join(f"{k}={v}" for k, v in result.items()))
@@ -0,0 +1,36 @@
+"""
+Compacta el historial de precios para que su tamaño no crezca sin límite.
+
+Los cambios de precio de más de PRICE_HISTORY_RAW_DAYS días se agrupan en
+mínimo/máximo/cierre por día, los días de más de PRICE_HISTORY_DAILY_DAYS en
+semanas, y las semanas más antiguas que PRICE_HISTORY_RETENTION_DAYS se borran.
+Pensado para ejecutarse una vez al día (por ejemplo con cron, después de la
+importación).
+
+Uso:
+    python compact_price_history.py
+"""
+import time
+
+from app.database import SessionLocal, init_db
+from app import history
+
+
+def main():
+    """Función principal."""
+    init_db()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        stats = history.compact(db)
+    finally:
+        db.close()
+
+    print(f"✓ Puntos compactados en días: {stats['raw']}")
+    print(f"✓ Días compactados en semanas: {stats['daily']}")
+    print(f"✓ Semanas expiradas: {stats['expired']}")
+    print(f"Tiempo: {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
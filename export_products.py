@@ -0,0 +1,51 @@
+"""
+Exporta el catálogo de productos en NDJSON o CSV sin cargarlo en memoria.
+
+Uso:
+    python export_products.py --output productos.ndjson
+    python export_products.py --format csv --gzip --output productos.csv.gz
+    python export_products.py --store-id 1 --q laptop > laptops.ndjson
+"""
+import argparse
+import sys
+
+from app.database import engine
+from app import export
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Exportar productos (mismos filtros que /search)")
+    parser.add_argument("--format", choices=sorted(export.FORMATS), default="ndjson", help="Formato de salida")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir la salida con gzip")
+    parser.add_argument("--output", "-o", help="Archivo de salida (default: stdout)")
+    parser.add_argument("--q", help="Término de búsqueda")
+    parser.add_argument("--store-id", type=int, help="Filtrar por tienda")
+    parser.add_argument("--category-id", type=int, help="Filtrar por categoría")
+    parser.add_argument("--min-price", type=float, help="Precio mínimo")
+    parser.add_argument("--max-price", type=float, help="Precio máximo")
+    args = parser.parse_args()
+
+    filters = {
+        "q": args.q,
+        "store_id": args.store_id,
+        "category_id": args.category_id,
+        "min_price": args.min_price,
+        "max_price": args.max_price,
+    }
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in export.export_products(engine, filters, format=args.format, compress=args.gzip):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+    print(f"✓ {written} bytes exportados", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,34 +4,35 @@ Script para importar productos desde integraciones (Mercado Libre, etc.)
 Uso:
     python import_products.py --store mercadolibre --queries "laptop,iphone,tablet"
     python import_products.py --all  # Importar todos los queries predefinidos
+    python import_products.py --all --api-url http://api:8000  # API en otra URL
+    python import_products.py --all --direct  # Sin API: escribir directamente en la base de datos
+
+Por defecto todo se escribe a través de la API (API_URL, por defecto
+http://localhost:8000), cuyo escritor único serializa todas las escrituras:
+tiendas, categorías, queries seguidos, productos y agrupación entre tiendas.
+--direct escribe en la base de datos sin pasar por él: úsalo solo cuando la
+API no esté corriendo.
 """
 import asyncio
 import argparse
+import os
+
+import httpx
 from sqlalchemy.orm import Session
-from datetime import datetime
 
 from app.database import SessionLocal, init_db
-from app import models
+from app import compare, ingest, matching, models, reference, schemas
 from app.integrations.stores.mercadolibre import MercadoLibreIntegration
-import re
+from app.text import slugify
 
 
 def create_slug(text: str) -> str:
     """Crea un slug a partir de un texto."""
-    # Convertir a minúsculas y remover caracteres especiales
-    text = text.lower()
-    text = re.sub(r'[áàäâ]', 'a', text)
-    text = re.sub(r'[éèëê]', 'e', text)
-    text = re.sub(r'[íìïî]', 'i', text)
-    text = re.sub(r'[óòöô]', 'o', text)
-    text = re.sub(r'[úùüû]', 'u', text)
-    text = re.sub(r'[ñ]', 'n', text)
-    # Reemplazar espacios y caracteres no alfanuméricos con guiones
-    text = re.sub(r'[^a-z0-9]+', '-', text)
-    # Remover guiones al inicio y final
-    text = text.strip('-')
-    return text
+    return slugify(text)
+
 
+# API a través de la cual se escriben los productos
+API_URL = os.getenv("API_URL", "http://localhost:8000")
 
 # Queries predefinidos para importar productos populares
 DEFAULT_QUERIES = [
@@ -50,12 +51,73 @@ DEFAULT_QUERIES = [
 ]
 
 
-async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_query: int = 50):
+class ApiWriter:
+    """Escribe a través de la API, cuyo escritor único serializa todas las escrituras."""
+
+    def __init__(self, api_url: str):
+        self.client = httpx.AsyncClient(base_url=api_url, timeout=120)
+
+    async def _post(self, path: str, **kwargs) -> dict:
+        # Si la cola de escritura está llena (503) espera lo indicado en Retry-After y reintenta
+        while True:
+            response = await self.client.post(path, **kwargs)
+            if response.status_code != 503:
+                response.raise_for_status()
+                return response.json()
+            await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+
+    async def store(self, store: schemas.StoreCreate) -> schemas.Store:
+        return schemas.Store.model_validate(await self._post("/stores", json=store.model_dump()))
+
+    async def category(self, category: schemas.CategoryCreate) -> schemas.Category:
+        return schemas.Category.model_validate(await self._post("/categories", json=category.model_dump()))
+
+    async def track(self, query: str):
+        await self._post("/compare/tracked", params={"q": query})
+
+    async def upsert(self, rows: list[schemas.ProductCreate]) -> schemas.UpsertResponse:
+        payload = {"products": [row.model_dump() for row in rows]}
+        return schemas.UpsertResponse.model_validate(await self._post("/products/upsert", json=payload))
+
+    async def match(self) -> int:
+        return (await self._post("/products/match"))["matched"]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class DirectWriter:
+    """Escribe directamente en la base de datos (--direct, solo con la API detenida)."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.matcher = matching.Matcher()
+
+    async def store(self, store: schemas.StoreCreate) -> models.Store:
+        return reference.get_or_create_store(self.db, store)
+
+    async def category(self, category: schemas.CategoryCreate) -> models.Category:
+        return reference.get_or_create_category(self.db, category)
+
+    async def track(self, query: str):
+        compare.track(self.db, query)
+
+    async def upsert(self, rows: list[schemas.ProductCreate]) -> ingest.WriteResult:
+        return ingest.upsert_products(self.db, rows)
+
+    async def match(self) -> int:
+        return self.matcher.match_pending(self.db)
+
+    async def close(self):
+        pass
+
+
+async def import_from_mercadolibre(writer, queries: list[str], limit_per_query: int = 50):
     """
     Importa productos desde Mercado Libre.
 
     Args:
-        db: Sesión de base de datos
+        writer: ApiWriter (por defecto) o DirectWriter (--direct)
         queries: Lista de términos de búsqueda
         limit_per_query: Productos por término de búsqueda
     """
@@ -77,18 +139,11 @@ async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_qu
 
     # Obtener o crear tienda
     print("\n2. Configurando tienda en base de datos...")
-    store = db.query(models.Store).filter(models.Store.name == "Mercado Libre").first()
-    if not store:
-        store = models.Store(
-            name="Mercado Libre",
-            url="https://www.mercadolibre.com.mx"
-        )
-        db.add(store)
-        db.commit()
-        db.refresh(store)
-        print(f"✓ Tienda creada: {store.name} (ID: {store.id})")
-    else:
-        print(f"✓ Tienda encontrada: {store.name} (ID: {store.id})")
+    store = await writer.store(schemas.StoreCreate(
+        name="Mercado Libre",
+        url="https://www.mercadolibre.com.mx"
+    ))
+    print(f"✓ Tienda: {store.name} (ID: {store.id})")
 
     # Obtener o crear categorías
     print("\n3. Configurando categorías...")
@@ -103,16 +158,11 @@ async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_qu
     ]
 
     for cat_name in category_names:
-        cat = db.query(models.Category).filter(models.Category.name == cat_name).first()
-        if not cat:
-            cat = models.Category(
-                name=cat_name,
-                slug=create_slug(cat_name),
-                description=f"Productos de {cat_name}"
-            )
-            db.add(cat)
-            db.commit()
-            db.refresh(cat)
+        cat = await writer.category(schemas.CategoryCreate(
+            name=cat_name,
+            slug=create_slug(cat_name),
+            description=f"Productos de {cat_name}"
+        ))
         categories[cat_name.lower()] = cat
         print(f"  ✓ {cat_name} (ID: {cat.id})")
 
@@ -132,10 +182,16 @@ async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_qu
         "teclado mecanico": categories.get("computación"),
     }
 
+    # Las comparaciones de estos términos se mantienen precalculadas durante la importación
+    for query in queries:
+        await writer.track(query)
+
     # Importar productos
     print(f"\n4. Importando productos ({len(queries)} términos de búsqueda)...")
     total_imported = 0
     total_updated = 0
+    total_unchanged = 0
+    total_matched = 0
 
     for i, query in enumerate(queries, 1):
         print(f"\n[{i}/{len(queries)}] Buscando: '{query}'")
@@ -152,60 +208,39 @@ async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_qu
             # Obtener categoría para este query
             category = query_to_category.get(query.lower())
 
-            # Guardar cada producto
-            imported = 0
-            updated = 0
-
-            for product_data in products:
-                try:
-                    # Buscar si ya existe (por SKU y tienda)
-                    existing = None
-                    if product_data.sku:
-                        existing = db.query(models.Product).filter(
-                            models.Product.sku == product_data.sku,
-                            models.Product.store_id == store.id
-                        ).first()
-
-                    if existing:
-                        # Actualizar producto existente
-                        existing.name = product_data.name
-                        existing.price = product_data.price
-                        existing.store_url = product_data.store_url
-                        existing.image_url = product_data.image_url
-                        existing.available = 1 if product_data.available else 0
-                        existing.currency = product_data.currency
-                        existing.last_updated = datetime.utcnow()
-                        updated += 1
-                    else:
-                        # Crear nuevo producto
-                        new_product = models.Product(
-                            name=product_data.name,
-                            store_id=store.id,
-                            category_id=category.id if category else None,
-                            store_url=product_data.store_url,
-                            sku=product_data.sku,
-                            price=product_data.price,
-                            currency=product_data.currency,
-                            image_url=product_data.image_url,
-                            available=1 if product_data.available else 0,
-                            last_updated=datetime.utcnow()
-                        )
-                        db.add(new_product)
-                        imported += 1
-
-                except Exception as e:
-                    print(f"    ✗ Error guardando producto: {e}")
-                    continue
-
-            # Commit batch
-            try:
-                db.commit()
-                print(f"  ✓ Importados: {imported} | Actualizados: {updated}")
-                total_imported += imported
-                total_updated += updated
-            except Exception as e:
-                db.rollback()
-                print(f"  ✗ Error en commit: {e}")
+            # Guardar productos con un upsert por (tienda, SKU); los que no
+            # cambiaron de precio, disponibilidad ni URLs no se reescriben
+            rows = [
+                schemas.ProductCreate(
+                    name=product_data.name,
+                    store_id=store.id,
+                    category_id=category.id if category else None,
+                    store_url=product_data.store_url,
+                    sku=product_data.sku,
+                    price=product_data.price,
+                    currency=product_data.currency,
+                    image_url=product_data.image_url,
+                    available=1 if product_data.available else 0
+                )
+                for product_data in products
+            ]
+            result = await writer.upsert(rows)
+
+            for error in result.errors:
+                print(f"    ✗ Error guardando producto: {error}")
+            print(
+                f"  ✓ Importados: {result.created} | Actualizados: {result.updated}"
+                f" | Sin cambios: {result.unchanged}"
+            )
+            total_imported += result.created
+            total_updated += result.updated
+            total_unchanged += result.unchanged
+
+            # Agrupar los productos nuevos con el mismo producto en otras tiendas
+            matched = await writer.match()
+            if matched:
+                print(f"  ✓ Agrupados: {matched}")
+            total_matched += matched
 
         except Exception as e:
             print(f"  ✗ Error en búsqueda '{query}': {e}")
@@ -220,7 +255,9 @@ async def import_from_mercadolibre(db: Session, queries: list[str], limit_per_qu
     print("=" * 60)
     print(f"Productos nuevos importados: {total_imported}")
     print(f"Productos actualizados: {total_updated}")
-    print(f"Total procesado: {total_imported + total_updated}")
+    print(f"Productos sin cambios: {total_unchanged}")
+    print(f"Productos agrupados entre tiendas: {total_matched}")
+    print(f"Total procesado: {total_imported + total_updated + total_unchanged}")
     print("=" * 60)
 
 
@@ -249,12 +286,26 @@ async def main():
         default=50,
         help="Productos por término de búsqueda (default: 50)"
     )
+    parser.add_argument(
+        "--api-url",
+        type=str,
+        default=API_URL,
+        help=f"URL de la API a través de la cual se escribe todo, que serializa todas "
+             f"las escrituras (default: {API_URL})"
+    )
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="Escribir directamente en la base de datos, sin pasar por el escritor único de la API "
+             "(solo con la API detenida)"
+    )
 
     args = parser.parse_args()
 
-    # Inicializar base de datos
-    print("Inicializando base de datos...")
-    init_db()
+    # La API ya aplica las migraciones al arrancar; sin ella, se aplican aquí
+    if args.direct:
+        print("Inicializando base de datos...")
+        init_db()
 
     # Determinar queries
     if args.all:
@@ -264,19 +315,22 @@ async def main():
     else:
         queries = ["laptop", "iphone"]  # Queries por defecto
 
-    # Crear sesión de BD
-    db = SessionLocal()
+    # Crear sesión de BD solo con --direct; si no, todo pasa por la API
+    db = SessionLocal() if args.direct else None
+    writer = DirectWriter(db) if args.direct else ApiWriter(args.api_url)
 
     try:
         if args.store == "mercadolibre" or args.store == "all":
-            await import_from_mercadolibre(db, queries, args.limit)
+            await import_from_mercadolibre(writer, queries, args.limit)
 
         # TODO: Agregar más tiendas aquí cuando estén disponibles
         # if args.store == "coppel" or args.store == "all":
-        #     await import_from_coppel(db, queries, args.limit)
+        #     await import_from_coppel(writer, queries, args.limit)
 
     finally:
-        db.close()
+        await writer.close()
+        if db is not None:
+            db.close()
 
     print("\n✓ Importación completada!")
 
@@ -0,0 +1,43 @@
+"""
+Agrupa los productos de distintas tiendas en productos canónicos.
+
+Solo procesa los productos que aún no tienen producto canónico, así que se
+puede ejecutar después de cada importación.
+
+Uso:
+    python match_products.py
+    python match_products.py --rebuild  # Borrar los grupos y agrupar todo de nuevo
+"""
+import argparse
+import time
+
+from app.database import SessionLocal, init_db
+from app import matching
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Agrupar productos entre tiendas")
+    parser.add_argument("--rebuild", action="store_true", help="Borrar los productos canónicos y agrupar todo")
+    parser.add_argument("--limit", type=int, help="Máximo de productos a procesar")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print("Borrando productos canónicos...")
+            matching.reset(db)
+
+        started = time.perf_counter()
+        matched = matching.Matcher().match_pending(db, limit=args.limit)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    rate = matched / elapsed * 3600 if elapsed else 0
+    print(f"✓ {matched} productos agrupados en {elapsed:.1f}s ({rate:,.0f} por hora)")
+
+
+if __name__ == "__main__":
+    main()
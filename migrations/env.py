@@ -0,0 +1,56 @@
+"""Alembic environment - runs migrations against the application database."""
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import Base, engine
+from app import models  # noqa: F401 - registers the tables on Base.metadata
+from app import search
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """Emit the migration SQL without connecting to the database."""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        include_name=search.include_name,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations on a live connection (provided by init_db() or our engine)."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+
+    with engine.begin() as connection:
+        _run(connection)
+
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=search.include_name,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
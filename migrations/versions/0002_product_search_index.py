@@ -0,0 +1,59 @@
+"""Full-text index on product names
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+Idempotent on purpose: databases created before migrations existed may
+already have the index, created by init_db() before it ran migrations.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_products_name_fts "
+            "ON products USING gin (to_tsvector('simple'::regconfig, name))"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("products_fts_ai", "products_fts_ad", "products_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_name_fts")
@@ -0,0 +1,43 @@
+"""Composite indexes for product filter/sort paths and (store_id, sku) upserts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+The unique (store_id, sku) index cannot be created while a store has
+duplicate SKUs, so the upgrade first keeps the newest row (highest id) of
+every duplicated key and deletes the rest; no table references products yet
+at this revision. Rows without a SKU are not affected (NULLs never collide).
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_products_store_id_sku", ["store_id", "sku"], True),
+    ("ix_products_store_id_id", ["store_id", "id"], False),
+    ("ix_products_store_id_price", ["store_id", "price", "id"], False),
+    ("ix_products_category_id_price", ["category_id", "price", "id"], False),
+    ("ix_products_available_price", ["available", "price", "id"], False),
+    ("ix_products_price", ["price", "id"], False),
+]
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM products WHERE sku IS NOT NULL AND EXISTS ("
+        "SELECT 1 FROM products AS newer WHERE newer.store_id = products.store_id "
+        "AND newer.sku = products.sku AND newer.id > products.id)"
+    )
+    for name, columns, unique in INDEXES:
+        op.create_index(name, "products", columns, unique=unique)
+
+
+def downgrade():
+    for name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name="products")
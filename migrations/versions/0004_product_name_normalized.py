@@ -0,0 +1,137 @@
+"""Accent-folded product names with a trigram index for fuzzy search
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+Backfills name_normalized in batches with a frozen copy of app.text.fold. SQLite gets an
+FTS5 trigram table over the folded name (SQLite 3.34+); PostgreSQL gets
+the pg_trgm extension and a GIN trigram index.
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# app.text.fold as of this revision; later changes to it must not alter the backfill
+_ACCENTS = [
+    (re.compile(r"[áàäâ]"), "a"),
+    (re.compile(r"[éèëê]"), "e"),
+    (re.compile(r"[íìïî]"), "i"),
+    (re.compile(r"[óòöô]"), "o"),
+    (re.compile(r"[úùüû]"), "u"),
+    (re.compile(r"[ñ]"), "n"),
+]
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    text = text.lower()
+    for pattern, replacement in _ACCENTS:
+        text = pattern.sub(replacement, text)
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts_trigram USING fts5(
+        name_normalized,
+        content='products',
+        content_rowid='id',
+        tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts_trigram(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts_trigram(products_fts_trigram, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_au AFTER UPDATE OF name_normalized ON products BEGIN
+        INSERT INTO products_fts_trigram(products_fts_trigram, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+        INSERT INTO products_fts_trigram(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+    "INSERT INTO products_fts_trigram(products_fts_trigram) VALUES ('rebuild')",
+]
+
+# Name index triggers from 0002; SQLite's batch rebuild of products on
+# downgrade drops every trigger on the table, so they are recreated after it
+SQLITE_NAME_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name_normalized gin_trgm_ops)",
+]
+
+
+def backfill(connection):
+    products = sa.table("products", sa.column("id", sa.Integer), sa.column("name", sa.String),
+                        sa.column("name_normalized", sa.String))
+    update = products.update()\
+        .where(products.c.id == sa.bindparam("product_id"))\
+        .values(name_normalized=sa.bindparam("folded"))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(products.c.id, products.c.name)
+            .where(products.c.id > last_id)
+            .order_by(products.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [{"product_id": id_, "folded": fold(name)} for id_, name in rows])
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    op.add_column("products", sa.Column("name_normalized", sa.String(), nullable=True))
+    connection = op.get_bind()
+    backfill(connection)
+
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        for statement in POSTGRES_UPGRADE:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in (
+            "products_fts_trigram_ai", "products_fts_trigram_ad", "products_fts_trigram_au",
+            "products_fts_ai", "products_fts_ad", "products_fts_au",
+        ):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts_trigram")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    with op.batch_alter_table("products") as batch:
+        batch.drop_column("name_normalized")
+    if dialect == "sqlite":
+        for statement in SQLITE_NAME_TRIGGERS:
+            op.execute(statement)
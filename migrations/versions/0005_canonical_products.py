@@ -0,0 +1,97 @@
+"""Canonical products for cross-store matching
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+Existing listings start unmatched (canonical_id NULL); run
+``python match_products.py`` once to cluster them.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# Triggers on products at this revision (name index from 0002, trigram index
+# from 0004). SQLite's batch rebuild of products on downgrade drops every
+# trigger on the table, so they are dropped first and recreated after it.
+SQLITE_TRIGGER_NAMES = (
+    "products_fts_ai", "products_fts_ad", "products_fts_au",
+    "products_fts_trigram_ai", "products_fts_trigram_ad", "products_fts_trigram_au",
+)
+
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts_trigram(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts_trigram(products_fts_trigram, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_trigram_au AFTER UPDATE OF name_normalized ON products BEGIN
+        INSERT INTO products_fts_trigram(products_fts_trigram, rowid, name_normalized)
+        VALUES ('delete', old.id, old.name_normalized);
+        INSERT INTO products_fts_trigram(rowid, name_normalized) VALUES (new.id, new.name_normalized);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+    "INSERT INTO products_fts_trigram(products_fts_trigram) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    op.create_table(
+        "canonical_products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("brand", sa.String(), nullable=True),
+        sa.Column("model", sa.String(), nullable=True),
+        sa.Column("tokens", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "canonical_keys",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("canonical_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["canonical_id"], ["canonical_products.id"]),
+        sa.PrimaryKeyConstraint("key", "canonical_id"),
+    )
+    if op.get_bind().dialect.name == "sqlite":
+        # Inline REFERENCES instead of a batch rebuild, so the FTS triggers on products survive
+        op.execute("ALTER TABLE products ADD COLUMN canonical_id INTEGER REFERENCES canonical_products (id)")
+    else:
+        op.add_column("products", sa.Column("canonical_id", sa.Integer(), nullable=True))
+        op.create_foreign_key(
+            "fk_products_canonical_id", "products", "canonical_products", ["canonical_id"], ["id"]
+        )
+    op.create_index("ix_products_canonical_id_price", "products", ["canonical_id", "price"])
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    op.drop_index("ix_products_canonical_id_price", table_name="products")
+    if sqlite:
+        for trigger in SQLITE_TRIGGER_NAMES:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    with op.batch_alter_table("products") as batch:
+        batch.drop_column("canonical_id")
+    if sqlite:
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+    op.drop_table("canonical_keys")
+    op.drop_table("canonical_products")
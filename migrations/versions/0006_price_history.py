@@ -0,0 +1,120 @@
+"""Price history with daily and weekly rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+Creates the triggers that append a row on every price change and seeds
+the history with each product's current price.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Trigger DDL as of this revision (app.history keeps the current version)
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS price_history_ai AFTER INSERT ON products BEGIN
+        INSERT INTO price_history(product_id, price_cents, recorded_at)
+        VALUES (new.id, CAST(round(new.price * 100) AS INTEGER), COALESCE(new.last_updated, CURRENT_TIMESTAMP));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS price_history_au AFTER UPDATE OF price ON products
+    WHEN new.price IS NOT old.price BEGIN
+        INSERT INTO price_history(product_id, price_cents, recorded_at)
+        VALUES (new.id, CAST(round(new.price * 100) AS INTEGER),
+                CASE WHEN new.last_updated IS NOT old.last_updated THEN new.last_updated ELSE CURRENT_TIMESTAMP END);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS price_history_ad AFTER DELETE ON products BEGIN
+        DELETE FROM price_history WHERE product_id = old.id;
+        DELETE FROM price_rollups WHERE product_id = old.id;
+    END""",
+]
+
+POSTGRES_TRIGGERS = [
+    """CREATE OR REPLACE FUNCTION price_history_insert() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO price_history (product_id, price_cents, recorded_at)
+        SELECT id, round(price * 100)::integer, COALESCE(last_updated, now() AT TIME ZONE 'utc')
+        FROM new_rows;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION price_history_update() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO price_history (product_id, price_cents, recorded_at)
+        SELECT n.id, round(n.price * 100)::integer,
+               CASE WHEN n.last_updated IS DISTINCT FROM o.last_updated THEN n.last_updated
+                    ELSE now() AT TIME ZONE 'utc' END
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE n.price IS DISTINCT FROM o.price;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS price_history_ai ON products",
+    """CREATE TRIGGER price_history_ai AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_history_insert()""",
+    "DROP TRIGGER IF EXISTS price_history_au ON products",
+    """CREATE TRIGGER price_history_au AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_history_update()""",
+]
+
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS price_history_ai ON products",
+    "DROP TRIGGER IF EXISTS price_history_au ON products",
+    "DROP FUNCTION IF EXISTS price_history_insert()",
+    "DROP FUNCTION IF EXISTS price_history_update()",
+]
+
+
+def upgrade():
+    op.create_table(
+        "price_history",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("price_cents", sa.Integer(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_price_history_product_id_recorded_at", "price_history", ["product_id", "recorded_at"])
+    op.create_table(
+        "price_rollups",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("period_start", sa.Date(), nullable=False),
+        sa.Column("days", sa.Integer(), nullable=False),
+        sa.Column("min_cents", sa.Integer(), nullable=False),
+        sa.Column("max_cents", sa.Integer(), nullable=False),
+        sa.Column("close_cents", sa.Integer(), nullable=False),
+        sa.Column("changes", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "period_start"),
+    )
+
+    op.execute(
+        "INSERT INTO price_history (product_id, price_cents, recorded_at) "
+        "SELECT id, CAST(round(price * 100) AS INTEGER), COALESCE(last_updated, created_at, CURRENT_TIMESTAMP) "
+        "FROM products"
+    )
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        for statement in POSTGRES_TRIGGERS:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("price_history_ai", "price_history_au", "price_history_ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DROP:
+            op.execute(statement)
+    op.drop_table("price_rollups")
+    op.drop_index("ix_price_history_product_id_recorded_at", table_name="price_history")
+    op.drop_table("price_history")
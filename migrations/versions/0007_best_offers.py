@@ -0,0 +1,43 @@
+"""Tracked queries with precomputed best offer per store
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tracked_queries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("query"),
+    )
+    op.create_table(
+        "best_offers",
+        sa.Column("tracked_query_id", sa.Integer(), nullable=False),
+        sa.Column("store_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["store_id"], ["stores.id"]),
+        sa.ForeignKeyConstraint(["tracked_query_id"], ["tracked_queries.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("tracked_query_id", "store_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("best_offers")
+    op.drop_table("tracked_queries")
@@ -0,0 +1,100 @@
+"""Index SKUs for full-text search and relevance ranking
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+SQLite: the FTS5 table gains a ``sku`` column, so it is recreated with its
+triggers and rebuilt from ``products``. PostgreSQL: the name-only tsvector
+index is replaced by the weighted name + SKU one.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+FTS_TRIGGERS = ("products_fts_ai", "products_fts_ad", "products_fts_au")
+
+# Name + SKU index as of this revision (app.search keeps the current version)
+NAME_SKU_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name,
+        sku,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+NAME_SKU_POSTGRES = (
+    "CREATE INDEX IF NOT EXISTS ix_products_search_fts ON products USING gin (("
+    "setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(sku, '')), 'B')"
+    "))"
+)
+
+# Index as created by 0002, restored on downgrade
+NAME_ONLY_SQLITE = [
+    """CREATE VIRTUAL TABLE products_fts USING fts5(
+        name,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER products_fts_au AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in FTS_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+        # The name + SKU table and its triggers (the trigram index is unchanged)
+        for statement in NAME_SKU_SQLITE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_name_fts")
+        op.execute(NAME_SKU_POSTGRES)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in FTS_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+        for statement in NAME_ONLY_SQLITE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_search_fts")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_products_name_fts "
+            "ON products USING gin (to_tsvector('simple'::regconfig, name))"
+        )
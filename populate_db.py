@@ -2,21 +2,35 @@
 Script to populate the database with stores, categories, and products.
 Run with: python populate_db.py
 """
-from app.database import SessionLocal, engine, Base
+from sqlalchemy import text
+
+from app.database import SessionLocal, init_db
 from app import models
 from datetime import datetime
 
 def populate_database():
-    # Drop all existing tables and recreate with new schema
-    print("Dropping all existing tables...")
-    Base.metadata.drop_all(bind=engine)
-
-    print("Creating database tables with new schema...")
-    Base.metadata.create_all(bind=engine)
+    # Bring the schema up to date without rebuilding it
+    print("Applying database migrations...")
+    init_db()
 
     db = SessionLocal()
 
     try:
+        # Clear existing rows so the sample data can be inserted again,
+        # dependent tables first so no foreign key is left dangling
+        print("Removing existing products, categories and stores...")
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text(
+                "TRUNCATE best_offers, tracked_queries, price_rollups, price_history, products, "
+                "canonical_keys, canonical_products, categories, stores RESTART IDENTITY CASCADE"
+            ))
+        else:
+            for model in (
+                models.BestOffer, models.TrackedQuery, models.PriceRollup, models.PriceHistory, models.Product,
+                models.CanonicalKey, models.CanonicalProduct, models.Category, models.Store,
+            ):
+                db.query(model).delete()
+        db.commit()
 
         # Create Stores
         print("\nCreating stores...")
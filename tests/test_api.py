@@ -1,12 +1,24 @@
 """Basic API tests."""
+from contextlib import contextmanager
+from datetime import datetime
+import gzip
+import json
+import threading
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from app.main import app
-from app.database import Base, get_db
-from app import models
+from app.database import AsyncReader, Base, get_db, get_read_db, get_reader
+from app import (
+    cache, compare, counts, database, facets, history, ingest, lookup, matching, models, reference, schemas, search,
+    streaming, suggest, writer,
+)
 
 # Test database
 TEST_DATABASE_URL = "sqlite:///./test.db"
@@ -24,6 +36,8 @@ def override_get_db():
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+writer.writes.session_factory = TestingSessionLocal
 client = TestClient(app)
 
 
@@ -31,6 +45,13 @@ client = TestClient(app)
 def setup_database():
     """Setup test database before each test."""
     Base.metadata.create_all(bind=engine)
+    counts.estimator.reset()
+    cache.search_cache.clear()
+    facets.facet_cache.clear()
+    reference.snapshot.reset()
+    streaming.jobs.clear()
+    compare.tracked.reset()
+    suggest.index.reset()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -70,3 +91,905 @@ def test_get_product_not_found():
     response = client.get("/products/999")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"].lower()
+
+
+def seed_products(names, price=1000.0):
+    """Insert a store plus one product per name and return the product IDs."""
+    db = TestingSessionLocal()
+    try:
+        store = models.Store(name="Amazon MX", url="https://www.amazon.com.mx")
+        db.add(store)
+        db.commit()
+        products = [
+            models.Product(
+                name=name,
+                store_id=store.id,
+                store_url=f"https://amazon.com.mx/{idx}",
+                price=price + idx,
+            )
+            for idx, name in enumerate(names)
+        ]
+        db.add_all(products)
+        db.commit()
+        return [product.id for product in products]
+    finally:
+        db.close()
+
+
+def test_search_matches_all_tokens():
+    """Test full-text search requires every token and matches prefixes."""
+    seed_products(["Laptop HP Pavilion 15", "Laptop Dell XPS 15", "Audífonos Sony WH-1000XM5"])
+
+    response = client.get("/search?q=lap hp")
+    assert response.status_code == 200
+    names = [p["name"] for p in response.json()["products"]]
+    assert names == ["Laptop HP Pavilion 15"]
+
+    response = client.get("/search?q=audifonos sony")
+    assert [p["name"] for p in response.json()["products"]] == ["Audífonos Sony WH-1000XM5"]
+
+
+def test_search_index_follows_updates_and_deletes():
+    """Test the full-text index stays in sync with product writes."""
+    product_id, other_id = seed_products(["Xbox Series X", "PlayStation 5"])
+
+    db = TestingSessionLocal()
+    product = db.get(models.Product, product_id)
+    product.name = "Nintendo Switch OLED"
+    db.delete(db.get(models.Product, other_id))
+    db.commit()
+    db.close()
+
+    assert client.get("/search?q=xbox").json()["products"] == []
+    assert client.get("/search?q=playstation").json()["products"] == []
+    found = client.get("/search?q=switch oled").json()["products"]
+    assert [p["id"] for p in found] == [product_id]
+
+
+def test_search_cursor_pagination_walks_all_results():
+    """Test following next_cursor visits every match exactly once, in price order."""
+    ids = seed_products([f"Laptop modelo {i}" for i in range(7)])
+
+    seen = []
+    response = client.get("/search?q=laptop&per_page=3")
+    while True:
+        data = response.json()
+        seen.extend(p["id"] for p in data["products"])
+        cursor = data["pagination"]["next_cursor"]
+        if not cursor:
+            break
+        response = client.get(f"/search?q=laptop&per_page=3&cursor={cursor}")
+
+    assert seen == ids
+
+
+def test_store_products_cursor_header():
+    """Test store listings return the next cursor in a response header."""
+    ids = seed_products(["Tablet A", "Tablet B", "Tablet C"])
+
+    response = client.get("/stores/1/products?limit=2")
+    assert [p["id"] for p in response.json()] == ids[:2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/stores/1/products?limit=2&cursor={cursor}")
+    assert [p["id"] for p in response.json()] == ids[2:]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_invalid_cursor_rejected():
+    """Test a tampered cursor is a client error."""
+    response = client.get("/search?q=laptop&cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_search_total_modes():
+    """Test exact, omitted and estimated totals are labelled in the pagination."""
+    seed_products(["Smart TV Samsung 55", "Smart TV LG 50"])
+
+    meta = client.get("/search?q=smart tv").json()["pagination"]
+    assert (meta["total"], meta["total_type"]) == (2, "exact")
+
+    meta = client.get("/search?q=smart tv&include_total=false").json()["pagination"]
+    assert (meta["total"], meta["total_pages"], meta["total_type"]) == (None, None, "omitted")
+
+    meta = client.get("/search?q=smart tv&estimate_total=true").json()["pagination"]
+    assert (meta["total"], meta["total_type"]) == (2, "estimated")
+
+
+def test_estimated_total_uses_counters():
+    """Test estimated totals follow the counters as bulk inserts land."""
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://www.liverpool.com.mx"))
+    db.add(models.Category(name="Audio", slug="audio"))
+    db.commit()
+    db.close()
+
+    meta = client.get("/categories/1/products?estimate_total=true").json()["pagination"]
+    assert meta["total"] == 0
+
+    product = {"name": "Bose QC45", "store_id": 1, "category_id": 1, "store_url": "https://x", "price": 6999}
+    client.post("/products/bulk", json={"products": [product, product]})
+
+    meta = client.get("/categories/1/products?estimate_total=true").json()["pagination"]
+    assert (meta["total"], meta["total_type"]) == (2, "estimated")
+
+
+@contextmanager
+def count_statements():
+    """Count SQL statements executed on the test engine inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/search?q=camara", 2),
+    ("/categories/1/products", 2),
+    ("/stores/1/products", 1),
+])
+def test_product_listings_use_constant_statements(url, expected):
+    """Test listing endpoints do not lazy-load store/category per product."""
+    db = TestingSessionLocal()
+    stores = [models.Store(name=f"Tienda {i}", url=f"https://tienda{i}.mx") for i in range(5)]
+    categories = [models.Category(name=f"Categoria {i}", slug=f"categoria-{i}") for i in range(5)]
+    db.add_all(stores + categories)
+    db.commit()
+    db.add_all([
+        models.Product(
+            name=f"Camara {i}",
+            store_id=stores[0 if "stores" in url else i % 5].id,
+            category_id=categories[0 if "categories" in url else i % 5].id,
+            store_url=f"https://tienda.mx/{i}",
+            price=100 + i,
+        )
+        for i in range(20)
+    ])
+    db.commit()
+    db.close()
+    client.get("/stores")  # warm the reference snapshot
+
+    with count_statements() as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(statements) == expected
+
+
+def test_search_cache_serves_hot_queries_without_sql():
+    """Test a repeated search is answered from the cache without any SQL."""
+    seed_products(["iPhone 15 Pro Max 256GB"])
+
+    first = client.get("/search?q=iphone")
+    with count_statements() as statements:
+        second = client.get("/search?q=IPHONE ")
+
+    assert statements == []
+    assert second.json() == first.json()
+    assert client.get("/cache/stats").json()["hits"] == 1
+
+
+def test_search_cache_invalidated_by_bulk_insert():
+    """Test bulk inserts drop cached searches that could include the new rows."""
+    seed_products(["Xiaomi 13 Pro"])
+    assert client.get("/search?q=xiaomi").json()["pagination"]["total"] == 1
+    assert client.get("/search?q=xiaomi&store_id=2").json()["pagination"]["total"] == 0
+
+    product = {"name": "Xiaomi 13 Pro", "store_id": 1, "store_url": "https://x", "price": 14999}
+    client.post("/products/bulk", json={"products": [product]})
+
+    assert client.get("/search?q=xiaomi").json()["pagination"]["total"] == 2
+    assert client.get("/cache/stats").json()["invalidations"] == 1
+
+
+def test_reference_endpoints_revalidate_with_etag():
+    """Test stores/categories carry a strong ETag and answer 304 when unchanged."""
+    seed_products(["Garmin Fenix 7"])
+
+    response = client.get("/stores")
+    assert response.json()[0]["name"] == "Amazon MX"
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    with count_statements() as statements:
+        response = client.get("/stores", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert statements == []
+
+    response = client.get("/stores/1")
+    assert response.json()["name"] == "Amazon MX"
+    assert client.get("/stores/1", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get("/stores/99").status_code == 404
+
+
+def test_reference_snapshot_picks_up_new_rows():
+    """Test an unknown ID triggers a reload so rows from other writers are found."""
+    assert client.get("/categories").json() == []
+
+    db = TestingSessionLocal()
+    db.add(models.Category(name="Gaming", slug="gaming"))
+    db.commit()
+    db.close()
+
+    assert client.get("/categories/1").json()["slug"] == "gaming"
+    assert [c["slug"] for c in client.get("/categories").json()] == ["gaming"]
+
+
+def test_read_endpoints_in_async_mode():
+    """Test the read endpoints answer the same through the async engine."""
+    seed_products(["Canon EOS R6 Mark II", "Sony A7 IV"])
+    urls = ["/search?q=canon", "/products/2", "/stores", "/stores/1/products", "/categories"]
+    expected = [client.get(url).json() for url in urls]
+
+    AsyncTestingSession = async_sessionmaker(create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool))
+
+    async def override_get_reader():
+        async with AsyncTestingSession() as session:
+            yield AsyncReader(session)
+
+    cache.search_cache.clear()
+    reference.snapshot.reset()
+    app.dependency_overrides[get_reader] = override_get_reader
+    try:
+        assert [client.get(url).json() for url in urls] == expected
+        assert client.get("/products/99").status_code == 404
+    finally:
+        del app.dependency_overrides[get_reader]
+
+
+def test_bulk_create_reports_failures_per_row():
+    """Test bulk create inserts valid rows and reports each invalid one."""
+    seed_products(["Existing"])
+    db = TestingSessionLocal()
+    db.query(models.Product).update({"sku": "TAKEN"})
+    db.commit()
+    db.close()
+
+    def product(sku, store_id=1, category_id=None):
+        return {"name": f"Producto {sku}", "store_id": store_id, "category_id": category_id,
+                "store_url": "https://x", "sku": sku, "price": 100}
+
+    payload = [product("A"), product("B", store_id=9), product("C", category_id=9),
+               product("A"), product("TAKEN"), product(None), product(None)]
+    with count_statements() as statements:
+        data = client.post("/products/bulk", json={"products": payload}).json()
+
+    assert (data["created"], data["failed"]) == (3, 4)
+    assert sorted(e.split(":")[0] for e in data["errors"]) == ["Product 1", "Product 2", "Product 3", "Product 4"]
+    # Valid rows go out as a single executemany INSERT
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == 1
+
+
+def test_bulk_upsert_updates_only_changed_rows():
+    """Test upsert creates new SKUs, updates changed ones and skips identical ones."""
+    seed_products(["Kindle"])
+
+    def product(sku, price=100, available=1):
+        return {"name": f"Producto {sku}", "store_id": 1, "store_url": "https://x",
+                "sku": sku, "price": price, "available": available}
+
+    data = client.post("/products/upsert", json={"products": [product("A"), product("B"), product("C")]}).json()
+    assert (data["created"], data["updated"], data["unchanged"], data["failed"]) == (3, 0, 0, 0)
+
+    payload = [product("A"), product("B", price=90), product("C", available=0), product("D")]
+    with count_statements() as statements:
+        data = client.post("/products/upsert", json={"products": payload}).json()
+    assert (data["created"], data["updated"], data["unchanged"], data["failed"]) == (1, 2, 1, 0)
+    # Changed and new rows share one INSERT ... ON CONFLICT statement
+    writes = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(writes) == 1 and "ON CONFLICT" in writes[0].upper()
+
+    db = TestingSessionLocal()
+    rows = {p.sku: (p.price, p.available) for p in db.query(models.Product).filter(models.Product.sku.isnot(None))}
+    db.close()
+    assert rows == {"A": (100, 1), "B": (90, 1), "C": (100, 0), "D": (100, 1)}
+
+
+def test_upsert_falls_back_to_insert_and_update_without_on_conflict(monkeypatch):
+    """Test upserts on a backend without ON CONFLICT insert new SKUs and update stored ones by key."""
+    seed_products(["Kindle"])
+    monkeypatch.setattr(ingest, "UPSERT_INSERTS", {})
+    db = TestingSessionLocal()
+    db.add(models.Category(name="Tablets", slug="tablets"))
+    db.add(models.Product(name="Producto A", store_id=1, category_id=1, store_url="https://x", sku="A", price=100))
+    db.commit()
+    db.close()
+
+    payload = [
+        {"name": "Producto A Nuevo", "store_id": 1, "store_url": "https://x", "sku": "A", "price": 80},
+        {"name": "Producto B", "store_id": 1, "store_url": "https://x", "sku": "B", "price": 50},
+    ]
+    with count_statements() as statements:
+        data = client.post("/products/upsert", json={"products": payload}).json()
+    assert (data["created"], data["updated"], data["unchanged"], data["failed"]) == (1, 1, 0, 0)
+    assert not any("ON CONFLICT" in s.upper() for s in statements)
+
+    db = TestingSessionLocal()
+    a = db.query(models.Product).filter(models.Product.sku == "A").one()
+    assert (a.name_normalized, a.price, a.category_id) == ("producto a nuevo", 80, 1)
+    assert db.query(models.Product.price).filter(models.Product.sku == "B").scalar() == 50
+    db.close()
+
+
+def test_streaming_ingest_writes_gzip_ndjson_in_chunks(monkeypatch):
+    """Test NDJSON ingest validates line by line and writes in fixed-size chunks."""
+    seed_products(["Kindle"])
+    monkeypatch.setattr(ingest, "BULK_CHUNK_SIZE", 2)
+
+    lines = [json.dumps({"name": f"Producto {i}", "store_id": 1, "store_url": "https://x",
+                         "sku": f"S{i}", "price": 10 + i}) for i in range(5)]
+    lines.insert(2, '{"name": "sin precio", "store_id": 1, "store_url": "https://x"}')
+    lines.insert(4, "")
+    body = gzip.compress("\n".join(lines).encode())
+
+    with count_statements() as statements:
+        response = client.post("/products/ingest?job_id=feed-1", content=body,
+                               headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+    data = response.json()
+    assert (data["status"], data["lines"], data["created"], data["failed"]) == ("completed", 6, 5, 1)
+    assert data["errors"] == ["Product 2: price: Field required"]
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == 3
+    assert client.get("/products/ingest/feed-1").json()["created"] == 5
+
+    truncated = client.post("/products/ingest", content=body[:-8], headers={"Content-Encoding": "gzip"})
+    assert truncated.status_code == 400
+
+
+def test_export_streams_filtered_catalog():
+    """Test the export applies /search filters and encodes NDJSON, CSV and gzip."""
+    seed_products(["Laptop Lenovo", "Laptop HP", "Mouse Logitech"])
+
+    response = client.get("/export", params={"q": "laptop"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in rows] == ["Laptop Lenovo", "Laptop HP"]
+    assert rows[0]["store"] == "Amazon MX" and rows[0]["category"] is None
+
+    response = client.get("/export", params={"format": "csv", "gzip": "true"})
+    assert response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert lines[0].startswith("id,name,sku,price")
+    assert len(lines) == 4
+
+
+def test_list_responses_match_documented_schema():
+    """Test the column-level serialization produces exactly the schema's output."""
+    seed_products(["Camara Sony", "Camara Canon"])
+    db = TestingSessionLocal()
+    db.add(models.Category(name="Fotografia", slug="fotografia"))
+    db.query(models.Product).update({"category_id": 1})
+    db.commit()
+    db.close()
+
+    for url, schema in (("/search?q=camara", schemas.SearchResponse),
+                        ("/categories/1/products", schemas.ProductSearchResponse)):
+        data = client.get(url).json()
+        assert data == schema.model_validate(data).model_dump(mode="json")
+        assert data["products"][0]["category"]["slug"] == "fotografia"
+
+    data = client.get("/stores/1/products").json()
+    assert data == [schemas.Product.model_validate(p).model_dump(mode="json") for p in data]
+    assert data[0]["store"]["name"] == "Amazon MX"
+
+
+def test_sparse_fieldsets_select_only_requested_columns():
+    """Test fields= and the summary projection trim both the payload and the SELECT."""
+    seed_products(["Camara Sony", "Camara Canon"])
+
+    with count_statements() as statements:
+        data = client.get("/search?q=camara&fields=summary&include_total=false").json()
+    assert set(data["products"][0]) == {"id", "name", "price", "store_id", "image_url"}
+    assert schemas.ProductSummary.model_validate(data["products"][0])
+    select_sql = [s for s in statements if "FROM products" in s][-1]
+    assert "store_url" not in select_sql and "stores" not in select_sql
+
+    data = client.get("/stores/1/products?fields=name,store").json()
+    assert data[0] == {"name": "Camara Sony", "store": data[0]["store"]}
+    assert data[0]["store"]["name"] == "Amazon MX"
+
+    response = client.get("/search?q=camara&fields=name,secret")
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+
+def test_fuzzy_search_folds_accents_and_tolerates_typos():
+    """Test fuzzy search matches folded names with typos and ranks by similarity."""
+    seed_products(["Teléfono Samsung Galaxy S23", "Teléfono Motorola Edge", "Audífonos Sony WH-1000XM5",
+                   "Cámara Canon EOS"])
+
+    db = TestingSessionLocal()
+    assert db.query(models.Product.name_normalized).filter(models.Product.id == 3).scalar() \
+        == "audifonos sony wh 1000xm5"
+    db.close()
+
+    names = [p["name"] for p in client.get("/search?q=telefono samsumg&fuzzy=true").json()["products"]]
+    assert names[0] == "Teléfono Samsung Galaxy S23"
+    assert "Cámara Canon EOS" not in names
+    assert [p["name"] for p in client.get("/search?q=camra&fuzzy=true").json()["products"]] == ["Cámara Canon EOS"]
+
+    # Upserts keep the folded name in step
+    client.post("/products/upsert", json={"products": [
+        {"name": "Bocina Bose Portátil", "store_id": 1, "store_url": "https://x", "sku": "B1", "price": 10}
+    ]})
+    assert client.get("/search?q=portatil&fuzzy=true").json()["pagination"]["total"] == 1
+    assert client.get("/search?q=camra&fuzzy=true&cursor=abc").status_code == 400
+
+
+def test_fuzzy_search_filters_before_the_candidate_cut():
+    """Test a store filter still finds fuzzy matches ranked past the first FUZZY_CANDIDATES trigram hits."""
+    seed_products([f"Telefono Samsung {i}" for i in range(search.FUZZY_CANDIDATES + 100)])
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add_all([
+        models.Product(name=f"Telefono Samsung Galaxy con funda protectora y cargador rapido incluido {i}",
+                       store_id=2, store_url="https://x", price=500 + i)
+        for i in range(3)
+    ])
+    db.commit()
+    db.close()
+
+    data = client.get("/search?q=telefono samsumg&fuzzy=true&store_id=2").json()
+    assert data["pagination"]["total"] == 3
+    assert {p["store_id"] for p in data["products"]} == {2}
+
+
+def test_fuzzy_search_facets_match_the_listed_candidates(monkeypatch):
+    """Test fuzzy facets and the total count the filtered candidates that are listed."""
+    monkeypatch.setattr(search, "FUZZY_CANDIDATES", 3)
+    seed_products([f"Camara Canon {i}" for i in range(10)])
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add_all([
+        models.Product(name=f"Camara Sony Alpha con lente y estuche {i}", store_id=2, store_url="https://x", price=900 + i)
+        for i in range(3)
+    ])
+    db.commit()
+    db.close()
+
+    data = client.get("/search?q=camara&fuzzy=true&store_id=2&facets=true").json()
+    assert len(data["products"]) == 3
+    assert data["pagination"]["total"] == 3
+    assert [(f["value"], f["count"]) for f in data["facets"]["stores"]] == [(2, 3)]
+
+    data = client.get("/search?q=camara&fuzzy=true&facets=true").json()
+    assert data["pagination"]["total"] == len(data["products"]) == 3
+    assert sum(f["count"] for f in data["facets"]["stores"]) == 3
+
+
+def test_search_rejects_non_finite_prices():
+    """Test infinite and NaN price filters are rejected up front instead of breaking the facet query."""
+    seed_products(["Cámara Canon EOS"])
+    for bound in ("max_price=inf", "min_price=nan", "max_price=1e400"):
+        assert client.get(f"/search?q=camara&facets=true&{bound}").status_code == 422
+        assert client.get(f"/search?q=camara&{bound}").status_code == 422
+    assert client.get("/search?q=camara&facets=true&max_price=5000.5").status_code == 200
+
+
+def test_search_facets_apply_other_filters_in_one_query():
+    """Test facets come from one grouped query and ignore only their own filter."""
+    seed_products(["Laptop Dell", "Laptop HP"], price=800)
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add(models.Product(name="Laptop Lenovo", store_id=1, store_url="https://x", price=12000))
+    db.add(models.Product(name="Laptop Acer", store_id=2, store_url="https://x", price=900, available=0))
+    db.commit()
+    db.close()
+    client.get("/stores")  # warm the reference snapshot
+
+    with count_statements() as statements:
+        data = client.get("/search?q=laptop&store_id=1&max_price=1000&facets=true").json()
+    # The grouped facet query also yields the exact total, replacing the COUNT
+    assert len(statements) == 2
+    assert data["pagination"]["total"] == 2
+
+    facet = data["facets"]
+    assert {s["label"]: s["count"] for s in facet["stores"]} == {"Amazon MX": 2, "Liverpool": 1}
+    assert facet["availability"] == [{"value": 1, "label": "available", "count": 2}]
+    assert [b["count"] for b in facet["price"] if b["count"]] == [2, 1]
+    assert facet["price"][-1]["max"] is None
+
+    # Drilling into another store reuses the grouped rows; only COUNT and the page run
+    with count_statements() as statements:
+        data = client.get("/search?q=laptop&store_id=2&max_price=1000&facets=true").json()
+    assert len(statements) == 2
+    assert data["pagination"]["total"] == 1
+    assert data["facets"]["stores"] == facet["stores"]
+    assert client.get("/search?q=laptop").json()["facets"] is None
+
+
+def test_matching_groups_same_product_across_stores():
+    """Test listings of one product at several stores share a canonical product."""
+    seed_products(["Apple iPhone 15 128 GB Negro", "Apple iPhone 14 128GB Negro", "Laptop Lenovo IdeaPad"])
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add(models.Product(name="iPhone 15 128GB Negro Liberado", store_id=2, store_url="https://x", price=900))
+    db.commit()
+
+    matcher = matching.Matcher()
+    assert matcher.match_pending(db) == 4
+    # Incremental: only new listings are processed, on a fresh matcher too
+    assert matching.Matcher().match_pending(db) == 0
+    db.add(models.Product(name="IPHONE 15 de 128 gb negro", store_id=2, store_url="https://y", price=950))
+    db.commit()
+    assert matching.Matcher().match_pending(db) == 1
+    canonical = {p.id: p.canonical_id for p in db.query(models.Product)}
+    db.close()
+
+    assert canonical[1] == canonical[4] == canonical[5]
+    assert len({canonical[1], canonical[2], canonical[3]}) == 3
+
+    data = client.get("/products/1/offers").json()
+    assert data["canonical"]["brand"] == "apple"
+    assert [(p["id"], p["store"]["name"]) for p in data["offers"]] == \
+        [(4, "Liverpool"), (5, "Liverpool"), (1, "Amazon MX")]
+    assert data == schemas.ProductOffers.model_validate(data).model_dump(mode="json")
+    assert client.get("/products/99/offers").status_code == 404
+
+
+def test_price_history_records_changes_and_compacts():
+    """Test history appends only on price changes and downsamples after compaction."""
+    seed_products(["Consola Nintendo Switch"], price=7000)
+    for price in (7000, 6500, 6500, 6900):
+        client.post("/products/upsert", json={"products": [
+            {"name": "Consola Nintendo Switch", "store_id": 1, "store_url": "https://x", "sku": "NS1", "price": price}
+        ]})
+
+    db = TestingSessionLocal()
+    rows = db.query(models.PriceHistory).filter(models.PriceHistory.product_id == 2).all()
+    assert [row.price_cents for row in rows] == [700000, 650000, 690000]
+    # Backdate the points so compaction rolls them into one daily row
+    db.query(models.PriceHistory).update({"recorded_at": datetime(2020, 1, 7, 12)})
+    db.commit()
+    assert history.compact(db, now=datetime(2020, 3, 1)) == {"raw": 4, "daily": 0, "expired": 0}
+    assert db.query(models.PriceHistory).count() == 0
+    db.close()
+
+    data = client.get("/products/2/history?resolution=daily").json()
+    assert data["points"] == [{"at": "2020-01-07T00:00:00", "min": 6500.0, "max": 7000.0, "close": 6900.0}]
+    assert data == schemas.PriceHistory.model_validate(data).model_dump(mode="json")
+    weekly = client.get("/products/2/history?resolution=weekly").json()["points"]
+    assert [p["at"] for p in weekly] == ["2020-01-06T00:00:00"]
+    assert client.get("/products/2/history?resolution=raw").json()["points"] == []
+    assert client.get("/products/99/history").status_code == 404
+
+
+def test_compare_returns_cheapest_in_stock_offer_per_store():
+    """Test /compare ranks per store in one query and keeps tracked queries current on import."""
+    seed_products(["Laptop Dell Inspiron", "Laptop HP Pavilion", "Mouse Logitech"], price=900)
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add(models.Product(name="Laptop Lenovo", store_id=2, store_url="https://x", sku="L1", price=700, available=0))
+    db.add(models.Product(name="Laptop Acer", store_id=2, store_url="https://x", sku="L2", price=1200))
+    db.commit()
+    client.get("/stores")  # warm the reference snapshot
+
+    with count_statements() as statements:
+        data = client.get("/compare?q=laptop").json()
+    assert len(statements) == 2  # tracked query lookup + the windowed query
+    assert data["precomputed"] is False
+    assert [(p["name"], p["price"]) for p in data["offers"]] == [("Laptop Dell Inspiron", 900), ("Laptop Acer", 1200)]
+    assert data == schemas.CompareResponse.model_validate(data).model_dump(mode="json")
+
+    compare.track(db, "Laptop")
+    db.close()
+    # Restocking the cheaper Liverpool laptop refreshes the precomputed row on upsert
+    client.post("/products/upsert", json={"products": [
+        {"name": "Laptop Lenovo", "store_id": 2, "store_url": "https://x", "sku": "L1", "price": 650, "available": 1}
+    ]})
+    data = client.get("/compare?q=laptop").json()
+    assert data["precomputed"] is True
+    assert [(p["name"], p["price"]) for p in data["offers"]] == [("Laptop Lenovo", 650), ("Laptop Dell Inspiron", 900)]
+
+    # Raising the best offer's price falls back to recomputing that store's minimum
+    client.post("/products/upsert", json={"products": [
+        {"name": "Laptop Lenovo", "store_id": 2, "store_url": "https://x", "sku": "L1", "price": 1300, "available": 1}
+    ]})
+    offers = client.get("/compare?q=laptop").json()["offers"]
+    assert [(p["name"], p["price"]) for p in offers] == [("Laptop Dell Inspiron", 900), ("Laptop Acer", 1200)]
+
+
+def test_importer_writes_go_through_the_writer():
+    """Test the store, category, tracking and matching endpoints the importer uses run on the writer."""
+    store = client.post("/stores", json={"name": "Mercado Libre", "url": "https://www.mercadolibre.com.mx"}).json()
+    again = client.post("/stores", json={"name": "Mercado Libre", "url": "https://www.mercadolibre.com.mx"}).json()
+    assert store["id"] == again["id"]
+    category = client.post("/categories", json={"name": "Audio", "slug": "audio"}).json()
+    assert [c["name"] for c in client.get("/categories").json()] == ["Audio"]
+
+    assert client.post("/compare/tracked?q=Audifonos Sony").json()["query"] == "audifonos sony"
+    client.post("/products/upsert", json={"products": [
+        {"name": "Audifonos Sony WH-1000XM5", "store_id": store["id"], "category_id": category["id"],
+         "store_url": "https://x", "sku": "S1", "price": 5000},
+    ]})
+    assert client.post("/products/match").json() == {"matched": 1}
+    data = client.get("/compare?q=audifonos sony").json()
+    assert data["precomputed"] is True and len(data["offers"]) == 1
+
+
+def test_writes_keep_queries_tracked_by_another_process_current():
+    """Test a write right after another process tracked a query updates its offers despite the cached map."""
+    seed_products(["Mouse Logitech"], price=300)
+    client.get("/compare?q=mouse")  # the API caches its tracked query map
+    # Another process (the importer) tracks "laptop" before any laptop exists
+    db = TestingSessionLocal()
+    db.add(models.TrackedQuery(query="laptop"))
+    db.commit()
+    db.close()
+
+    client.post("/products/upsert", json={"products": [
+        {"name": "Laptop Lenovo", "store_id": 1, "store_url": "https://x", "sku": "L1", "price": 650}
+    ]})
+    compare.tracked.invalidate()  # as after TRACKED_RELOAD_SECONDS
+    data = client.get("/compare?q=laptop").json()
+    assert data["precomputed"] is True
+    assert [(p["name"], p["price"]) for p in data["offers"]] == [("Laptop Lenovo", 650)]
+
+
+def test_compare_tracks_popular_queries_on_the_writer(monkeypatch):
+    """Test popular /compare queries are tracked by the writer thread, and retried if tracking failed."""
+    seed_products(["Laptop Dell Inspiron", "Mouse Logitech"], price=900)
+    monkeypatch.setattr(compare, "COMPARE_TRACK_AFTER", 2)
+    track = compare.track
+    calls = []
+
+    def flaky_track(db, q):
+        calls.append(q)
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return track(db, q)
+
+    monkeypatch.setattr(compare, "track", flaky_track)
+    for _ in range(3):
+        assert client.get("/compare?q=laptop").json()["precomputed"] is False
+        writer.writes.submit_task(lambda db: None).result(5)  # wait for queued tracking
+    assert calls == ["laptop", "laptop"]
+    assert client.get("/compare?q=laptop").json()["precomputed"] is True
+    db = TestingSessionLocal()
+    assert db.query(models.TrackedQuery.query).all() == [("laptop",)]
+    db.close()
+
+
+def refresh_suggestions():
+    """Run one suggestion refresher pass, as the background thread would."""
+    db = TestingSessionLocal()
+    suggest.index.refresh(db)
+    db.close()
+
+
+def test_suggest_completes_words_and_popular_searches():
+    """Test /suggest ranks folded words by popularity and picks up new products and searches."""
+    seed_products(["Teléfono Samsung Galaxy", "Televisión Samsung", "Teclado Logitech", "Televisión LG"])
+    assert client.get("/suggest?prefix=Te").json()["suggestions"] == []
+    refresh_suggestions()
+
+    data = client.get("/suggest?prefix=Te").json()
+    assert [s["text"] for s in data["suggestions"]] == ["television", "teclado", "telefono"]
+    assert data == schemas.SuggestResponse.model_validate(data).model_dump(mode="json")
+    assert [s["text"] for s in client.get("/suggest?prefix=samsung gal").json()["suggestions"]] == ["samsung galaxy"]
+
+    # Popular searches are suggested whole once run often enough
+    for _ in range(suggest.MIN_QUERY_COUNT):
+        client.get("/search?q=teclado mecanico")
+    refresh_suggestions()
+    texts = [s["text"] for s in client.get("/suggest?prefix=tecl").json()["suggestions"]]
+    assert texts == ["teclado mecanico", "teclado"]
+
+    # New products are folded in on the next refresh
+    db = TestingSessionLocal()
+    db.add(models.Product(name="Tenis Nike", store_id=1, store_url="https://x", price=1))
+    db.commit()
+    db.close()
+    refresh_suggestions()
+    assert "tenis" in [s["text"] for s in client.get("/suggest?prefix=ten").json()["suggestions"]]
+    assert client.get("/suggest/stats").json()["terms"] == 10
+
+
+def test_search_never_waits_on_suggest_rebuild(monkeypatch):
+    """Test /search and /suggest answer while a suggestion rebuild is stuck scanning products."""
+    seed_products(["Teclado Logitech"])
+    refresh_suggestions()
+    scanning, release = threading.Event(), threading.Event()
+    count_products = suggest.index._count_products
+
+    def slow_count(db, after_id):
+        scanning.set()
+        release.wait(10)
+        return count_products(db, after_id)
+
+    monkeypatch.setattr(suggest.index, "_count_products", slow_count)
+    monkeypatch.setattr(suggest, "SUGGEST_REBUILD_SECONDS", 0)
+    rebuild = threading.Thread(target=refresh_suggestions)
+    rebuild.start()
+    try:
+        assert scanning.wait(5)
+        requests = threading.Thread(target=lambda: (
+            client.get("/search?q=teclado"), client.get("/suggest?prefix=tec"), client.get("/suggest/stats")
+        ))
+        requests.start()
+        requests.join(5)
+        assert not requests.is_alive()
+    finally:
+        release.set()
+        rebuild.join(10)
+    assert [s["text"] for s in client.get("/suggest?prefix=tec").json()["suggestions"]] == ["teclado"]
+
+
+def test_search_sorts_by_relevance_in_the_database():
+    """Test sort=relevance ranks by BM25 with the in-stock boost, also on SKUs, and pages by offset."""
+    seed_products([
+        "Funda iPhone 15 silicón transparente con MagSafe",
+        "Mica iPhone 15 cristal templado 9H",
+        "Apple iPhone 15",
+        "Apple iPhone 15 128GB",
+    ])
+    db = TestingSessionLocal()
+    db.query(models.Product).filter(models.Product.name == "Apple iPhone 15").update({"available": 0})
+    db.query(models.Product).filter(models.Product.name == "Apple iPhone 15 128GB").update({"sku": "MTP03LZ"})
+    db.commit()
+    db.close()
+
+    names = [p["name"] for p in client.get("/search?q=iphone 15").json()["products"]]
+    assert names[0].startswith("Funda")  # default stays cheapest first
+    names = [p["name"] for p in client.get("/search?q=iphone 15&sort=relevance").json()["products"]]
+    # Shorter names score higher; the out-of-stock phone falls behind in-stock matches
+    assert names == [
+        "Apple iPhone 15 128GB",
+        "Mica iPhone 15 cristal templado 9H",
+        "Funda iPhone 15 silicón transparente con MagSafe",
+        "Apple iPhone 15",
+    ]
+    data = client.get("/search?q=iphone 15&sort=relevance&per_page=1&page=2").json()
+    assert [p["name"] for p in data["products"]] == ["Mica iPhone 15 cristal templado 9H"]
+    assert data["pagination"]["next_cursor"] is None
+
+    assert [p["name"] for p in client.get("/search?q=mtp03&sort=relevance").json()["products"]] == [
+        "Apple iPhone 15 128GB"
+    ]
+    # Both cases score within one band of each other, so the cheaper one comes first
+    names = [p["name"] for p in client.get("/search?q=iphone 15&sort=relevance_then_price").json()["products"]]
+    assert names[1:3] == ["Funda iPhone 15 silicón transparente con MagSafe", "Mica iPhone 15 cristal templado 9H"]
+    assert client.get("/search?q=iphone&sort=relevance&cursor=abc").status_code == 400
+    assert client.get("/search?q=iphone&sort=name").status_code == 422
+
+
+def test_batch_lookup_by_ids_and_store_skus(monkeypatch):
+    """Test GET /products?ids= and POST /products/lookup answer a batch with one query, in request order."""
+    ids = seed_products(["Laptop HP", "Mouse Logitech", "Monitor LG"])
+    db = TestingSessionLocal()
+    for product_id, sku in zip(ids, ["HP-1", "LOGI-2", "LG-3"]):
+        db.query(models.Product).filter(models.Product.id == product_id).update({"sku": sku})
+    db.commit()
+    db.close()
+    client.get("/stores")  # warm the reference snapshot
+
+    with count_statements() as statements:
+        data = client.get(f"/products?ids={ids[2]},{ids[0]},999").json()
+    assert len(statements) == 1
+    assert [p["name"] for p in data["products"]] == ["Monitor LG", "Laptop HP"]
+    assert data["missing"] == [999]
+    assert data == schemas.ProductBatch.model_validate(data).model_dump(mode="json")
+
+    with count_statements() as statements:
+        response = client.post("/products/lookup?fields=id,sku", json={"products": [
+            {"store_id": 1, "sku": "LOGI-2"}, {"store_id": 1, "sku": "NOPE"}, {"store_id": 1, "sku": "HP-1"},
+        ]})
+    assert len(statements) == 1
+    assert response.json() == {
+        "products": [{"id": ids[1], "sku": "LOGI-2"}, {"id": ids[0], "sku": "HP-1"}],
+        "missing": [{"store_id": 1, "sku": "NOPE"}],
+    }
+
+    monkeypatch.setattr(lookup, "LOOKUP_MAX_KEYS", 2)
+    assert client.get(f"/products?ids={ids[0]},{ids[1]},{ids[2]}").status_code == 400
+    assert client.get("/products?ids=1,x").status_code == 400
+
+
+def test_product_dicts_read_stores_missing_from_a_stale_snapshot(monkeypatch):
+    """Test products of a store newer than the snapshot still serialize when no reload is allowed."""
+    seed_products(["Laptop HP"])
+    client.get("/stores")  # warm the reference snapshot
+    stale = reference.snapshot.get(TestingSessionLocal())
+    monkeypatch.setattr(reference.snapshot, "ensure", lambda db, **ids: stale)
+    db = TestingSessionLocal()
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.add(models.Category(name="Laptops", slug="laptops"))
+    db.flush()
+    product = models.Product(name="Laptop Dell", store_id=2, category_id=1, store_url="https://x", price=900)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    data = client.get(f"/products?ids={product_id}").json()["products"][0]
+    assert (data["store"]["name"], data["category"]["name"]) == ("Liverpool", "Laptops")
+
+
+def test_snapshot_rate_limits_miss_reloads_per_id():
+    """Test unknown IDs reload the snapshot once per interval each, without delaying a new store."""
+    seed_products(["Laptop HP"])
+    db = TestingSessionLocal()
+    version = reference.snapshot.get(db).version
+    assert reference.snapshot.ensure(db, store_ids=[999]).version == version + 1
+    assert reference.snapshot.ensure(db, store_ids=[999]).version == version + 1
+
+    db.add(models.Store(name="Liverpool", url="https://liverpool.com.mx"))
+    db.commit()
+    snapshot = reference.snapshot.ensure(db, store_ids=[2, 999])
+    assert snapshot.version == version + 2
+    assert snapshot.stores[2].name == "Liverpool"
+    db.close()
+
+
+def test_tuned_sqlite_splits_writer_and_read_only_connections(tmp_path):
+    """Test the tuned SQLite profile: WAL and pragmas on connect, one writer, query_only readers."""
+    writer, reader = database.create_engines(f"sqlite:///{tmp_path / 'tuned.db'}")
+    with writer.begin() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+        connection.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+    assert writer.pool.size() == 1
+
+    # Readers see committed writes while the writer holds an open transaction
+    with writer.connect() as write, reader.connect() as read:
+        write.exec_driver_sql("INSERT INTO t VALUES (1)")
+        assert read.exec_driver_sql("SELECT count(*) FROM t").scalar() == 0
+        with pytest.raises(OperationalError):
+            read.exec_driver_sql("INSERT INTO t VALUES (2)")
+        write.commit()
+    with reader.connect() as read:
+        assert read.exec_driver_sql("SELECT count(*) FROM t").scalar() == 1
+    writer.dispose()
+    reader.dispose()
+
+
+def test_single_writer_coalesces_batches_and_splits_results(monkeypatch):
+    """Test queued batches share one write and each caller gets its own counts and row numbers."""
+    seed_products(["Kindle"])
+    monkeypatch.setattr(writer, "WRITER_LINGER_MS", 200)
+    single = writer.SingleWriter(TestingSessionLocal)
+
+    def rows(*skus, store_id=1):
+        return [
+            schemas.ProductCreate(name=f"Producto {sku}", store_id=store_id, store_url="https://x", sku=sku, price=10)
+            for sku in skus
+        ]
+
+    futures = [
+        single.submit("upsert", rows("A1", "A2")),
+        single.submit("upsert", rows("B1") + rows("B2", store_id=99)),
+        single.submit("upsert", rows("C1", "C2", "C3")),
+        single.submit("upsert", rows("A1")),  # clashes with the first batch, so it waits for the next group
+    ]
+    results = [future.result(timeout=5) for future in futures]
+    single.stop(timeout=5)
+
+    assert [(r.created, r.updated, r.unchanged, r.failed) for r in results] == [
+        (2, 0, 0, 0), (1, 0, 0, 1), (3, 0, 0, 0), (0, 0, 1, 0)
+    ]
+    assert results[1].errors == ["Product 1: Store ID 99 not found"]
+    assert single.stats() == {"queued": 0, "batches": 4, "groups": 2, "rows": 8}
+
+
+def test_single_writer_fails_waiting_batches_when_no_session_opens():
+    """Test a session that cannot be opened fails the group's futures and keeps the writer running."""
+    seed_products(["Kindle"])
+    attempts = []
+
+    def flaky_session():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OperationalError("connect", {}, Exception("unable to open database file"))
+        return TestingSessionLocal()
+
+    single = writer.SingleWriter(flaky_session)
+    product = schemas.ProductCreate(name="Producto A", store_id=1, store_url="https://x", sku="A", price=10)
+    with pytest.raises(OperationalError):
+        single.submit("upsert", [product]).result(timeout=5)
+    assert single.submit("upsert", [product]).result(timeout=5).created == 1
+    single.stop(timeout=5)
@@ -0,0 +1,112 @@
+"""Migration tests."""
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import Base, alembic_config, init_db
+from app import models, search  # noqa: F401
+
+
+def test_migrations_match_models(tmp_path):
+    """Test a migrated database has the same schema as the models."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    init_db(engine)
+
+    with engine.connect() as connection:
+        diff = compare_metadata(
+            MigrationContext.configure(connection, opts={"include_name": search.include_name}),
+            Base.metadata,
+        )
+        fts = connection.execute(text("SELECT name FROM sqlite_master WHERE name = 'products_fts'")).all()
+
+    assert diff == []
+    assert fts == [("products_fts",)]
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    """Test a create_all() database keeps its rows and gains the new indexes."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE stores (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL UNIQUE, url VARCHAR NOT NULL, created_at DATETIME)")
+        connection.exec_driver_sql("CREATE TABLE categories (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, slug VARCHAR NOT NULL, description VARCHAR, created_at DATETIME)")
+        connection.exec_driver_sql(
+            "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, store_id INTEGER NOT NULL REFERENCES stores(id), "
+            "category_id INTEGER REFERENCES categories(id), store_url VARCHAR NOT NULL, sku VARCHAR, price FLOAT NOT NULL, "
+            "currency VARCHAR, image_url VARCHAR, available INTEGER, last_updated DATETIME, created_at DATETIME)"
+        )
+        connection.exec_driver_sql("INSERT INTO stores (name, url) VALUES ('Coppel', 'https://www.coppel.com')")
+        connection.exec_driver_sql("INSERT INTO products (name, store_id, store_url, price) VALUES ('Xbox Series X', 1, 'https://coppel.com/xbox', 13299)")
+
+    init_db(engine)
+
+    with engine.connect() as connection:
+        indexes = {index["name"] for index in inspect(connection).get_indexes("products")}
+        matches = connection.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH 'xbox'")).all()
+        trigram = connection.execute(
+            text("SELECT name_normalized FROM products_fts_trigram WHERE products_fts_trigram MATCH 'seri'")
+        ).all()
+        history = connection.execute(text("SELECT product_id, price_cents FROM price_history")).all()
+
+    assert {"ix_products_store_id_sku", "ix_products_category_id_price"} <= indexes
+    assert matches == [(1,)]
+    assert trigram == [("xbox series x",)]
+    assert history == [(1, 1329900)]
+
+
+def test_legacy_duplicate_skus_keep_the_newest_row(tmp_path):
+    """Test upgrading a create_all() database with duplicate store SKUs keeps the newest row of each."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE stores (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL UNIQUE, url VARCHAR NOT NULL, created_at DATETIME)")
+        connection.exec_driver_sql("CREATE TABLE categories (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, slug VARCHAR NOT NULL, description VARCHAR, created_at DATETIME)")
+        connection.exec_driver_sql(
+            "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, store_id INTEGER NOT NULL REFERENCES stores(id), "
+            "category_id INTEGER REFERENCES categories(id), store_url VARCHAR NOT NULL, sku VARCHAR, price FLOAT NOT NULL, "
+            "currency VARCHAR, image_url VARCHAR, available INTEGER, last_updated DATETIME, created_at DATETIME)"
+        )
+        connection.exec_driver_sql("INSERT INTO stores (name, url) VALUES ('Coppel', 'https://www.coppel.com')")
+        connection.exec_driver_sql(
+            "INSERT INTO products (name, store_id, store_url, sku, price) VALUES "
+            "('Xbox Series X', 1, 'https://coppel.com/xbox', 'SKU1', 13299), "
+            "('Xbox Series X 1TB', 1, 'https://coppel.com/xbox', 'SKU1', 12999), "
+            "('Xbox Series S', 1, 'https://coppel.com/xbox-s', NULL, 7999), "
+            "('Xbox Series S 512GB', 1, 'https://coppel.com/xbox-s', NULL, 7499)"
+        )
+
+    init_db(engine)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT id, sku, price FROM products ORDER BY id")).all()
+        matches = connection.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH '1tb'")).all()
+
+    assert rows == [(2, "SKU1", 12999), (3, None, 7999), (4, None, 7499)]
+    assert matches == [(2,)]
+
+
+def test_downgrades_keep_the_search_triggers(tmp_path):
+    """Test the SQLite batch rebuilds in the 0005 and 0004 downgrades keep the FTS triggers working."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'downgraded.db'}")
+    init_db(engine)
+    config = alembic_config()
+
+    def downgrade(revision):
+        with engine.begin() as connection:
+            config.attributes["connection"] = connection
+            command.downgrade(config, revision)
+            return {name for name, in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products'"
+            )}
+
+    name_triggers = {"products_fts_ai", "products_fts_ad", "products_fts_au"}
+    trigram_triggers = {"products_fts_trigram_ai", "products_fts_trigram_ad", "products_fts_trigram_au"}
+    assert downgrade("0004") == name_triggers | trigram_triggers
+    assert downgrade("0003") == name_triggers
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO stores (name, url) VALUES ('Coppel', 'https://www.coppel.com')")
+        connection.exec_driver_sql(
+            "INSERT INTO products (name, store_id, store_url, price) VALUES ('Xbox Series X', 1, 'https://x', 13299)"
+        )
+        matches = connection.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH 'xbox'")).all()
+    assert matches == [(1,)]